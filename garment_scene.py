@@ -0,0 +1,31 @@
+"""
+Garment Scene Generator
+=======================
+The MONO8 test scene rendered by both hardware-free camera backends:
+`SyntheticCamera` in `python/camera_server.py` and the simulated SDK in
+`mvsdk_sim.py`. Kept apart from both so neither has to import the other;
+it only needs numpy and has no import side effects.
+"""
+
+import numpy as np
+
+
+def synthetic_scene(width, height):
+    """Noise-free garment-like scene as float32: lit table, dark garment."""
+    x = np.arange(width, dtype=np.float32)
+    y = np.arange(height, dtype=np.float32)
+    frame = 170 + 40 * (x / width) - 25 * (y[:, None] / height)   # Uneven lighting
+    garment = np.ix_(np.abs(y - height / 2) < height * 0.38,
+                     np.abs(x - width / 2) < width * 0.3)
+    frame[garment] = 55
+    return frame
+
+
+def synthetic_frame(width, height, seed=0, scene=None):
+    """Garment-like MONO8 test frame: `scene` plus fabric/sensor noise."""
+    rng = np.random.default_rng(seed)
+    frame = synthetic_scene(width, height) if scene is None else scene.copy()
+    noise = rng.standard_normal(frame.shape, dtype=np.float32)
+    noise *= 6                                              # Weave texture
+    frame += noise
+    return np.clip(frame, 0, 255, out=frame).astype(np.uint8)
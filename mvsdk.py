@@ -1,4 +1,5 @@
 #coding=utf-8
+import os
 import platform
 from ctypes import *
 from threading import local
@@ -13,6 +14,13 @@ def _Init():
 	global _sdk
 	global CALLBACK_FUNC_TYPE
 
+	# MVSDK_SIMULATE=1：使用模拟SDK（mvsdk_sim.py），无相机/无SDK时测试用
+	if os.environ.get("MVSDK_SIMULATE", "0") not in ("", "0"):
+		import mvsdk_sim
+		_sdk = mvsdk_sim.SimulatedSDK.from_env()
+		CALLBACK_FUNC_TYPE = CFUNCTYPE
+		return
+
 	is_win = (platform.system() == "Windows")
 	is_x86 = (platform.architecture()[0] == '32bit')
 
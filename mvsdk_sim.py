@@ -0,0 +1,879 @@
+"""
+Simulated MindVision SDK
+========================
+Drop-in stand-in for the `libMVSDK.so` / `MVCAMSDK.dll` handle that
+`mvsdk._Init()` loads into `mvsdk._sdk`. It implements the subset of the
+C API used by `python/camera_server.py` and `refrence.py` with the same
+calling convention the ctypes wrappers use (out-parameters arrive as
+`byref()` objects), so the real wrappers and the real acquisition code run
+unchanged on a machine without the camera or the SDK.
+
+Each opened device runs a frame clock thread that produces MONO8 frames at
+a configurable rate with jitter, honours trigger mode, soft triggers,
+resolution changes, gain / auto-exposure and parameter teams, and can be
+told to fail (timeouts, lost frames, device lost).
+
+Usage:
+    # Select the simulator before mvsdk is imported
+    MVSDK_SIMULATE=1 python python/camera_server.py
+
+    # Or swap it in at runtime
+    import mvsdk, mvsdk_sim
+    sim = mvsdk_sim.install(devices=2, fps=15)
+    sim.fail_next('CameraGetImageBuffer', mvsdk_sim.CAMERA_STATUS_TIME_OUT, count=3)
+    sim.disconnect(hCamera)
+
+Environment (read by `SimulatedSDK.from_env()`):
+    MVSDK_SIM_DEVICES   Number of enumerated cameras   (default 1)
+    MVSDK_SIM_SIZE      Sensor size WIDTHxHEIGHT        (default 5456x2812)
+    MVSDK_SIM_FPS       Continuous-mode frame rate      (default 15)
+    MVSDK_SIM_JITTER    Frame interval jitter, seconds  (default 0.002)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from ctypes import (
+    byref, c_ubyte, cast, memmove, pointer, sizeof, POINTER,
+)
+
+import numpy as np
+
+from garment_scene import synthetic_frame, synthetic_scene
+
+# Status codes (mirrors mvsdk.py; not imported so this module can be
+# loaded from inside mvsdk._Init() before mvsdk has finished importing)
+CAMERA_STATUS_SUCCESS = 0
+CAMERA_STATUS_FAILED = -1
+CAMERA_STATUS_NOT_SUPPORTED = -4
+CAMERA_STATUS_PARAMETER_INVALID = -6
+CAMERA_STATUS_NO_DEVICE_FOUND = -16
+CAMERA_STATUS_TIME_OUT = -12
+CAMERA_STATUS_DEVICE_IS_OPENED = -18
+CAMERA_STATUS_GRAB_FAILED = -25
+CAMERA_STATUS_DEVICE_LOST = -38
+
+CAMERA_MEDIA_TYPE_MONO8 = 0x01000000 | 0x00080000 | 0x0001
+
+_ERROR_STRINGS = {
+    CAMERA_STATUS_SUCCESS: 'Success',
+    CAMERA_STATUS_FAILED: 'Operation failed',
+    CAMERA_STATUS_NOT_SUPPORTED: 'Not supported',
+    CAMERA_STATUS_PARAMETER_INVALID: 'Invalid parameter',
+    CAMERA_STATUS_NO_DEVICE_FOUND: 'No device found',
+    CAMERA_STATUS_TIME_OUT: 'Timeout',
+    CAMERA_STATUS_DEVICE_IS_OPENED: 'Device is already opened',
+    CAMERA_STATUS_GRAB_FAILED: 'Grab failed',
+    CAMERA_STATUS_DEVICE_LOST: 'Device lost',
+}
+
+RAW_BUFFER_COUNT = 4              # SDK-side frame buffers per device
+AE_TARGET = 120                   # Mean grey level auto-exposure aims for
+AE_STEP = 0.35                    # Fraction of the AE error corrected per frame
+BASE_EXPOSURE_US = 10000.0        # Exposure at which a frame has its base brightness
+BASE_GAIN = 64                    # Analog gain at which a frame has its base brightness
+FRAME_VARIANTS = 3                # Pre-rendered noise variants per resolution
+
+
+def _value(arg):
+    """Unwrap c_int / c_double / c_void_p arguments to a Python value."""
+    return getattr(arg, 'value', arg)
+
+
+def _target(ref):
+    """Return the ctypes object behind a byref() argument."""
+    return getattr(ref, '_obj', ref)
+
+
+class _Export:
+    """Callable entry point that tolerates `restype`/`argtypes` assignment,
+    as mvsdk.py sets them on some `_sdk` functions before calling."""
+
+    __slots__ = ('func', 'restype', 'argtypes', '__name__')
+
+    def __init__(self, func, name):
+        self.func = func
+        self.restype = None
+        self.argtypes = None
+        self.__name__ = name
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+
+class _SimFrame:
+    __slots__ = ('buffer', 'head_values', 'busy')
+
+    def __init__(self, size):
+        self.buffer = np.empty(size, dtype=np.uint8)
+        self.head_values = None
+        self.busy = False
+
+
+class SimulatedDevice:
+    """One simulated camera: settings, SDK buffers and the frame clock."""
+
+    def __init__(self, sdk, index, width, height, fps, jitter):
+        self.sdk = sdk
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.jitter = jitter
+        self.serial = f'SIM{index:05d}'
+        self.handle = 0
+
+        # Settings
+        self.isp_format = CAMERA_MEDIA_TYPE_MONO8
+        self.trigger_mode = 0
+        self.analog_gain = BASE_GAIN
+        self.ae_state = 1
+        self.exposure_us = BASE_EXPOSURE_US
+        self.param_mode = 0
+        self.param_mask = 0xFFFFFFFF
+        self.param_teams = {}
+        self.current_team = 0
+        self.resolution = None        # tSdkImageResolution, set on open
+        self.snap_resolution = None
+
+        # Runtime state
+        self.cond = threading.Condition()
+        self.playing = False
+        self.lost = False
+        self.ready = deque()
+        self.frames = []
+        self.pending_triggers = 0
+        self.callback = None
+        self.callback_ctx = None
+        self.thread = None
+        self.running = False
+        self.opened_at = time.monotonic()
+        self.last_timestamp_us = 0
+        self.last_frame_id = 0
+        self.stat_total = 0
+        self.stat_capture = 0
+        self.stat_lost = 0
+        self._images = {}
+
+    # -- Frame content ---------------------------------------------------
+
+    def output_size(self, res=None):
+        res = res or self.resolution
+        if res is None:
+            return self.width, self.height
+        w = res.iWidthZoomHd or res.iWidth or self.width
+        h = res.iHeightZoomHd or res.iHeight or self.height
+        return int(w), int(h)
+
+    def _variants(self, w, h):
+        key = (w, h)
+        variants = self._images.get(key)
+        if variants is None:
+            if (self.width, self.height) in self._images and \
+                    w <= self.width and h <= self.height:
+                # Decimate the full-resolution render (binning / skipping)
+                fx, fy = self.width // w or 1, self.height // h or 1
+                full = self._images[(self.width, self.height)]
+                variants = [np.ascontiguousarray(f[::fy, ::fx][:h, :w])
+                            for f in full]
+            else:
+                scene = synthetic_scene(w, h)
+                variants = [synthetic_frame(w, h, self.index * 100 + i, scene)
+                            for i in range(FRAME_VARIANTS)]
+            self._images[key] = variants
+        return variants
+
+    def _brightness(self):
+        return (self.exposure_us / BASE_EXPOSURE_US) * \
+            (self.analog_gain / BASE_GAIN)
+
+    def _render(self, frame, w, h, triggered, exposed_at):
+        variants = self._variants(w, h)
+        src = variants[self.last_frame_id % len(variants)]
+        scale = self._brightness()
+        dst = frame.buffer[:w * h].reshape(h, w)
+        if abs(scale - 1.0) < 0.01:
+            np.copyto(dst, src)
+        else:
+            lut = np.clip(np.arange(256) * scale, 0, 255).astype(np.uint8)
+            np.take(lut, src, out=dst)
+        if self.ae_state:
+            # Auto-exposure converges towards AE_TARGET over a few frames
+            mean = float(src[::16, ::16].mean()) * scale
+            if mean > 0:
+                error = AE_TARGET / mean
+                self.exposure_us *= error ** AE_STEP
+                self.exposure_us = min(max(self.exposure_us, 50.0), 500000.0)
+        # Sensor clock stamps the start of the exposure, not the readout
+        now_us = int((exposed_at - self.opened_at) * 1e6)
+        self.last_timestamp_us = now_us
+        self.last_frame_id += 1
+        frame.head_values = dict(
+            uiMediaType=CAMERA_MEDIA_TYPE_MONO8,
+            uBytes=w * h,
+            iWidth=w,
+            iHeight=h,
+            bIsTrigger=1 if triggered else 0,
+            uiTimeStamp=(now_us // 100) & 0xFFFFFFFF,
+            uiExpTime=int(self.exposure_us),
+            fAnalogGain=self.analog_gain / 16.0,
+            iGamma=-1,
+            iContrast=-1,
+            fRgain=1.0, fGgain=1.0, fBgain=1.0,
+        )
+
+    # -- Frame clock -----------------------------------------------------
+
+    def start(self):
+        self.running = True
+        self.frames = [_SimFrame(self.width * self.height)
+                       for _ in range(RAW_BUFFER_COUNT)]
+        self._variants(self.width, self.height)
+        self.thread = threading.Thread(target=self._clock, daemon=True,
+                                       name=f'mvsdk-sim-{self.index}')
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def _clock(self):
+        next_tick = time.monotonic()
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+                if not self.playing or self.lost:
+                    self.cond.wait(0.05)
+                    next_tick = time.monotonic()
+                    continue
+                if self.trigger_mode != 0:
+                    if self.pending_triggers == 0:
+                        self.cond.wait(0.05)
+                        continue
+                    self.pending_triggers -= 1
+                    triggered = True
+                else:
+                    triggered = False
+
+            if triggered:
+                # Exposure starts at the trigger; readout follows
+                exposed_at = time.monotonic()
+                time.sleep(self.exposure_us / 1e6)
+            else:
+                jitter = self.sdk.rng.uniform(-self.jitter, self.jitter)
+                next_tick += 1.0 / self.fps
+                delay = next_tick + jitter - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.monotonic()
+                exposed_at = time.monotonic()
+            self._produce(triggered, exposed_at)
+
+    def _produce(self, triggered, exposed_at):
+        with self.cond:
+            if not self.running or self.lost:
+                return
+            self.stat_total += 1
+            frame = next((f for f in self.frames if not f.busy), None)
+            if frame is None:
+                # Oldest undelivered frame is overwritten, like the SDK
+                if not self.ready:
+                    self.stat_lost += 1
+                    return
+                frame = self.ready.popleft()
+                self.stat_lost += 1
+            frame.busy = True
+            w, h = self.output_size()
+        self._render(frame, w, h, triggered, exposed_at)
+        callback = self.callback
+        if callback is not None:
+            self._deliver_callback(callback, frame)
+            return
+        with self.cond:
+            self.stat_capture += 1
+            self.ready.append(frame)
+            self.cond.notify_all()
+
+    def _deliver_callback(self, callback, frame):
+        head = self.sdk.make_head(frame.head_values)
+        self.stat_capture += 1
+        try:
+            callback(self.handle, frame.buffer.ctypes.data, pointer(head),
+                     self.callback_ctx)
+        finally:
+            with self.cond:
+                frame.busy = False
+
+    def wait_frame(self, timeout_ms):
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        with self.cond:
+            while not self.ready:
+                if self.lost:
+                    return None, CAMERA_STATUS_DEVICE_LOST
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, CAMERA_STATUS_TIME_OUT
+                self.cond.wait(remaining)
+            return self.ready.popleft(), CAMERA_STATUS_SUCCESS
+
+    def release(self, address):
+        with self.cond:
+            for frame in self.frames:
+                if frame.buffer.ctypes.data == address:
+                    frame.busy = False
+                    return CAMERA_STATUS_SUCCESS
+        return CAMERA_STATUS_PARAMETER_INVALID
+
+    def clear(self):
+        with self.cond:
+            self.clear_locked()
+
+    def clear_locked(self):
+        while self.ready:
+            self.ready.popleft().busy = False
+
+
+class SimulatedSDK:
+    """Object with the libMVSDK entry points camera_server.py and refrence.py use."""
+
+    def __init__(self, devices=1, width=5456, height=2812, fps=15.0,
+                 jitter=0.002, seed=0, crop_presets=False):
+        self.rng = np.random.default_rng(seed)
+        self.crop_presets = crop_presets  # Also list a centre ROI crop preset
+        self._lock = threading.Lock()
+        self._devices = [SimulatedDevice(self, i, width, height, fps, jitter)
+                         for i in range(devices)]
+        self._handles = {}
+        self._next_handle = 1
+        self._allocations = {}
+        self._failures = {}
+        self._heads = []
+
+        for name in dir(type(self)):
+            if name.startswith('Camera'):
+                setattr(self, name, _Export(getattr(self, name), name))
+
+    @classmethod
+    def from_env(cls):
+        width, height = 5456, 2812
+        size = os.environ.get('MVSDK_SIM_SIZE')
+        if size:
+            width, height = (int(x) for x in size.lower().split('x'))
+        return cls(devices=int(os.environ.get('MVSDK_SIM_DEVICES', 1)),
+                   width=width, height=height,
+                   fps=float(os.environ.get('MVSDK_SIM_FPS', 15)),
+                   jitter=float(os.environ.get('MVSDK_SIM_JITTER', 0.002)))
+
+    # -- Failure injection -----------------------------------------------
+
+    def fail_next(self, function, error_code, count=1):
+        """Make the next `count` calls to `function` return `error_code`."""
+        with self._lock:
+            self._failures[function] = [error_code, count]
+
+    def disconnect(self, hCamera):
+        """Simulate the device dropping off the bus."""
+        dev = self._handles[hCamera]
+        with dev.cond:
+            dev.lost = True
+            dev.cond.notify_all()
+
+    def reconnect(self, hCamera):
+        dev = self._handles[hCamera]
+        with dev.cond:
+            dev.lost = False
+            dev.cond.notify_all()
+
+    def external_trigger(self, handles=None):
+        """Pulse the external trigger line of every camera in hardware
+        trigger mode (or only `handles`), as a shared PLC signal would."""
+        devs = [self._handles[h] for h in handles] if handles else list(self._handles.values())
+        for dev in devs:
+            with dev.cond:
+                if dev.trigger_mode == 2:
+                    dev.pending_triggers += 1
+                    dev.cond.notify_all()
+
+    def device(self, hCamera):
+        return self._handles[hCamera]
+
+    def _injected(self, function):
+        with self._lock:
+            entry = self._failures.get(function)
+            if not entry:
+                return CAMERA_STATUS_SUCCESS
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._failures[function]
+            return entry[0]
+
+    def _dev(self, hCamera, function=None):
+        dev = self._handles.get(_value(hCamera))
+        if dev is None:
+            return None, CAMERA_STATUS_PARAMETER_INVALID
+        if dev.lost:
+            return dev, CAMERA_STATUS_DEVICE_LOST
+        if function is not None:
+            err = self._injected(function)
+            if err:
+                return dev, err
+        return dev, CAMERA_STATUS_SUCCESS
+
+    def make_head(self, values):
+        # Imported lazily: mvsdk imports this module while it is loading
+        from mvsdk import tSdkFrameHead
+        head = tSdkFrameHead()
+        for key, val in values.items():
+            setattr(head, key, val)
+        return head
+
+    def _fill_head(self, ref, values):
+        head = _target(ref)
+        for key, val in values.items():
+            setattr(head, key, val)
+
+    def _resolution(self, dev, w=None, h=None, index=0, desc=b'Full'):
+        from mvsdk import tSdkImageResolution
+        res = tSdkImageResolution()
+        res.iIndex = index
+        res.acDescription = desc
+        res.iWidthFOV = dev.width
+        res.iHeightFOV = dev.height
+        res.iWidth = w or dev.width
+        res.iHeight = h or dev.height
+        return res
+
+    # -- Library / enumeration -------------------------------------------
+
+    def CameraSdkInit(self, iLanguageSel):
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetErrorString(self, iStatusCode):
+        return _ERROR_STRINGS.get(_value(iStatusCode), 'Unknown error').encode()
+
+    def CameraEnumerateDevice(self, pCameraList, pNums):
+        nums = _target(pNums)
+        count = min(nums.value, len(self._devices))
+        for i in range(count):
+            dev = self._devices[i]
+            info = pCameraList[i]
+            info.acProductSeries = b'MV-SIM'
+            info.acProductName = b'MV-SIM-1500M'
+            info.acFriendlyName = f'Simulated Camera {i}'.encode()
+            info.acSensorType = b'SIM'
+            info.acPortType = b'USB3.0'
+            info.acSn = dev.serial.encode()
+            info.uInstance = i
+        nums.value = count
+        return CAMERA_STATUS_SUCCESS if count else CAMERA_STATUS_NO_DEVICE_FOUND
+
+    def CameraInit(self, pCameraInfo, emParamLoadMode, emTeam, pCameraHandle):
+        info = _target(pCameraInfo)
+        dev = next((d for d in self._devices
+                    if d.serial == info.acSn.decode()), None)
+        if dev is None:
+            return CAMERA_STATUS_NO_DEVICE_FOUND
+        if dev.handle:
+            return CAMERA_STATUS_DEVICE_IS_OPENED
+        with self._lock:
+            dev.handle = self._next_handle
+            self._next_handle += 1
+            self._handles[dev.handle] = dev
+        dev.resolution = self._resolution(dev)
+        dev.snap_resolution = self._resolution(dev)
+        dev.opened_at = time.monotonic()
+        dev.start()
+        _target(pCameraHandle).value = dev.handle
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraUnInit(self, hCamera):
+        dev = self._handles.pop(_value(hCamera), None)
+        if dev is None:
+            return CAMERA_STATUS_PARAMETER_INVALID
+        dev.stop()
+        dev.handle = 0
+        dev.playing = False
+        dev.callback = None
+        dev.ready.clear()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetCapability(self, hCamera, pCameraInfo):
+        dev, err = self._dev(hCamera)
+        if dev is None:
+            return err
+        from mvsdk import tSdkImageResolution
+        cap = _target(pCameraInfo)
+        cap.sResolutionRange.iWidthMax = dev.width
+        cap.sResolutionRange.iHeightMax = dev.height
+        cap.sResolutionRange.iWidthMin = 64
+        cap.sResolutionRange.iHeightMin = 64
+        cap.sResolutionRange.uSkipModeMask = 0b11
+        cap.sResolutionRange.uBinSumModeMask = 0b11
+        cap.sResolutionRange.uBinAverageModeMask = 0b11
+        cap.sIspCapacity.bMonoSensor = 1
+        cap.bParamInDevice = 1
+        cap.sExposeDesc.uiExposeTimeMin = 1
+        cap.sExposeDesc.uiExposeTimeMax = 500000
+        cap.sExposeDesc.uiAnalogGainMin = 16
+        cap.sExposeDesc.uiAnalogGainMax = 255
+        listed = []
+        for div, desc in ((1, b'Full'), (2, b'BIN 2X2'), (4, b'BIN 4X4')):
+            res = self._resolution(dev, dev.width // div, dev.height // div,
+                                   desc=desc)
+            res.uBinAverageMode = div - 1
+            listed.append(res)
+        if self.crop_presets:
+            # Centre quarter of the field at native pixel size, listed
+            # ahead of the bin preset with the same output width
+            crop = self._resolution(dev, dev.width // 4, dev.height // 4,
+                                    desc=b'ROI 1/4 CENTER')
+            crop.iWidthFOV, crop.iHeightFOV = crop.iWidth, crop.iHeight
+            crop.iHOffsetFOV = (dev.width - crop.iWidth) // 2
+            crop.iVOffsetFOV = (dev.height - crop.iHeight) // 2
+            listed.insert(1, crop)
+        presets = (tSdkImageResolution * len(listed))()
+        for i, res in enumerate(listed):
+            res.iIndex = i
+            presets[i] = res
+        self._heads.append(presets)  # keep alive for the caller's pointer
+        cap.pImageSizeDesc = cast(presets, POINTER(tSdkImageResolution))
+        cap.iImageSizeDesc = len(listed)
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Memory ----------------------------------------------------------
+
+    def CameraAlignMalloc(self, size, align):
+        buf = np.empty(_value(size) + _value(align), dtype=np.uint8)
+        address = buf.ctypes.data
+        offset = (-address) % _value(align)
+        address += offset
+        self._allocations[address] = buf
+        return address
+
+    def CameraAlignFree(self, membuffer):
+        self._allocations.pop(_value(membuffer), None)
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Acquisition -----------------------------------------------------
+
+    def CameraSetIspOutFormat(self, hCamera, uFormat):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        if _value(uFormat) != CAMERA_MEDIA_TYPE_MONO8:
+            return CAMERA_STATUS_NOT_SUPPORTED
+        dev.isp_format = _value(uFormat)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraPlay(self, hCamera):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        with dev.cond:
+            dev.playing = True
+            dev.cond.notify_all()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraPause(self, hCamera):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        with dev.cond:
+            dev.playing = False
+        return CAMERA_STATUS_SUCCESS
+
+    CameraStop = CameraPause
+
+    def CameraSetTriggerMode(self, hCamera, iModeSel):
+        dev, err = self._dev(hCamera, 'CameraSetTriggerMode')
+        if err:
+            return err
+        with dev.cond:
+            dev.trigger_mode = _value(iModeSel)
+            dev.pending_triggers = 0
+            dev.cond.notify_all()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetTriggerMode(self, hCamera, piModeSel):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        _target(piModeSel).value = dev.trigger_mode
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSoftTrigger(self, hCamera):
+        dev, err = self._dev(hCamera, 'CameraSoftTrigger')
+        if err:
+            return err
+        if dev.trigger_mode != 1:
+            return CAMERA_STATUS_FAILED
+        with dev.cond:
+            dev.pending_triggers += 1
+            dev.cond.notify_all()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraClearBuffer(self, hCamera):
+        dev, err = self._dev(hCamera, 'CameraClearBuffer')
+        if err:
+            return err
+        dev.clear()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetCallbackFunction(self, hCamera, pCallBack, pContext, pCallbackOld):
+        dev, err = self._dev(hCamera, 'CameraSetCallbackFunction')
+        if err:
+            return err
+        dev.callback = pCallBack
+        dev.callback_ctx = _value(pContext)
+        dev.clear()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetImageBuffer(self, hCamera, pFrameInfo, pbyBuffer, wTimes):
+        dev, err = self._dev(hCamera, 'CameraGetImageBuffer')
+        if err:
+            if err == CAMERA_STATUS_TIME_OUT:
+                time.sleep(_value(wTimes) / 1000.0)
+            return err
+        if dev.callback is not None:
+            return CAMERA_STATUS_FAILED
+        frame, err = dev.wait_frame(_value(wTimes))
+        if err:
+            return err
+        self._fill_head(pFrameInfo, frame.head_values)
+        _target(pbyBuffer).value = frame.buffer.ctypes.data
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSnapToBuffer(self, hCamera, pFrameInfo, pbyBuffer, wTimes):
+        dev, err = self._dev(hCamera, 'CameraSnapToBuffer')
+        if err:
+            return err
+        if dev.callback is not None:
+            return CAMERA_STATUS_FAILED   # Frames go to the callback, as on the SDK
+        # Switch to the snap resolution for exactly one frame
+        with dev.cond:
+            preview, dev.resolution = dev.resolution, dev.snap_resolution
+            dev.clear_locked()
+        try:
+            frame, err = dev.wait_frame(_value(wTimes))
+        finally:
+            with dev.cond:
+                dev.resolution = preview
+        if err:
+            return err
+        self._fill_head(pFrameInfo, frame.head_values)
+        _target(pbyBuffer).value = frame.buffer.ctypes.data
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraReleaseImageBuffer(self, hCamera, pbyBuffer):
+        dev, err = self._dev(hCamera)
+        if dev is None:
+            return err
+        return dev.release(_value(pbyBuffer))
+
+    def CameraImageProcess(self, hCamera, pbyIn, pbyOut, pFrInfo):
+        dev, err = self._dev(hCamera, 'CameraImageProcess')
+        if err:
+            return err
+        head = _target(pFrInfo)
+        memmove(_value(pbyOut), _value(pbyIn), head.uBytes)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraFlipFrameBuffer(self, pFrameBuffer, pFrameHead, Flags):
+        head = _target(pFrameHead)
+        size = head.iWidth * head.iHeight
+        data = (c_ubyte * size).from_address(_value(pFrameBuffer))
+        img = np.frombuffer(data, dtype=np.uint8).reshape(head.iHeight, head.iWidth)
+        img[:] = img[::-1].copy()
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetFrameStatistic(self, hCamera, psFrameStatistic):
+        dev, err = self._dev(hCamera, 'CameraGetFrameStatistic')
+        if err:
+            return err
+        stat = _target(psFrameStatistic)
+        stat.iTotal = dev.stat_total
+        stat.iCapture = dev.stat_capture
+        stat.iLost = dev.stat_lost
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetFrameID(self, hCamera, FrameID):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        _target(FrameID).value = dev.last_frame_id
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetFrameTimeStamp(self, hCamera, TimeStampL, TimeStampH):
+        dev, err = self._dev(hCamera, 'CameraGetFrameTimeStamp')
+        if err:
+            return err
+        _target(TimeStampL).value = dev.last_timestamp_us & 0xFFFFFFFF
+        _target(TimeStampH).value = dev.last_timestamp_us >> 32
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Resolution ------------------------------------------------------
+
+    def CameraGetImageResolution(self, hCamera, psCurVideoSize):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        memmove(psCurVideoSize, byref(dev.resolution), sizeof(dev.resolution))
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetImageResolution(self, hCamera, pImageResolution):
+        dev, err = self._dev(hCamera, 'CameraSetImageResolution')
+        if err:
+            return err
+        res = _target(pImageResolution).clone()
+        w, h = dev.output_size(res)
+        if w > dev.width or h > dev.height or w <= 0 or h <= 0:
+            return CAMERA_STATUS_PARAMETER_INVALID
+        with dev.cond:
+            dev.resolution = res
+            dev.ready.clear()
+            for frame in dev.frames:
+                frame.busy = False
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetResolutionForSnap(self, hCamera, pImageResolution):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        memmove(pImageResolution, byref(dev.snap_resolution),
+                sizeof(dev.snap_resolution))
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetResolutionForSnap(self, hCamera, pImageResolution):
+        dev, err = self._dev(hCamera, 'CameraSetResolutionForSnap')
+        if err:
+            return err
+        dev.snap_resolution = _target(pImageResolution).clone()
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Exposure / gain -------------------------------------------------
+
+    def CameraSetAnalogGain(self, hCamera, iAnalogGain):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        dev.analog_gain = _value(iAnalogGain)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetAnalogGain(self, hCamera, piAnalogGain):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        _target(piAnalogGain).value = dev.analog_gain
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetAeState(self, hCamera, bAeState):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        dev.ae_state = 1 if _value(bAeState) else 0
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetAeState(self, hCamera, pAeState):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        _target(pAeState).value = dev.ae_state
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetExposureTime(self, hCamera, fExposureTime):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        dev.exposure_us = float(_value(fExposureTime))
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetExposureTime(self, hCamera, pfExposureTime):
+        dev, err = self._dev(hCamera, 'CameraGetExposureTime')
+        if err:
+            return err
+        _target(pfExposureTime).value = dev.exposure_us
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Parameter teams -------------------------------------------------
+
+    def CameraSetParameterMode(self, hCamera, iMode):
+        dev, err = self._dev(hCamera, 'CameraSetParameterMode')
+        if err:
+            return err
+        dev.param_mode = _value(iMode)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSetParameterMask(self, hCamera, uMask):
+        dev, err = self._dev(hCamera, 'CameraSetParameterMask')
+        if err:
+            return err
+        dev.param_mask = _value(uMask)    # Teams only ever hold the exposure page here
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraSaveParameter(self, hCamera, iTeam):
+        dev, err = self._dev(hCamera, 'CameraSaveParameter')
+        if err:
+            return err
+        dev.param_teams[_value(iTeam)] = dict(
+            analog_gain=dev.analog_gain, ae_state=dev.ae_state,
+            exposure_us=dev.exposure_us)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraLoadParameter(self, hCamera, iTeam):
+        dev, err = self._dev(hCamera, 'CameraLoadParameter')
+        if err:
+            return err
+        team = dev.param_teams.get(_value(iTeam))
+        if team is None:
+            return CAMERA_STATUS_PARAMETER_INVALID
+        dev.analog_gain = team['analog_gain']
+        dev.ae_state = team['ae_state']
+        dev.exposure_us = team['exposure_us']
+        dev.current_team = _value(iTeam)
+        return CAMERA_STATUS_SUCCESS
+
+    def CameraGetCurrentParameterGroup(self, hCamera, piTeam):
+        dev, err = self._dev(hCamera)
+        if err:
+            return err
+        _target(piTeam).value = dev.current_team
+        return CAMERA_STATUS_SUCCESS
+
+    # -- Image evaluation ------------------------------------------------
+
+    def CameraEvaluateImageDefinition(self, hCamera, iAlgorithSel, pbyIn,
+                                      pFrInfo, DefinitionValue):
+        dev, err = self._dev(hCamera, 'CameraEvaluateImageDefinition')
+        if err:
+            return err
+        head = _target(pFrInfo)
+        data = (c_ubyte * (head.iWidth * head.iHeight)).from_address(_value(pbyIn))
+        img = np.frombuffer(data, dtype=np.uint8).reshape(head.iHeight, head.iWidth)
+        small = img[::4, ::4].astype(np.int16)
+        lap = (small[1:-1, 1:-1] * 4 - small[:-2, 1:-1] - small[2:, 1:-1]
+               - small[1:-1, :-2] - small[1:-1, 2:])
+        _target(DefinitionValue).value = float(lap.var())
+        return CAMERA_STATUS_SUCCESS
+
+
+def install(sdk=None, **kwargs):
+    """Replace `mvsdk._sdk` with a simulator and return it.
+
+    Every mvsdk wrapper resolves `_sdk` at call time, so this takes effect
+    immediately for code that has already imported the wrappers.
+    """
+    import mvsdk
+    from ctypes import CFUNCTYPE
+    if sdk is None:
+        sdk = SimulatedSDK(**kwargs) if kwargs else SimulatedSDK.from_env()
+    mvsdk._sdk = sdk
+    if mvsdk.CALLBACK_FUNC_TYPE is None:
+        mvsdk.CALLBACK_FUNC_TYPE = CFUNCTYPE
+    return sdk
@@ -0,0 +1,269 @@
+"""
+Camera Server Benchmark Suite
+=============================
+Runs the camera server in-process on the synthetic camera (no hardware,
+no display) and measures the paths operators care about:
+
+  capture  - /api/capture-jpeg latency, with its Server-Timing phases
+  stream   - delivered fps per MJPEG client with N concurrent viewers
+  encode   - JPEG encode throughput per ENCODE_PROFILES entry
+  memory   - resident set size after each stage, and the peak
+
+Usage:
+    python python/benchmarks/camera_server_bench.py [--fps 15] [--jitter-ms 2]
+        [--captures 20] [--clients 1 4 8] [--duration 5] [--encode-runs 10]
+        [--only capture stream encode] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import resource
+import argparse
+import threading
+import http.client
+
+import cv2
+import numpy as np
+import uvicorn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import camera_server  # noqa: E402
+
+STAGES = ('capture', 'stream', 'encode')
+
+
+def rss_mb():
+    """Current resident set size in MiB (Linux /proc; falls back to the peak)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {'p50': round(float(p50), 1), 'p95': round(float(p95), 1),
+            'p99': round(float(p99), 1), 'max': round(float(max(values)), 1)}
+
+
+def counter_value(metric):
+    return metric.labels().totals()[0]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(fps, jitter):
+    """Open the synthetic camera and serve the app on a background thread."""
+    camera_server.camera_backend = 'synthetic'
+    camera_server.synthetic_fps = fps
+    camera_server.synthetic_jitter = jitter
+    camera_server.init_cameras()
+    camera_server.default_device().start_streaming()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        camera_server.app, host='127.0.0.1', port=port, log_level='warning',
+        timeout_graceful_shutdown=1))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError('camera server did not start')
+        time.sleep(0.05)
+    return server, thread, port
+
+
+def bench_capture(port, runs):
+    """Sequential /api/capture-jpeg requests: wall latency and server phases."""
+    latencies, phases = [], {}
+    for _ in range(runs):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        t0 = time.perf_counter()
+        conn.request('GET', '/api/capture-jpeg')
+        response = conn.getresponse()
+        body = response.read()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        conn.close()
+        if response.status != 200 or not body:
+            raise RuntimeError(f'capture failed: HTTP {response.status}')
+        for entry in (response.getheader('Server-Timing') or '').split(','):
+            name, _, dur = entry.strip().partition(';dur=')
+            if dur:
+                phases.setdefault(name, []).append(float(dur))
+    return {'latency_ms': percentiles(latencies),
+            'phases_ms': {name: percentiles(v) for name, v in phases.items()}}
+
+
+def _view(port, duration, frames, index, width):
+    """One MJPEG viewer: count parts received within `duration` seconds."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', f'/api/stream?w={width}')
+    response = conn.getresponse()
+    marker = b'X-Frame-Seq:'
+    tail = b''
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            data = tail + chunk
+            frames[index] += data.count(marker)
+            tail = data[-(len(marker) - 1):]   # Marker split across reads
+    finally:
+        conn.close()
+
+
+def bench_stream(port, clients, duration, width):
+    """Delivered fps per client with `clients` concurrent MJPEG viewers."""
+    published = counter_value(camera_server.PUBLISHED_FRAMES)
+    dropped = counter_value(camera_server.STREAM_DROPPED)
+    frames = [0] * clients
+    threads = [threading.Thread(target=_view, args=(port, duration, frames, i, width))
+               for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    fps = [n / elapsed for n in frames]
+    return {
+        'clients': clients,
+        'source_fps': round((counter_value(camera_server.PUBLISHED_FRAMES)
+                             - published) / elapsed, 1),
+        'client_fps_mean': round(sum(fps) / clients, 1),
+        'client_fps_min': round(min(fps), 1),
+        'dropped_parts': counter_value(camera_server.STREAM_DROPPED) - dropped,
+    }
+
+
+def bench_encode(runs):
+    """Encodes per second and output size for each encode profile."""
+    frame = camera_server.synthetic_frame(camera_server.SYNTHETIC_WIDTH,
+                                          camera_server.SYNTHETIC_HEIGHT)
+    stream_w = int(frame.shape[1] * camera_server.STREAM_SCALE)
+    stream_frame = cv2.resize(frame, (stream_w, int(frame.shape[0] * stream_w / frame.shape[1])),
+                              interpolation=cv2.INTER_NEAREST)
+    inputs = {'capture': frame, 'preview': frame, 'stream': stream_frame}
+    results = {}
+    for profile, image in inputs.items():
+        settings = camera_server.ENCODE_PROFILES[profile]
+        encoder = camera_server.jpeg_encoder
+        if settings.striped and camera_server.striped_encoder is not None:
+            encoder = camera_server.striped_encoder
+        encoder.encode(image, settings).release()       # Warm-up
+        times, size = [], 0
+        for _ in range(runs):
+            jpeg = encoder.encode(image, settings)
+            times.append(jpeg.encode_time)
+            size = len(jpeg.data)
+            jpeg.release()
+        mean = sum(times) / len(times)
+        results[profile] = {
+            'size': f'{image.shape[1]}x{image.shape[0]}',
+            'encoder': jpeg.encoder,
+            'encodes_per_s': round(1 / mean, 1),
+            'input_mb_per_s': round(image.nbytes / mean / 2**20, 1),
+            'mean_ms': round(mean * 1000, 1),
+            'jpeg_kb': round(size / 1024, 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camera server benchmark suite')
+    parser.add_argument('--fps', type=float, default=camera_server.SYNTHETIC_FPS,
+                        help='Synthetic camera frame rate')
+    parser.add_argument('--jitter-ms', type=float, default=2.0,
+                        help='Standard deviation of the synthetic frame period')
+    parser.add_argument('--captures', type=int, default=20)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='Seconds per stream measurement')
+    parser.add_argument('--stream-width', type=int, default=0,
+                        help='Viewer ?w= (default: the server default)')
+    parser.add_argument('--encode-runs', type=int, default=10)
+    parser.add_argument('--jpeg-encoder', choices=camera_server.JPEG_ENCODERS,
+                        default='auto')
+    parser.add_argument('--jpeg-workers', type=int, default=1)
+    parser.add_argument('--only', choices=STAGES, nargs='+', default=list(STAGES))
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    camera_server.jpeg_encoder = camera_server.create_encoder(args.jpeg_encoder)
+    camera_server.striped_encoder = camera_server.create_striped_encoder(args.jpeg_workers)
+
+    results = {'config': {'fps': args.fps, 'jitter_ms': args.jitter_ms,
+                          'cpus': os.cpu_count(),
+                          'jpeg_encoder': camera_server.jpeg_encoder.name,
+                          'jpeg_workers': args.jpeg_workers},
+               'memory_mb': {'start': round(rss_mb(), 1)}}
+    server, thread, port = start_server(args.fps, args.jitter_ms / 1000.0)
+    results['memory_mb']['server_ready'] = round(rss_mb(), 1)
+    print(f"Synthetic camera {camera_server.SYNTHETIC_WIDTH}x"
+          f"{camera_server.SYNTHETIC_HEIGHT} at {args.fps} fps "
+          f"(jitter {args.jitter_ms} ms), encoder {camera_server.jpeg_encoder.name}, "
+          f"{os.cpu_count()} CPUs")
+    try:
+        if 'capture' in args.only:
+            results['capture'] = bench_capture(port, args.captures)
+            results['memory_mb']['after_capture'] = round(rss_mb(), 1)
+            lat = results['capture']['latency_ms']
+            print(f"\nCapture ({args.captures} x /api/capture-jpeg): "
+                  f"p50 {lat['p50']} ms, p95 {lat['p95']} ms, max {lat['max']} ms")
+            for name, stats in results['capture']['phases_ms'].items():
+                print(f"  {name:<10} p50 {stats['p50']:>8.1f} ms   p95 {stats['p95']:>8.1f} ms")
+
+        if 'stream' in args.only:
+            width = args.stream_width or camera_server.default_device().default_stream_width()
+            results['stream'] = [bench_stream(port, n, args.duration, width)
+                                 for n in args.clients]
+            results['memory_mb']['after_stream'] = round(rss_mb(), 1)
+            print(f"\nStream ({width}px, {args.duration:g}s per run)")
+            print(f"{'clients':>8}{'source fps':>12}{'client fps':>12}"
+                  f"{'min fps':>10}{'dropped':>10}")
+            for r in results['stream']:
+                print(f"{r['clients']:>8}{r['source_fps']:>12}{r['client_fps_mean']:>12}"
+                      f"{r['client_fps_min']:>10}{r['dropped_parts']:>10}")
+
+        if 'encode' in args.only:
+            results['encode'] = bench_encode(args.encode_runs)
+            results['memory_mb']['after_encode'] = round(rss_mb(), 1)
+            print(f"\nEncode ({args.encode_runs} runs per profile)")
+            print(f"{'profile':<10}{'size':>12}{'encoder':>12}{'enc/s':>8}"
+                  f"{'MiB/s':>8}{'mean ms':>9}{'KiB':>9}")
+            for name, r in results['encode'].items():
+                print(f"{name:<10}{r['size']:>12}{r['encoder']:>12}{r['encodes_per_s']:>8}"
+                      f"{r['input_mb_per_s']:>8}{r['mean_ms']:>9}{r['jpeg_kb']:>9}")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        camera_server.cleanup()
+
+    results['memory_mb']['peak'] = round(peak_rss_mb(), 1)
+    print("\nMemory (RSS MiB): " + ', '.join(f"{k} {v}" for k, v in results['memory_mb'].items()))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
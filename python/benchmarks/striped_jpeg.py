@@ -0,0 +1,75 @@
+"""
+Striped JPEG Benchmark
+======================
+Compares cv2.imencode against the camera server's multi-core striped
+encoder on a full-resolution MindVision-sized MONO8 frame, and checks
+that the stitched JPEG decodes to the same pixels.
+
+Usage:
+    python python/benchmarks/striped_jpeg.py [--runs 10] [--quality 95]
+                                             [--workers 1 2 4 8]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import camera_server  # noqa: E402
+
+WIDTH, HEIGHT = camera_server.SYNTHETIC_WIDTH, camera_server.SYNTHETIC_HEIGHT
+
+
+def time_encode(encode, runs):
+    """Best-of and mean wall time in ms over `runs` encodes (after a warm-up)."""
+    encode()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        encode()
+        times.append((time.perf_counter() - t0) * 1000)
+    return min(times), sum(times) / len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Striped JPEG benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--quality', type=int, default=95)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    frame = camera_server.synthetic_frame(camera_server.SYNTHETIC_WIDTH,
+                                          camera_server.SYNTHETIC_HEIGHT)
+    profile = camera_server.ENCODE_PROFILES['capture']._replace(quality=args.quality)
+    params = [cv2.IMWRITE_JPEG_QUALITY, args.quality]
+
+    reference = cv2.imencode('.jpg', frame, params)[1]
+    reference_pixels = cv2.imdecode(reference, cv2.IMREAD_GRAYSCALE)
+    base_best, base_mean = time_encode(lambda: cv2.imencode('.jpg', frame, params), args.runs)
+
+    print(f"Frame {WIDTH}x{HEIGHT} MONO8, quality {args.quality}, "
+          f"{args.runs} runs, {os.cpu_count()} CPUs")
+    print(f"{'encoder':<16}{'best ms':>10}{'mean ms':>10}{'speed-up':>10}"
+          f"{'bytes':>12}{'max diff':>10}")
+    print(f"{'cv2.imencode':<16}{base_best:>10.1f}{base_mean:>10.1f}{1.0:>10.2f}"
+          f"{len(reference):>12}{0:>10}")
+
+    for workers in args.workers:
+        encoder = camera_server.StripedJpegEncoder(workers)
+        jpeg = encoder.encode(frame, profile)
+        decoded = cv2.imdecode(np.frombuffer(jpeg.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if decoded is None or decoded.shape != frame.shape:
+            print(f"striped x{workers}: stitched JPEG failed to decode")
+            continue
+        diff = int(np.abs(decoded.astype(np.int16) - reference_pixels).max())
+        best, mean = time_encode(lambda: encoder.encode(frame, profile), args.runs)
+        print(f"{'striped x' + str(workers):<16}{best:>10.1f}{mean:>10.1f}"
+              f"{base_best / best:>10.2f}{len(jpeg.data):>12}{diff:>10}")
+
+
+if __name__ == '__main__':
+    main()
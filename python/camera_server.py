@@ -1,29 +1,65 @@
 """
 MagicQC Camera Server
 =====================
-Flask-based HTTP server that bridges the MindVision industrial camera
-to the web-based MagicQC dashboard via MJPEG streaming and REST API.
+ASGI (Starlette + uvicorn) HTTP server that bridges the MindVision
+industrial camera to the web-based MagicQC dashboard via MJPEG streaming
+and REST API.
 
 Usage:
-    python camera_server.py
+    python camera_server.py [--camera auto|mindvision|webcam|synthetic]
+                            [--synthetic-fps N] [--synthetic-jitter-ms MS]
+                            [--acquisition poll|callback]
+                            [--capture-trigger continuous|soft]
+                            [--jpeg-encoder auto|turbojpeg|opencv]
+                            [--jpeg-workers N]
 
 Endpoints:
-    GET  /api/status   - Camera status
-    POST /api/mode     - Set garment color mode (black/other)
-    GET  /api/stream   - MJPEG live stream
-    POST /api/capture  - Capture single frame (returns base64 JPEG)
+    GET  /api/status       - Camera status
+    GET  /api/ping         - Health check
+    GET  /api/metrics      - Prometheus metrics
+    GET  /api/timings      - Capture phase timing percentiles
+    POST /api/mode         - Set garment color mode (black/white/other)
+    GET  /api/stream       - MJPEG live stream
+    POST /api/capture      - Capture single frame (returns base64 JPEG)
+    GET  /api/capture-jpeg - Capture single frame (returns JPEG binary)
+    GET  /api/capture-raw  - Capture single frame (returns raw pixels)
+    GET  /api/capture-burst - N frames averaged / median-stacked (JPEG or raw)
+    GET  /api/preview      - Latest streamed frame as JPEG (binned preview size)
+    WS   /api/ws/tiles     - Live view as changed JPEG tiles (delta updates)
+    GET  /api/cameras      - Every opened camera (id, serial, state)
+    GET  /api/capture-set  - One synchronized (triggered) frame per camera
+    POST /api/capture-jobs - Queue a capture; returns a job id at once
+    GET  /api/capture-jobs/<id>        - Job result (202 while pending)
+    GET  /api/capture-jobs/<id>/events - Job state as Server-Sent Events
+
+Every opened camera is served under /api/cameras/<id>/... (id or serial
+number) with the per-camera endpoints above: status, mode, stream,
+capture, capture-jpeg, capture-raw, capture-burst, capture-jobs,
+preview and ws/tiles. The plain /api/... forms address camera 0;
+POST /api/mode sets every camera.
 
 Runs on http://localhost:5555
 """
 
 import sys
 import os
+import abc
 import time
 import threading
+import asyncio
+import collections
+import itertools
+import functools
 import base64
 import json
+import struct
+import bisect
+import heapq
+import math
 from datetime import datetime
 import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
 
 import cv2
 import numpy as np
@@ -59,15 +95,21 @@ def remove_pid():
         pass
 
 
-# Try to import Flask
+# Try to import the ASGI stack
 try:
-    from flask import Flask, Response, request, jsonify
-    from flask_cors import CORS
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.background import BackgroundTask
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from starlette.routing import Route, WebSocketRoute
+    from starlette.websockets import WebSocketDisconnect
 except ImportError:
     print("=" * 60)
-    print("ERROR: Flask and flask-cors are required.")
+    print("ERROR: Starlette and uvicorn are required.")
     print("Install them with:")
-    print("  pip install flask flask-cors")
+    print("  pip install starlette uvicorn")
     print("=" * 60)
     sys.exit(1)
 
@@ -82,9 +124,14 @@ try:
         CameraAlignFree, CameraSetTriggerMode, CameraPlay,
         CameraUnInit, CameraGetImageBuffer, CameraImageProcess,
         CameraReleaseImageBuffer, CameraFlipFrameBuffer,
-        CameraSetAnalogGain, CameraSetAeState,
-        CAMERA_MEDIA_TYPE_MONO8, CAMERA_STATUS_TIME_OUT,
-        CameraException,
+        CameraSetAnalogGain, CameraSetAeState, CameraSetCallbackFunction,
+        CameraSetImageResolution, CameraSetResolutionForSnap, CameraSnapToBuffer,
+        CameraSoftTrigger, CameraClearBuffer, CameraGetFrameStatistic,
+        CameraGetFrameTimeStamp, CameraEvaluateImageDefinition,
+        CameraSetParameterMode, CameraSetParameterMask, CameraSaveParameter,
+        CameraLoadParameter, CameraGetExposureTime, CameraSetExposureTime,
+        CAMERA_MEDIA_TYPE_MONO8, CAMERA_STATUS_SUCCESS, CAMERA_STATUS_TIME_OUT,
+        CAMERA_SNAP_PROC, CameraException, CameraGetErrorString, GetLastError,
     )
     MINDVISION_AVAILABLE = True
     print("[INFO] MindVision SDK loaded successfully")
@@ -92,36 +139,496 @@ except Exception as e:
     print(f"[WARN] MindVision SDK not available: {e}")
     print("[INFO] Will use OpenCV webcam as fallback")
 
+# Garment scene generator shared with the simulated SDK, so SyntheticCamera
+# and MVSDK_SIMULATE=1 render the same frames
+from garment_scene import synthetic_frame, synthetic_scene
+
+# Optional libjpeg-turbo backend (pip install PyTurboJPEG; needs libturbojpeg)
+TURBOJPEG_AVAILABLE = False
+try:
+    from turbojpeg import (
+        TurboJPEG, TJPF_GRAY, TJPF_BGR, TJSAMP_GRAY, TJSAMP_420, TJSAMP_422,
+        TJSAMP_444, TJFLAG_FASTDCT,
+    )
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    pass
+
 import platform
 
 
+# ============================================================================
+# Metrics
+# ============================================================================
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _ShardedCells:
+    """Per-thread value cells, summed when scraped.
+
+    Each thread only ever writes its own cell, so recording a sample is a
+    dict lookup and a few list increments — no lock on the hot path. The
+    lock is taken once per thread, when its cell is created, and by the
+    scraper. Cells are keyed by thread ident: a new thread that inherits a
+    dead thread's ident keeps adding to its cell, which preserves the
+    totals and bounds memory by the number of idents in use.
+    """
+
+    __slots__ = ('_size', '_cells', '_lock')
+
+    def __init__(self, size):
+        self._size = size
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def cell(self):
+        ident = threading.get_ident()
+        cell = self._cells.get(ident)
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(ident, [0] * self._size)
+        return cell
+
+    def totals(self):
+        with self._lock:
+            cells = list(self._cells.values())
+        return [sum(column) for column in zip(*cells)] or [0] * self._size
+
+
+class _CounterSeries(_ShardedCells):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self.cell()[0] += amount
+
+
+class _HistogramSeries(_ShardedCells):
+    """Non-cumulative bucket counts followed by the running sum."""
+
+    __slots__ = ('buckets',)
+
+    def __init__(self, buckets):
+        super().__init__(len(buckets) + 2)
+        self.buckets = buckets
+
+    def observe(self, value):
+        cell = self.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+
+class Metric(abc.ABC):
+    """A named metric family with optional labels, rendered as Prometheus text.
+
+    `labels(*values)` returns the series for one label combination, created
+    on first use; unlabelled metrics record through `inc()` / `observe()`
+    directly.
+    """
+
+    kind = None
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self.labels()         # Export 0 before the first event
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.get(values)
+                if series is None:
+                    series = self._series[values] = self._new_series()
+        return series
+
+    @abc.abstractmethod
+    def _new_series(self):
+        """Empty series for one label combination."""
+
+    @abc.abstractmethod
+    def _render_series(self, labels, series):
+        """Exposition lines for one series."""
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+        for values, s in series:
+            lines += self._render_series(dict(zip(self.labelnames, values)), s)
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_series(self, labels, series):
+        return [f'{self.name}{format_labels(labels)} {series.totals()[0]}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_series(self, labels, series):
+        totals = series.totals()
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals[:-1]):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{format_labels({**labels, "le": le})} '
+                         f'{cumulative}')
+        lines.append(f'{self.name}_sum{format_labels(labels)} {totals[-1]:.6f}')
+        lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def render_gauge(name, doc, samples, kind='gauge'):
+    """Exposition lines for a value read at scrape time.
+
+    `samples` is a list of (labels dict, value) pairs.
+    """
+    lines = [f'# HELP {name} {doc}', f'# TYPE {name} {kind}']
+    lines += [f'{name}{format_labels(labels)} {value}' for labels, value in samples]
+    return lines
+
+
+# Recorded from the acquisition, encoder and request paths. Grab rate is
+# rate(camera_frames_grabbed_total); subscriber counts, per-subscriber
+# drops and the SDK frame statistics are read when /api/metrics is scraped.
+GRABBED_FRAMES = Counter('camera_frames_grabbed_total',
+                         'Frames read from the camera', ('source',))
+GRAB_SECONDS = Histogram('camera_grab_seconds',
+                         'Time blocked in the SDK waiting for a frame', ('call',))
+GRAB_TIMEOUTS = Counter('camera_grab_timeouts_total',
+                        'CameraGetImageBuffer / CameraSnapToBuffer timeouts', ('call',))
+GRAB_ERRORS = Counter('camera_grab_errors_total',
+                      'Grabs that failed with an SDK error or no free frame buffer',
+                      ('reason',))
+PUBLISHED_FRAMES = Counter('camera_frames_published_total',
+                           'Frames published to the live frame store')
+ENCODE_SECONDS = Histogram('camera_jpeg_encode_seconds',
+                           'JPEG encode time per endpoint', ('endpoint',))
+STREAM_DROPPED = Counter('camera_stream_dropped_frames_total',
+                         'MJPEG parts dropped because a viewer fell behind')
+CAPTURE_LOCK_WAIT = Histogram('camera_capture_lock_wait_seconds',
+                              'Time captures waited for the capture lock',
+                              buckets=WAIT_BUCKETS)
+MODE_SETTLE_WAIT = Histogram('camera_mode_settle_wait_seconds',
+                             'Sleeps before a capture while a new mode settles',
+                             buckets=WAIT_BUCKETS)
+CAPTURE_JOBS = Counter('camera_capture_jobs_total',
+                       'Capture jobs by state reached (queued, done, failed, cancelled)',
+                       ('state',))
+CAPTURE_JOB_QUEUE_WAIT = Histogram('camera_capture_job_queue_seconds',
+                                   'Time capture jobs waited for a worker',
+                                   buckets=WAIT_BUCKETS)
+
+METRICS = (GRABBED_FRAMES, GRAB_SECONDS, GRAB_TIMEOUTS, GRAB_ERRORS,
+           PUBLISHED_FRAMES, ENCODE_SECONDS, STREAM_DROPPED,
+           CAPTURE_LOCK_WAIT, MODE_SETTLE_WAIT, CAPTURE_JOBS, CAPTURE_JOB_QUEUE_WAIT)
+
+# Per-request capture phases, reported in Server-Timing and kept in a
+# rolling log for /api/timings.
+TIMING_LOG_SIZE = 1000            # Captures kept for percentile queries
+TIMING_PERCENTILES = (50, 95, 99)
+
+
+class PhaseTimer:
+    """Wall time of each phase of one capture request, in order."""
+
+    def __init__(self):
+        self.phases = {}
+        self._start = time.perf_counter()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def finish(self):
+        """Record the total since creation; returns the phases."""
+        self.phases['total'] = time.perf_counter() - self._start
+        return self.phases
+
+    def header(self):
+        """Server-Timing header value (durations in milliseconds)."""
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}'
+                         for name, seconds in self.phases.items())
+
+
+class TimingLog:
+    """Rolling log of recent capture phase timings per endpoint."""
+
+    def __init__(self, size=TIMING_LOG_SIZE):
+        self._entries = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, phases):
+        with self._lock:
+            self._entries.append((endpoint, dict(phases)))
+
+    def summary(self, endpoint=None):
+        """{endpoint: {phase: {count, p50, p95, p99}}} in milliseconds."""
+        with self._lock:
+            entries = list(self._entries)
+        samples = {}
+        for name, phases in entries:
+            if endpoint is not None and name != endpoint:
+                continue
+            per_phase = samples.setdefault(name, {})
+            for phase, seconds in phases.items():
+                per_phase.setdefault(phase, []).append(seconds * 1000)
+        return {
+            name: {
+                phase: {'count': len(values),
+                        **{f'p{p}': round(float(v), 1) for p, v in
+                           zip(TIMING_PERCENTILES,
+                               np.percentile(values, TIMING_PERCENTILES))}}
+                for phase, values in per_phase.items()
+            }
+            for name, per_phase in samples.items()
+        }
+
+
+timing_log = TimingLog()
+
+
+# ============================================================================
+# Frame Buffer Pool
+# ============================================================================
+
+# Number of preallocated full-resolution frame buffers. Three slots let the
+# camera write one frame while another is published as `latest_frame` and a
+# third is still being encoded by a slow reader.
+FRAME_POOL_SIZE = 3
+FRAME_POOL_WAIT = 0.2             # Seconds grab() waits for a free slot
+
+
+class FrameRecord:
+    """A captured frame plus its metadata, leased from a FramePool slot.
+
+    Carries the pixels, the SDK FrameHead (exposure, gain), the sensor
+    timestamp, the host capture time and, once published, the frame
+    store's monotonic sequence number. Consumers compare `seq`, never
+    object identity, to tell frames apart.
+
+    The creator owns one reference. Every additional holder calls
+    `retain()` and must call `release()` when done with `image`; the slot
+    returns to the pool once the last reference is released. Records
+    without a pool (webcam frames) are plain arrays and release is a no-op.
+    """
+
+    __slots__ = ('image', 'head', 'seq', 'timestamp', 'sensor_time', '_pool', '_slot')
+
+    def __init__(self, image, pool=None, slot=None, head=None, sensor_time=None):
+        self.image = image
+        self.head = head          # tSdkFrameHead (MindVision only)
+        self.seq = 0              # Frame-store sequence, set when published
+        self.timestamp = time.time()  # Host time the frame was read out
+        self.sensor_time = sensor_time  # CameraGetFrameTimeStamp, camera clock (us)
+        self._pool = pool
+        self._slot = slot
+
+    @property
+    def pooled(self):
+        """True while `image` lives in a FramePool slot."""
+        return self._pool is not None
+
+    def retain(self):
+        if self._pool is not None:
+            self._pool.retain(self._slot)
+        return self
+
+    def release(self):
+        if self._pool is not None:
+            self._pool.release(self._slot)
+
+
+class _FrameSlot:
+    __slots__ = ('address', 'size', 'refs')
+
+    def __init__(self, address, size):
+        self.address = address
+        self.size = size
+        self.refs = 0
+
+
+class FramePool:
+    """Fixed set of aligned frame buffers shared by acquisition and readers.
+
+    Buffers come from `CameraAlignMalloc` so the SDK can process straight
+    into them. A slot is only handed out again once every lease on it has
+    been released, so a published frame can never be overwritten while a
+    reader is still encoding it.
+    """
+
+    def __init__(self, slot_size, count=FRAME_POOL_SIZE):
+        self._cond = threading.Condition()
+        self._closed = False
+        self._slots = [_FrameSlot(CameraAlignMalloc(slot_size, 16), slot_size)
+                       for _ in range(count)]
+
+    def checkout(self, timeout=FRAME_POOL_WAIT):
+        """Return a free slot holding one reference, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                for slot in self._slots:
+                    if slot.refs == 0:
+                        slot.refs = 1
+                        return slot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    return None
+        return None
+
+    def view(self, slot, height, width):
+        """Zero-copy numpy view over the first height*width bytes of a slot."""
+        data = (c_ubyte * (height * width)).from_address(slot.address)
+        return np.frombuffer(data, dtype=np.uint8).reshape((height, width))
+
+    def retain(self, slot):
+        with self._cond:
+            slot.refs += 1
+
+    def release(self, slot):
+        with self._cond:
+            slot.refs -= 1
+            if slot.refs > 0:
+                return
+            if self._closed:
+                self._free(slot)
+            else:
+                self._cond.notify()
+
+    def close(self):
+        """Free idle buffers now; leased ones are freed on their last release."""
+        with self._cond:
+            self._closed = True
+            for slot in self._slots:
+                if slot.refs == 0:
+                    self._free(slot)
+            self._cond.notify_all()
+
+    def _free(self, slot):
+        if slot.address:
+            CameraAlignFree(slot.address)
+            slot.address = 0
+
+
 # ============================================================================
 # Camera Wrapper Classes
 # ============================================================================
 
+# Live preview runs on a binned/skipped sensor preset about this many times
+# narrower than full resolution, so the camera never transfers 15 MP frames
+# while streaming. Captures switch to full resolution through the SDK's
+# snap resolution. /api/preview and the tile channel serve the streamed
+# frame, so they are binned too. Set to 1 to stream at full resolution.
+PREVIEW_DECIMATION = 4
+SNAP_TIMEOUT_MS = 1000
+TRIGGER_TIMEOUT_MS = 1000         # Max wait for a soft-triggered frame
+HARDWARE_TRIGGER_TIMEOUT_MS = 5000  # Max wait for the external trigger pulse
+TRIGGER_SOURCES = {'soft': 1, 'hardware': 2}   # CameraSetTriggerMode values
+CLOCK_SYNC_WINDOW = 64            # Frames used to map sensor timestamps to host time
+# Garment color mode -> (analog gain, AE state)
+MODE_SETTINGS = {'black': (150, 0), 'white': (20, 1), 'other': (64, 1)}
+# Each mode's exposure page (exposure time, AE, analog gain) lives in its
+# own SDK parameter team, so a mode change is a single CameraLoadParameter
+MODE_PARAMETER_TEAMS = {'black': 0, 'white': 1, 'other': 2}   # Teams A, B, C
+PARAM_MODE_BY_SN = 2              # Teams stored per camera serial number
+PROP_SHEET_MASK_EXPOSURE = 1 << 0  # PROP_SHEET_INDEX_EXPOSURE only
+SDK_SHARPNESS_ALGORITHM = 5       # EVALUATE_DEFINITION_LAPLACE (CameraEvaluateImageDefinition)
+
+
+def sdk_check(err_code):
+    """Raise CameraException for a status code an mvsdk setter returned.
+
+    Unlike the getters, the mvsdk setters return their status instead of
+    raising, so a rejected call would otherwise go unnoticed.
+    """
+    if err_code != CAMERA_STATUS_SUCCESS:
+        raise CameraException(err_code)
+
+
 class MindVisionCamera:
     """Wrapper for MindVision industrial camera using mvsdk."""
 
-    def __init__(self):
+    def __init__(self, dev_info=None):
         self.hCamera = 0
-        self.pFrameBuffer = 0
+        self.pool = None
         self.cap = None
-        self.DevInfo = None
+        self.DevInfo = dev_info   # tSdkCameraDevInfo; None opens the first camera
         self.is_open = False
+        self.preview_res = None   # Sensor preset used while streaming
+        self.full_res = None      # Snap resolution used for captures
+        self._snap_proc = None    # Keeps the ctypes callback alive while registered
+        # Host-minus-sensor clock offsets of recent frames; the smallest one
+        # has the least delivery latency in it
+        self._clock_offsets = collections.deque(maxlen=CLOCK_SYNC_WINDOW)
+        self.learned_exposure = {}    # Mode -> converged exposure time (us)
+        self.parameter_teams = False  # Teams set up per serial, exposure page only
+        self._saved_teams = set()     # Modes whose parameter team holds this run's settings
+
+    @staticmethod
+    def enumerate():
+        """DevInfo of every connected MindVision camera."""
+        CameraSdkInit(1)
+        return CameraEnumerateDevice()
 
     def open(self):
         if self.is_open:
             return True
 
         try:
-            CameraSdkInit(1)
-            camera_list = CameraEnumerateDevice()
-            if len(camera_list) == 0:
-                print("[ERROR] No MindVision camera found")
-                return False
-
-            self.DevInfo = camera_list[0]
-            print(f"[INFO] Found camera: {self.DevInfo.GetFriendlyName()}")
+            if self.DevInfo is None:
+                camera_list = MindVisionCamera.enumerate()
+                if len(camera_list) == 0:
+                    print("[ERROR] No MindVision camera found")
+                    return False
+                self.DevInfo = camera_list[0]
+            print(f"[INFO] Found camera: {self.DevInfo.GetFriendlyName()} "
+                  f"(SN {self.DevInfo.GetSn()})")
 
             self.hCamera = CameraInit(self.DevInfo, -1, -1)
             self.cap = CameraGetCapability(self.hCamera)
@@ -131,9 +638,11 @@ class MindVisionCamera:
 
             buf_size = (self.cap.sResolutionRange.iWidthMax *
                         self.cap.sResolutionRange.iHeightMax * 1)
-            self.pFrameBuffer = CameraAlignMalloc(buf_size, 16)
+            self.pool = FramePool(buf_size)
+            self._configure_preview_resolution()
 
             CameraSetTriggerMode(self.hCamera, 0)
+            self._setup_parameter_teams()
             CameraPlay(self.hCamera)
 
             self.is_open = True
@@ -142,59 +651,361 @@ class MindVisionCamera:
 
         except CameraException as e:
             print(f"[ERROR] CameraInit failed ({e.error_code}): {e.message}")
+            self.close()
             return False
 
+    def _configure_preview_resolution(self):
+        """Stream on a reduced sensor preset; snaps keep full resolution."""
+        presets = [self.cap.pImageSizeDesc[i].clone()
+                   for i in range(self.cap.iImageSizeDesc)]
+        if not presets:
+            return
+        full = self.full_res = max(presets, key=lambda r: r.iWidth * r.iHeight)
+        sdk_check(CameraSetResolutionForSnap(self.hCamera, full))
+
+        # Only binned / skipped presets: they keep the full field of view,
+        # whereas an ROI crop would stream just the middle of the garment
+        target_w = full.iWidth // max(PREVIEW_DECIMATION, 1)
+        smaller = [r for r in presets
+                   if target_w <= r.iWidth < full.iWidth
+                   and (r.iWidthFOV, r.iHeightFOV) == (full.iWidthFOV, full.iHeightFOV)]
+        if PREVIEW_DECIMATION <= 1 or not smaller:
+            sdk_check(CameraSetImageResolution(self.hCamera, full))
+            return
+        preview = min(smaller, key=lambda r: r.iWidth)
+        sdk_check(CameraSetImageResolution(self.hCamera, preview))
+        self.preview_res = preview
+        print(f"[INFO] Preview resolution: {preview.GetDescription()} "
+              f"({preview.iWidth}x{preview.iHeight}), "
+              f"snap: {full.iWidth}x{full.iHeight}")
+
+    @property
+    def hardware_preview(self):
+        """True when streamed frames come from a reduced sensor preset."""
+        return self.preview_res is not None
+
+    @property
+    def sensor_width(self):
+        return self.cap.sResolutionRange.iWidthMax if self.cap else None
+
     def close(self):
+        self.stop_callback()
         if self.hCamera > 0:
             CameraUnInit(self.hCamera)
             self.hCamera = 0
-        if self.pFrameBuffer != 0:
-            CameraAlignFree(self.pFrameBuffer)
-            self.pFrameBuffer = 0
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        self.preview_res = None
         self.is_open = False
 
+    def _setup_parameter_teams(self):
+        """Keep teams per serial number and limit them to the exposure page,
+        so loading one never touches resolution or trigger settings.
+
+        If either call fails, modes are always applied setting by setting.
+        """
+        err = CameraSetParameterMode(self.hCamera, PARAM_MODE_BY_SN)
+        if err == CAMERA_STATUS_SUCCESS:
+            err = CameraSetParameterMask(self.hCamera, PROP_SHEET_MASK_EXPOSURE)
+        self.parameter_teams = err == CAMERA_STATUS_SUCCESS
+        if not self.parameter_teams:
+            print(f"[WARN] Parameter teams unavailable ({err}): {CameraGetErrorString(err)}")
+
     def set_mode(self, mode):
-        """Set gain and auto-exposure based on garment color."""
+        """Set gain and auto-exposure based on garment color.
+
+        Once a mode has been remembered this run, its parameter team is
+        loaded in one call, learned exposure included, so an AE mode
+        starts out converged. Otherwise, or if the load fails, the
+        settings are applied one by one (with the learned exposure, if any).
+        """
         if not self.is_open:
             return
-        if mode == 'black':
-            CameraSetAnalogGain(self.hCamera, 150)
-            CameraSetAeState(self.hCamera, 0)  # AE OFF
-            print("[INFO] Mode: BLACK (gain=150, AE=OFF)")
-        elif mode == 'white':
-            CameraSetAnalogGain(self.hCamera, 20)
-            CameraSetAeState(self.hCamera, 1)  # AE ON
-            print("[INFO] Mode: WHITE (gain=20, AE=ON)")
+        if mode not in MODE_SETTINGS:
+            mode = 'other'
+        team = MODE_PARAMETER_TEAMS[mode]
+        if mode in self._saved_teams:
+            err = CameraLoadParameter(self.hCamera, team)
+            if err == CAMERA_STATUS_SUCCESS:
+                print(f"[INFO] Mode: {mode.upper()} (parameter team {'ABCD'[team]}, "
+                      f"exposure {self.learned_exposure[mode] / 1000:.2f} ms)")
+                return
+            print(f"[WARN] CameraLoadParameter failed ({err}): {CameraGetErrorString(err)}")
+            self._saved_teams.discard(mode)
+
+        gain, ae_state = MODE_SETTINGS[mode]
+        CameraSetAnalogGain(self.hCamera, gain)
+        CameraSetAeState(self.hCamera, ae_state)
+        exposure = self.learned_exposure.get(mode)
+        if exposure is not None:
+            CameraSetExposureTime(self.hCamera, exposure)
+        print(f"[INFO] Mode: {mode.upper()} (gain={gain}, AE={'ON' if ae_state else 'OFF'})")
+
+    def remember_mode(self, mode):
+        """Save the converged settings of the current `mode` to its parameter team."""
+        if not self.is_open or mode not in MODE_SETTINGS:
+            return
+        exposure = CameraGetExposureTime(self.hCamera)
+        err = GetLastError()
+        if err != CAMERA_STATUS_SUCCESS:
+            print(f"[WARN] CameraGetExposureTime failed ({err}): {CameraGetErrorString(err)}")
+            return
+        self.learned_exposure[mode] = exposure
+        if not self.parameter_teams:
+            return
+        err = CameraSaveParameter(self.hCamera, MODE_PARAMETER_TEAMS[mode])
+        if err == CAMERA_STATUS_SUCCESS:
+            self._saved_teams.add(mode)
         else:
-            CameraSetAnalogGain(self.hCamera, 64)
-            CameraSetAeState(self.hCamera, 1)  # AE ON
-            print("[INFO] Mode: OTHER (gain=64, AE=ON)")
+            print(f"[WARN] CameraSaveParameter failed ({err}): {CameraGetErrorString(err)}")
+            self._saved_teams.discard(mode)     # The team may hold older settings
 
     def grab(self):
-        """Grab a single frame. Returns BGR numpy array or None."""
+        """Grab a single frame into its own pool slot.
+
+        Returns a FrameRecord (owned by the caller) or None when no frame
+        or no free slot is available.
+        """
+        return self._read(CameraGetImageBuffer, 200, 'grab')
+
+    def snap(self):
+        """Grab one fresh full-resolution frame through the snap resolution.
+
+        The SDK switches the sensor to the snap resolution for a single
+        exposure, so the frame always starts after this call. Falls back
+        to grab() when streaming already runs at full resolution. A frame
+        callback is unregistered for the snap, as the SDK does not deliver
+        it to CameraSnapToBuffer while one is registered.
+        """
+        if not self.hardware_preview:
+            return self.grab()
+        with self.callback_paused():
+            return self._read(CameraSnapToBuffer, SNAP_TIMEOUT_MS, 'snap')
+
+    @contextmanager
+    def trigger_mode(self, source='soft'):
+        """Run the sensor in trigger mode for the enclosed block.
+
+        Exposures only start on soft_trigger() (`source='soft'`) or on a
+        pulse at the external trigger input (`'hardware'`), at full
+        resolution. Frames already queued from continuous mode are
+        discarded, and continuous streaming (at the preview resolution)
+        resumes on exit. Raises CameraException if the SDK rejects the
+        switch or cannot discard the queued frames.
+        """
+        sdk_check(CameraSetTriggerMode(self.hCamera, TRIGGER_SOURCES[source]))
+        try:
+            if self.hardware_preview:
+                sdk_check(CameraSetImageResolution(self.hCamera, self.full_res))
+            sdk_check(CameraClearBuffer(self.hCamera))
+            yield
+        finally:
+            if self.hardware_preview:
+                err = CameraSetImageResolution(self.hCamera, self.preview_res)
+                if err != CAMERA_STATUS_SUCCESS:
+                    print(f"[ERROR] Restoring preview resolution failed ({err}): "
+                          f"{CameraGetErrorString(err)}")
+            err = CameraSetTriggerMode(self.hCamera, 0)
+            if err != CAMERA_STATUS_SUCCESS:
+                print(f"[ERROR] Leaving trigger mode failed ({err}): "
+                      f"{CameraGetErrorString(err)}")
+
+    def soft_trigger(self):
+        """Fire one software trigger; returns its time.perf_counter().
+
+        Raises CameraException if the SDK rejects the trigger.
+        """
+        fired_at = time.perf_counter()
+        sdk_check(CameraSoftTrigger(self.hCamera))
+        return fired_at
+
+    def grab_triggered(self, deadline=None):
+        """Grab the next triggered frame, skipping any continuous-mode leftovers.
+
+        Waits until `deadline` (time.monotonic()), by default
+        TRIGGER_TIMEOUT_MS from now.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + TRIGGER_TIMEOUT_MS / 1000.0
+        while True:
+            # One read for the whole remaining wait: an external trigger
+            # can come much later than a grab's usual timeout
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return None
+            lease = self._read(CameraGetImageBuffer, remaining_ms, 'trigger')
+            if lease is None or lease.head.bIsTrigger:
+                return lease
+            lease.release()
+
+    def _read(self, get_buffer, timeout_ms, call):
         if not self.is_open:
             return None
+        slot = self.pool.checkout()
+        if slot is None:
+            GRAB_ERRORS.labels('no_buffer').inc()
+            return None  # Every slot is still leased by a reader
         try:
-            pRawData, FrameHead = CameraGetImageBuffer(self.hCamera, 200)
-            CameraImageProcess(self.hCamera, pRawData,
-                               self.pFrameBuffer, FrameHead)
+            t0 = time.perf_counter()
+            pRawData, FrameHead = get_buffer(self.hCamera, timeout_ms)
+            GRAB_SECONDS.labels(call).observe(time.perf_counter() - t0)
+            sensor_time = self._sensor_time()
+            err = CameraImageProcess(self.hCamera, pRawData, slot.address, FrameHead)
             CameraReleaseImageBuffer(self.hCamera, pRawData)
+            sdk_check(err)  # Otherwise the slot holds stale pixels
 
             if platform.system() == "Windows":
-                CameraFlipFrameBuffer(self.pFrameBuffer, FrameHead, 1)
+                CameraFlipFrameBuffer(slot.address, FrameHead, 1)
 
-            frame_data = (c_ubyte * FrameHead.uBytes).from_address(
-                self.pFrameBuffer)
-            frame = np.frombuffer(frame_data, dtype=np.uint8)
-            # Return grayscale directly — cv2.imencode handles it fine
-            # and avoids expensive GRAY2BGR on 5456x2812 frames
-            return frame.reshape((FrameHead.iHeight, FrameHead.iWidth))
+            # Grayscale view straight over the slot — cv2.imencode handles
+            # it fine and avoids expensive GRAY2BGR on 5456x2812 frames
+            frame = self.pool.view(slot, FrameHead.iHeight, FrameHead.iWidth)
+            GRABBED_FRAMES.labels('sdk').inc()
+            return FrameRecord(frame, self.pool, slot, FrameHead, sensor_time)
 
         except CameraException as e:
-            if e.error_code != CAMERA_STATUS_TIME_OUT:
+            self.pool.release(slot)
+            if e.error_code == CAMERA_STATUS_TIME_OUT:
+                GRAB_TIMEOUTS.labels(call).inc()
+            else:
+                GRAB_ERRORS.labels('sdk').inc()
                 print(f"[ERROR] Grab failed ({e.error_code}): {e.message}")
             return None
 
+    def _sensor_time(self):
+        """Sensor timestamp (us) of the frame just fetched; records its clock offset.
+
+        None when the SDK cannot report it: the wrapper then returns 0,
+        which would wreck the host/sensor clock mapping.
+        """
+        received = time.time()
+        sensor_time = CameraGetFrameTimeStamp(self.hCamera)
+        if GetLastError() != CAMERA_STATUS_SUCCESS:
+            return None
+        self._clock_offsets.append(received - sensor_time / 1e6)
+        return sensor_time
+
+    def host_time(self, sensor_time):
+        """Map a sensor timestamp (us, camera clock) onto time.time().
+
+        Every frame's host-minus-sensor offset includes a varying delivery
+        delay; the smallest over the last CLOCK_SYNC_WINDOW frames is the
+        closest to the true offset and still follows clock drift. Unlike
+        raw sensor timestamps, the result is comparable across cameras.
+        """
+        if sensor_time is None or not self._clock_offsets:
+            return None
+        return sensor_time / 1e6 + min(self._clock_offsets)
+
+    def start_callback(self, on_frame):
+        """Have the SDK push every frame to `on_frame(lease)` from its own thread.
+
+        Replaces polling grab(): no timeouts, no sleeps. While a callback is
+        registered CameraGetImageBuffer no longer delivers frames, so callers
+        must take frames from the frame store instead of calling grab().
+        """
+        if not self.is_open or self._snap_proc is not None:
+            return False
+
+        def snap_proc(hCamera, pRawData, pFrameHead, pContext):
+            # Runs on the SDK's acquisition thread; the SDK owns pRawData
+            # and recycles it when we return, so never block here.
+            slot = self.pool.checkout(timeout=0)
+            if slot is None:
+                GRAB_ERRORS.labels('no_buffer').inc()
+                return  # Every slot is still leased — drop this frame
+            try:
+                FrameHead = pFrameHead[0].clone()
+                sensor_time = self._sensor_time()
+                sdk_check(CameraImageProcess(hCamera, pRawData, slot.address, FrameHead))
+                if platform.system() == "Windows":
+                    CameraFlipFrameBuffer(slot.address, FrameHead, 1)
+                frame = self.pool.view(slot, FrameHead.iHeight, FrameHead.iWidth)
+                lease = FrameRecord(frame, self.pool, slot, FrameHead, sensor_time)
+            except Exception as e:
+                self.pool.release(slot)
+                GRAB_ERRORS.labels('sdk').inc()
+                print(f"[ERROR] Frame callback failed: {e}")
+                return
+            GRABBED_FRAMES.labels('callback').inc()
+            on_frame(lease)
+
+        self._snap_proc = CAMERA_SNAP_PROC(snap_proc)
+        try:
+            sdk_check(CameraSetCallbackFunction(self.hCamera, self._snap_proc, 0))
+        except CameraException as e:
+            self._snap_proc = None
+            print(f"[ERROR] Could not register the frame callback ({e.error_code}): "
+                  f"{e.message}")
+            return False
+        print("[INFO] MindVision callback acquisition enabled")
+        return True
+
+    def stop_callback(self):
+        """Unregister the frame callback; grab() works again afterwards."""
+        if self._snap_proc is None:
+            return
+        if self.hCamera > 0:
+            err = CameraSetCallbackFunction(self.hCamera, None, 0)
+            if err != CAMERA_STATUS_SUCCESS:
+                print(f"[ERROR] Could not unregister the frame callback ({err}): "
+                      f"{CameraGetErrorString(err)}")
+        self._snap_proc = None
+
+    @contextmanager
+    def callback_paused(self):
+        """Unregister the frame callback, if any, for the enclosed block.
+
+        The stream misses the frames exposed meanwhile. Raises
+        CameraException if the SDK rejects the unregistration.
+        """
+        snap_proc = self._snap_proc
+        if snap_proc is None:
+            yield
+            return
+        sdk_check(CameraSetCallbackFunction(self.hCamera, None, 0))
+        try:
+            yield
+        finally:
+            err = CameraSetCallbackFunction(self.hCamera, snap_proc, 0)
+            if err != CAMERA_STATUS_SUCCESS:
+                print(f"[ERROR] Could not re-register the frame callback ({err}): "
+                      f"{CameraGetErrorString(err)}")
+
+    @property
+    def callback_active(self):
+        return self._snap_proc is not None
+
+    def evaluate_sharpness(self, lease):
+        """CameraEvaluateImageDefinition score of a frame this camera read.
+
+        None when the SDK cannot score it: the wrapper returns 0.0 both on
+        an error and on models without the evaluation.
+        """
+        score = CameraEvaluateImageDefinition(self.hCamera, SDK_SHARPNESS_ALGORITHM,
+                                              lease.image.ctypes.data, lease.head)
+        err = GetLastError()
+        if err != CAMERA_STATUS_SUCCESS:
+            print(f"[WARN] CameraEvaluateImageDefinition failed ({err}): "
+                  f"{CameraGetErrorString(err)}")
+            return None
+        return score or None
+
+    def frame_statistics(self):
+        """SDK frame counters (total, captured, lost) since the camera opened.
+
+        None when the SDK cannot report them (the wrapper returns zeros).
+        """
+        if not self.is_open:
+            return None
+        stats = CameraGetFrameStatistic(self.hCamera)
+        err = GetLastError()
+        if err != CAMERA_STATUS_SUCCESS:
+            print(f"[WARN] CameraGetFrameStatistic failed ({err}): {CameraGetErrorString(err)}")
+            return None
+        return stats.iTotal, stats.iCapture, stats.iLost
+
     @property
     def camera_type(self):
         return "mindvision"
@@ -248,321 +1059,3090 @@ class WebcamCamera:
         print(f"[INFO] Webcam mode: {mode.upper()}")
 
     def grab(self):
-        """Grab a single frame. Returns BGR numpy array or None."""
+        """Grab a single frame. Returns a FrameRecord over a BGR array or None."""
         if not self.is_open or not self.cap:
             return None
+        t0 = time.perf_counter()
         ret, frame = self.cap.read()
-        return frame if ret else None
+        GRAB_SECONDS.labels('webcam').observe(time.perf_counter() - t0)
+        if not ret:
+            GRAB_ERRORS.labels('webcam').inc()
+            return None
+        GRABBED_FRAMES.labels('webcam').inc()
+        return FrameRecord(frame)
 
     @property
     def camera_type(self):
         return "webcam"
 
 
-# ============================================================================
-# Camera Server Application
-# ============================================================================
+# Hardware-free camera for benchmarks and CI (--camera synthetic)
+SYNTHETIC_WIDTH, SYNTHETIC_HEIGHT = 5456, 2812   # MindVision full resolution
+SYNTHETIC_FPS = 15
+SYNTHETIC_VARIANTS = 3            # Pre-rendered noise variants cycled by grab()
+SYNTHETIC_GAIN = {'black': 1.8, 'white': 0.7, 'other': 1.0}
 
-app = Flask(__name__)
-CORS(app, origins="*", expose_headers=[
-    'X-Image-Width', 'X-Image-Height', 'X-Capture-Timestamp', 'X-Camera-Mode'
-])  # Allow all origins; expose custom headers for browser JS
 
-# Global state
-camera = None
-current_mode = 'other'
-latest_frame = None
-frame_lock = threading.Lock()
-streaming = False
-stream_thread = None
-streaming_paused = False          # Pause streaming for exclusive capture
-mode_changed_at = 0.0             # Timestamp of last mode change
-MODE_SETTLE_TIME = 0.5            # Seconds to wait after mode change (per reference code)
-capture_lock = threading.Lock()   # Prevent concurrent captures
+class SyntheticCamera:
+    """Generated MONO8 garment frames at the MindVision resolution.
 
+    Frames come off a free-running clock at `fps`, each period perturbed
+    by `jitter` seconds (standard deviation), so grab() blocks the way a
+    real sensor does and a late reader gets the newest frame at once. A
+    few noise variants are rendered at open() and cycled, keeping grabs
+    cheap enough to measure the server rather than the generator.
+    """
 
-def init_camera():
-    """Initialize the best available camera."""
-    global camera
+    def __init__(self, fps=SYNTHETIC_FPS, jitter=0.0,
+                 width=SYNTHETIC_WIDTH, height=SYNTHETIC_HEIGHT):
+        self.fps = fps
+        self.jitter = jitter
+        self.width = width
+        self.height = height
+        self.is_open = False
+        self._raw = []            # Noise variants at unity gain
+        self._frames = []         # Variants with the current mode's gain
+        self._index = 0
+        self._next_frame = 0.0
+        self._rng = np.random.default_rng()
+        self._lock = threading.Lock()
 
-    if MINDVISION_AVAILABLE:
-        camera = MindVisionCamera()
-        if camera.open():
-            camera.set_mode(current_mode)
+    def open(self):
+        if self.is_open:
             return True
-        print("[WARN] MindVision camera failed, trying webcam fallback...")
-
-    camera = WebcamCamera(0)
-    if camera.open():
-        camera.set_mode(current_mode)
+        scene = synthetic_scene(self.width, self.height)
+        self._raw = [synthetic_frame(self.width, self.height, seed, scene)
+                     for seed in range(SYNTHETIC_VARIANTS)]
+        for frame in self._raw:
+            frame.flags.writeable = False   # Shared by every lease
+        self._frames = self._raw
+        self._next_frame = time.monotonic()
+        self.is_open = True
+        print(f"[INFO] Synthetic camera opened: {self.width}x{self.height} MONO8 "
+              f"at {self.fps} fps (jitter {self.jitter * 1000:.1f} ms)")
         return True
 
-    print("[ERROR] No camera available!")
-    camera = None
-    return False
+    def close(self):
+        self._raw = self._frames = []
+        self.is_open = False
 
+    def set_mode(self, mode):
+        """Apply the mode's gain to the pre-rendered frames."""
+        if not self.is_open:
+            return
+        gain = SYNTHETIC_GAIN.get(mode, SYNTHETIC_GAIN['other'])
+        lut = np.clip(np.arange(256) * gain, 0, 255).astype(np.uint8)
+        frames = [cv2.LUT(frame, lut) for frame in self._raw]
+        for frame in frames:
+            frame.flags.writeable = False
+        self._frames = frames
+        print(f"[INFO] Synthetic mode: {mode.upper()} (gain x{gain})")
 
-def stream_worker():
-    """Background thread that continuously grabs frames for streaming."""
-    global latest_frame, streaming
-    while streaming and camera and camera.is_open:
-        if streaming_paused:
-            time.sleep(0.01)  # Yield camera access during capture
-            continue
-        frame = camera.grab()
-        if frame is not None:
-            with frame_lock:
-                latest_frame = frame
-        else:
-            time.sleep(0.005)  # Brief pause only on failed grabs
+    def grab(self):
+        """Block until the next frame is due; returns a FrameRecord or None."""
+        if not self.is_open:
+            return None
+        t0 = time.perf_counter()
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_frame:
+                time.sleep(self._next_frame - now)
+            else:
+                # Frames finished while nobody read; deliver the newest now
+                self._next_frame += int((now - self._next_frame) * self.fps) / self.fps
+            period = 1.0 / self.fps
+            if self.jitter:
+                period = max(0.0, period + self._rng.normal(0, self.jitter))
+            self._next_frame += period
+            frame = self._frames[self._index % len(self._frames)]
+            self._index += 1
+        GRAB_SECONDS.labels('synthetic').observe(time.perf_counter() - t0)
+        GRABBED_FRAMES.labels('synthetic').inc()
+        return FrameRecord(frame)
 
+    @property
+    def sensor_width(self):
+        return self.width
 
-def start_streaming():
-    """Start the background frame-grabbing thread."""
-    global streaming, stream_thread
-    if streaming:
-        return
-    streaming = True
-    stream_thread = threading.Thread(target=stream_worker, daemon=True)
-    stream_thread.start()
-    print("[INFO] Streaming started")
+    @property
+    def camera_type(self):
+        return "synthetic"
 
 
-def stop_streaming():
-    """Stop the background streaming thread."""
-    global streaming
-    streaming = False
-    if stream_thread:
-        stream_thread.join(timeout=2)
-    print("[INFO] Streaming stopped")
+# ============================================================================
+# Camera Ownership
+# ============================================================================
 
+CAMERA_ACQUIRE_TIMEOUT = 2.0      # Max seconds a capture waits for the stream to park
 
-# Downscale factor for MJPEG streaming (full-res is 5456x2812 = too slow)
-# Capture always uses full resolution.
-STREAM_SCALE = 0.25   # 1364x703 — fast enough for smooth live preview
 
+class CameraBusy(Exception):
+    """The stream thread did not hand over the camera in time."""
 
-def generate_mjpeg():
-    """Generator that yields MJPEG frames for streaming."""
-    prev_id = None
-    while streaming:
-        with frame_lock:
-            frame = latest_frame
-        fid = id(frame)
-        if frame is not None and fid != prev_id:
-            # Downsample for streaming speed
-            h, w = frame.shape[:2]
-            small = cv2.resize(frame, (int(w * STREAM_SCALE), int(h * STREAM_SCALE)),
-                               interpolation=cv2.INTER_NEAREST)
-            _, jpeg = cv2.imencode('.jpg', small,
-                                   [cv2.IMWRITE_JPEG_QUALITY, 70])
-            prev_id = fid
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' +
-                   jpeg.tobytes() + b'\r\n')
-        else:
-            time.sleep(0.016)  # ~60fps cap
 
+class CameraAccess:
+    """Hands exclusive camera access between the stream thread and captures.
 
-# ============================================================================
-# API Endpoints
-# ============================================================================
+    A capture calls `exclusive()`, which blocks until the stream thread has
+    finished its in-flight grab and parked at `checkpoint()`. The stream
+    thread sleeps on the condition while parked and is woken the moment the
+    capture releases the camera — no polling and no guessed sleeps.
+    """
 
-@app.route('/api/status', methods=['GET'])
-def status():
-    """Return camera status."""
-    return jsonify({
-        'status': 'ready' if camera and camera.is_open else 'no_camera',
-        'camera_type': camera.camera_type if camera else None,
-        'current_mode': current_mode,
-        'streaming': streaming,
-        'server': 'MagicQC Camera Server v1.0',
-    })
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._requests = 0        # Captures holding or waiting for the camera
+        self._stream_active = False
+        self._stream_parked = False
 
+    def stream_started(self):
+        with self._cond:
+            self._stream_active = True
 
-@app.route('/api/ping', methods=['GET'])
-def ping():
-    """Ultra-lightweight health check — no camera interaction."""
-    return '', 200
+    def stream_stopped(self):
+        with self._cond:
+            self._stream_active = False
+            self._stream_parked = False
+            self._cond.notify_all()
 
+    def checkpoint(self):
+        """Stream thread: park here while a capture owns the camera."""
+        with self._cond:
+            if not self._requests:
+                return
+            self._stream_parked = True
+            self._cond.notify_all()
+            while self._requests and self._stream_active:
+                self._cond.wait()
+            self._stream_parked = False
 
-@app.route('/api/mode', methods=['POST'])
-def set_mode():
-    """Set garment color mode (black, white, or other)."""
-    global current_mode, mode_changed_at, latest_frame
-    data = request.get_json(silent=True) or {}
-    mode = data.get('mode', 'other')
+    @contextmanager
+    def exclusive(self, timeout=CAMERA_ACQUIRE_TIMEOUT):
+        """Capture side: own the camera for the enclosed block.
 
-    if mode not in ('black', 'white', 'other'):
-        return jsonify({'error': 'Invalid mode. Use "black", "white", or "other".'}), 400
+        Yields the seconds spent waiting for the stream thread to park.
+        Raises CameraBusy if it has not parked within `timeout`, rather
+        than grabbing while the stream thread still may be.
+        """
+        t0 = time.perf_counter()
+        with self._cond:
+            self._requests += 1
+            if not self._cond.wait_for(
+                    lambda: not self._stream_active or self._stream_parked, timeout):
+                self._requests -= 1
+                self._cond.notify_all()
+                raise CameraBusy(f"Stream thread did not yield the camera within {timeout}s")
+        try:
+            yield time.perf_counter() - t0
+        finally:
+            with self._cond:
+                self._requests -= 1
+                self._cond.notify_all()
 
-    current_mode = mode
-    mode_changed_at = time.time()
 
-    if camera and camera.is_open:
-        camera.set_mode(mode)
+# ============================================================================
+# JPEG Encoding
+# ============================================================================
 
-    # Clear cached frame so streaming picks up fresh frames with new settings
-    with frame_lock:
-        latest_frame = None
+JPEG_ENCODERS = ('auto', 'turbojpeg', 'opencv')
+JPEG_BUFFERS_PER_SIZE = 2         # Spare output buffers kept per buffer size
 
-    print(f"[INFO] Mode changed to '{mode}' — camera needs ~{MODE_SETTLE_TIME}s to stabilize")
+JPEG_STRIPE_WORKERS_MAX = 8
 
-    mode_settings = {
-        'black': {'gain': 150, 'auto_exposure': 'OFF'},
-        'white': {'gain': 20, 'auto_exposure': 'ON'},
-        'other': {'gain': 64, 'auto_exposure': 'ON'},
-    }
+# Per-endpoint encode settings. Subsampling only applies to color frames;
+# MONO8 frames are always encoded as grayscale. `striped` profiles use the
+# multi-core striped encoder when one is enabled (--jpeg-workers > 1).
+EncodeProfile = collections.namedtuple('EncodeProfile',
+                                       'quality subsampling fast_dct striped')
+ENCODE_PROFILES = {
+    'capture': EncodeProfile(95, '444', False, True),   # Measurement images
+    'preview': EncodeProfile(90, '420', True, True),
+    'stream': EncodeProfile(70, '420', True, False),    # Quality set per broadcaster
+}
 
-    return jsonify({
-        'success': True,
-        'mode': current_mode,
-        'settings': mode_settings.get(mode, mode_settings['other']),
-    })
 
+class EncodedJpeg:
+    """JPEG bytes as a memoryview over the encoder's output buffer.
 
-@app.route('/api/stream', methods=['GET'])
-def video_stream():
-    """MJPEG live stream endpoint."""
-    if not camera or not camera.is_open:
-        return jsonify({'error': 'Camera not available'}), 503
+    Call `release()` once the bytes have been sent so a pooled buffer can
+    be reused for the next encode.
+    """
 
-    start_streaming()
-    return Response(generate_mjpeg(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    __slots__ = ('data', 'encode_time', 'encoder', '_release')
 
+    def __init__(self, data, encode_time, encoder, release=None):
+        self.data = data
+        self.encode_time = encode_time
+        self.encoder = encoder
+        self._release = release
 
-@app.route('/api/capture', methods=['POST'])
-def capture():
-    """Capture a single high-quality frame and return as base64 JPEG.
-    (Legacy endpoint — prefer /api/capture-jpeg for speed.)"""
-    global current_mode, mode_changed_at, streaming_paused
-
-    if not camera or not camera.is_open:
-        return jsonify({'error': 'Camera not available'}), 503
-
-    with capture_lock:
-        data = request.get_json(silent=True) or {}
-        req_mode = data.get('mode', current_mode)
-        if req_mode in ('black', 'white', 'other') and req_mode != current_mode:
-            current_mode = req_mode
-            camera.set_mode(current_mode)
-            mode_changed_at = time.time()
-
-        # Stabilize
-        elapsed = time.time() - mode_changed_at
-        if 0 < elapsed < MODE_SETTLE_TIME:
-            time.sleep(MODE_SETTLE_TIME - elapsed)
-
-        # Pause streaming and do fresh grab
-        streaming_paused = True
-        time.sleep(0.02)
-        try:
-            camera.grab()  # flush
-            frame = camera.grab()
-        finally:
-            streaming_paused = False
+    def release(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
 
-    if frame is None:
-        return jsonify({'error': 'Failed to capture frame'}), 500
 
-    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-    b64 = base64.b64encode(jpeg.tobytes()).decode('utf-8')
+class JpegBufferPool:
+    """Reusable worst-case-sized output buffers, keyed by size."""
 
-    h, w = frame.shape[:2]
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    def __init__(self, per_size=JPEG_BUFFERS_PER_SIZE):
+        self._per_size = per_size
+        self._free = {}
+        self._lock = threading.Lock()
 
-    return jsonify({
-        'success': True,
-        'image': b64,
-        'width': w,
-        'height': h,
-        'mode': current_mode,
-        'timestamp': timestamp,
-        'camera_type': camera.camera_type,
-    })
+    def acquire(self, size):
+        with self._lock:
+            spare = self._free.get(size)
+            if spare:
+                return spare.pop()
+        return bytearray(size)
 
+    def give_back(self, buf):
+        with self._lock:
+            spare = self._free.setdefault(len(buf), [])
+            if len(spare) < self._per_size:
+                spare.append(buf)
 
-@app.route('/api/capture-jpeg', methods=['GET'])
-def capture_jpeg():
-    """High-quality capture — returns raw JPEG binary with metadata in headers.
 
-    Uses the same pattern as the reference capture code:
-      1. Apply / confirm camera mode settings
-      2. Wait for sensor to stabilize (gain + auto-exposure)
-      3. Flush stale frames from the camera buffer
-      4. Grab a fresh frame
-    """
-    global current_mode, mode_changed_at, streaming_paused
+class OpenCVEncoder:
+    """cv2.imencode fallback. Always available; no fast-DCT option."""
 
-    if not camera or not camera.is_open:
-        return jsonify({'error': 'Camera not available'}), 503
+    name = 'opencv'
+    _SAMPLING = {
+        key: getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{key}', None)
+        for key in ('420', '422', '444')
+    }
 
-    with capture_lock:
-        # Accept optional mode parameter — frontend sends its expected mode
-        # so we can verify / re-apply if needed.
-        req_mode = request.args.get('mode', current_mode)
-        if req_mode in ('black', 'white', 'other') and req_mode != current_mode:
-            current_mode = req_mode
-            camera.set_mode(current_mode)
-            mode_changed_at = time.time()
-            print(f"[CAPTURE] Mode force-set to '{current_mode}' via capture param")
+    def encode(self, frame, profile):
+        params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality]
+        sampling = self._SAMPLING.get(profile.subsampling)
+        if frame.ndim == 3 and sampling is not None:
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling]
+        t0 = time.perf_counter()
+        ok, jpeg = cv2.imencode('.jpg', frame, params)
+        if not ok:
+            raise RuntimeError("cv2.imencode failed")
+        return EncodedJpeg(jpeg.reshape(-1).data, time.perf_counter() - t0,
+                           self.name)
 
-        # Wait for mode to stabilize if recently changed (per reference code)
-        elapsed = time.time() - mode_changed_at
-        if 0 < elapsed < MODE_SETTLE_TIME:
-            wait = MODE_SETTLE_TIME - elapsed
-            print(f"[CAPTURE] Waiting {wait:.2f}s for mode to stabilize...")
-            time.sleep(wait)
 
-        # Pause streaming to get exclusive camera access
-        streaming_paused = True
-        time.sleep(0.02)  # Let current stream grab finish
+class TurboJpegEncoder:
+    """libjpeg-turbo backend encoding straight into pooled output buffers."""
 
-        try:
-            # Flush one stale frame then grab fresh
-            camera.grab()
-            frame = camera.grab()
-        finally:
-            # Always resume streaming
-            streaming_paused = False
+    name = 'turbojpeg'
+    _SAMPLING = {
+        '420': TJSAMP_420, '422': TJSAMP_422, '444': TJSAMP_444,
+    } if TURBOJPEG_AVAILABLE else {}
 
-    if frame is None:
-        return jsonify({'error': 'Failed to capture frame'}), 500
+    def __init__(self):
+        self._tj = TurboJPEG()  # Raises if libturbojpeg cannot be loaded
+        self._buffers = JpegBufferPool()
 
-    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-    h, w = frame.shape[:2]
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    def encode(self, frame, profile):
+        if frame.ndim == 2:
+            pixel_format, sampling = TJPF_GRAY, TJSAMP_GRAY
+        else:
+            pixel_format, sampling = TJPF_BGR, self._SAMPLING[profile.subsampling]
+        flags = TJFLAG_FASTDCT if profile.fast_dct else 0
+
+        buf = self._buffers.acquire(self._tj.buffer_size(frame, sampling))
+        t0 = time.perf_counter()
+        try:
+            _, size = self._tj.encode(frame, quality=profile.quality,
+                                      pixel_format=pixel_format,
+                                      jpeg_subsample=sampling, flags=flags,
+                                      dst=buf)
+        except Exception:
+            self._buffers.give_back(buf)
+            raise
+        return EncodedJpeg(memoryview(buf)[:size], time.perf_counter() - t0,
+                           self.name, lambda: self._buffers.give_back(buf))
+
+
+class StripedJpegEncoder:
+    """Encode horizontal strips on several cores and stitch one baseline JPEG.
+
+    Every strip is encoded by cv2 with a restart marker after each MCU
+    row and a height that is a whole number of MCU rows. Each strip
+    therefore starts in exactly the state a decoder expects after a
+    restart: DC predictors are reset and the bit buffer is byte-aligned.
+    Stitching keeps the first strip's headers with the SOF height patched
+    to the full frame. It joins the entropy-coded segments with a restart
+    marker at each junction and renumbers all RSTn markers into one
+    global RST0..RST7 cycle. Tables are identical across strips because
+    every strip uses the same quality and the standard Huffman tables.
+    """
+
+    name = 'striped'
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix='jpeg-stripe')
+
+    @staticmethod
+    def mcu_size(frame, profile):
+        """(width, height) of one MCU for this frame and subsampling."""
+        if frame.ndim == 2 or profile.subsampling == '444':
+            return 8, 8
+        if profile.subsampling == '422':
+            return 16, 8
+        return 16, 16
+
+    def encode(self, frame, profile):
+        t0 = time.perf_counter()
+        h, w = frame.shape[:2]
+        mcu_w, mcu_h = self.mcu_size(frame, profile)
+        mcu_rows = -(-h // mcu_h)
+        strip_rows = -(-mcu_rows // self.workers)
+        strip_h = strip_rows * mcu_h
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality,
+                  cv2.IMWRITE_JPEG_RST_INTERVAL, -(-w // mcu_w)]
+        sampling = OpenCVEncoder._SAMPLING.get(profile.subsampling)
+        if frame.ndim == 3 and sampling is not None:
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling]
+
+        def encode_strip(y):
+            ok, jpeg = cv2.imencode('.jpg', frame[y:y + strip_h], params)
+            if not ok:
+                raise RuntimeError("cv2.imencode failed")
+            return jpeg.reshape(-1)
+
+        strips = list(self._pool.map(encode_strip, range(0, h, strip_h)))
+        out = stitch_jpeg_strips(strips, h)
+        return EncodedJpeg(out.data, time.perf_counter() - t0,
+                           f'{self.name}-{self.workers}')
+
+
+def _jpeg_scan_start(jpeg):
+    """Return (offset of the SOF0 segment, offset of the entropy data)."""
+    pos, sof = 2, None                       # Skip SOI
+    while True:
+        marker = jpeg[pos + 1]
+        length = (int(jpeg[pos + 2]) << 8) | int(jpeg[pos + 3])
+        if marker == 0xC0:
+            sof = pos
+        pos += 2 + length
+        if marker == 0xDA:                   # SOS: entropy data follows
+            return sof, pos
+
+
+def stitch_jpeg_strips(strips, height):
+    """Join restart-interval JPEG strips into one JPEG of `height` rows.
+
+    `strips` are uint8 arrays, top to bottom, each a complete JPEG whose
+    height (except the last) is a whole number of MCU rows. Returns the
+    stitched JPEG as a uint8 array.
+    """
+    sof, header_len = _jpeg_scan_start(strips[0])
+    segments = []
+    for strip in strips:
+        _, start = _jpeg_scan_start(strip)
+        segments.append(strip[start:-2])     # Drop EOI
+    size = header_len + sum(len(seg) for seg in segments) + 2 * len(strips)
+
+    out = np.empty(size, dtype=np.uint8)
+    out[:header_len] = strips[0][:header_len]
+    out[sof + 5] = height >> 8               # SOF0 frame height
+    out[sof + 6] = height & 0xFF
+
+    pos, restart = header_len, 0
+    for i, seg in enumerate(segments):
+        if i:
+            # Junction: the previous strip's last MCU row ends an interval
+            out[pos] = 0xFF
+            out[pos + 1] = 0xD0 + restart % 8
+            restart += 1
+            pos += 2
+        out[pos:pos + len(seg)] = seg
+        # Entropy data byte-stuffs 0xFF, so FF D0-D7 is always a marker
+        marks = np.flatnonzero((seg[:-1] == 0xFF) & ((seg[1:] & 0xF8) == 0xD0))
+        out[pos + marks + 1] = 0xD0 + (restart + np.arange(len(marks))) % 8
+        restart += len(marks)
+        pos += len(seg)
+    out[pos] = 0xFF
+    out[pos + 1] = 0xD9                      # EOI
+    return out
+
+
+def create_striped_encoder(workers):
+    """Return a striped encoder for `workers` > 1, else None (disabled)."""
+    workers = min(workers, JPEG_STRIPE_WORKERS_MAX)
+    if workers <= 1:
+        return None
+    if not hasattr(cv2, 'IMWRITE_JPEG_RST_INTERVAL'):
+        print("[WARN] OpenCV lacks IMWRITE_JPEG_RST_INTERVAL; striped JPEG disabled")
+        return None
+    return StripedJpegEncoder(workers)
+
+
+def create_encoder(choice='auto'):
+    """Return the requested JPEG encoder, falling back to OpenCV."""
+    if choice in ('auto', 'turbojpeg'):
+        if TURBOJPEG_AVAILABLE:
+            try:
+                return TurboJpegEncoder()
+            except Exception as e:
+                print(f"[WARN] libjpeg-turbo not usable: {e}")
+        elif choice == 'turbojpeg':
+            print("[WARN] PyTurboJPEG not installed")
+    return OpenCVEncoder()
+
+
+# ============================================================================
+# Camera Server Application
+# ============================================================================
+
+# Global state
+devices = {}                      # Camera id ('0', '1', ...) -> CameraDevice, in open order
+MODE_SETTLE_TIME = 0.5            # Seconds to wait after mode change (per reference code)
+CAMERA_MODES = ('black', 'white', 'other')
+
+# Blocking SDK / encode work runs here, off the event loop. Bounded so a
+# burst of requests queues instead of spawning a thread per connection.
+SDK_WORKERS = 4
+sdk_executor = ThreadPoolExecutor(max_workers=SDK_WORKERS,
+                                  thread_name_prefix='camera-sdk')
+# Tile-channel diffing/encoding gets its own pool so live viewers never
+# queue captures behind them.
+TILE_WORKERS = 2
+tile_executor = ThreadPoolExecutor(max_workers=TILE_WORKERS,
+                                   thread_name_prefix='camera-tiles')
+
+# Capture exposure strategy for /api/capture-jpeg (--capture-trigger, or
+# ?trigger= per request):
+#   'continuous' - take a fresh frame from the free-running sensor
+#   'soft'       - switch to software trigger and expose exactly one frame
+CAPTURE_TRIGGERS = ('continuous', 'soft')
+capture_trigger = 'continuous'
+# /api/capture-set also takes 'hardware': arm every camera and wait for
+# the shared external trigger pulse
+CAPTURE_SET_TRIGGERS = CAPTURE_TRIGGERS + ('hardware',)
+
+# Frame acquisition strategy, chosen at startup (--acquisition):
+#   'poll'     - stream thread loops on camera.grab()
+#   'callback' - the MindVision SDK pushes frames from its own thread.
+#                Cameras without callback support (webcam) always poll.
+ACQUISITION_MODES = ('poll', 'callback')
+acquisition_mode = 'poll'
+CALLBACK_FRAME_TIMEOUT = 2.0      # Seconds a capture waits for a pushed frame
+
+# Camera backend, chosen at startup (--camera): 'auto' tries the
+# MindVision SDK, then a webcam; 'synthetic' generates frames without
+# hardware at --synthetic-fps.
+CAMERA_BACKENDS = ('auto', 'mindvision', 'webcam', 'synthetic')
+camera_backend = 'auto'
+synthetic_fps = SYNTHETIC_FPS
+synthetic_jitter = 0.0            # Seconds (standard deviation)
+
+# JPEG backend, chosen at startup (--jpeg-encoder). Full-resolution
+# profiles switch to the striped encoder when --jpeg-workers > 1.
+jpeg_encoder = OpenCVEncoder()
+striped_encoder = None
+
+
+# Downscale factor for MJPEG streaming (full-res is 5456x2812 = too slow)
+# Capture always uses full resolution.
+STREAM_SCALE = 0.25   # 1364x703 — fast enough for smooth live preview
+STREAM_QUALITY = 70
+STREAM_MAX_FPS = 60
+SUBSCRIBER_QUEUE_SIZE = 2         # Encoded parts buffered per viewer before dropping
+ENCODER_IDLE_TIMEOUT = 0.5        # Seconds an encoder waits for a frame before rechecking viewers
+
+# Per-client adaptation (/api/stream?w=&q=&fps=). A lagging client steps
+# down width first (the biggest saving in bytes), then quality, then frame
+# rate; a client with headroom steps back up towards what it asked for.
+# Rungs are shared values so clients on the same rung share one broadcaster.
+STREAM_WIDTHS = (1024, 800, 640, 480, 320)
+STREAM_QUALITIES = (60, 50, 40, 30)
+STREAM_MIN_FPS = 2
+STREAM_FALLBACK_WIDTH = 640       # Default width for cameras without sensor_width
+STREAM_LAG_UTILIZATION = 0.8      # Share of time spent writing => client is the bottleneck
+STREAM_IDLE_UTILIZATION = 0.3     # Below this the client has room to step up
+STREAM_ADAPT_HOLD = 1.0           # Seconds to observe after a change before the next one
+STREAM_UPGRADE_AFTER = 5.0        # Seconds of headroom required before stepping up
+
+
+class StreamSubscriber:
+    """One viewer's queue of encoded MJPEG parts, drained on the event loop.
+
+    The encoder thread hands parts over with `offer()`, which wakes the
+    viewer's coroutine through its loop. When the viewer falls behind, the
+    oldest queued part is dropped so it always resumes on the newest frame
+    without slowing anyone else down.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, loop):
+        self.id = next(self._ids)
+        self._loop = loop
+        self._parts = collections.deque(maxlen=SUBSCRIBER_QUEUE_SIZE)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, part):
+        """Called from the encoder thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._push, part)
+        except RuntimeError:
+            pass  # Event loop already closed (server shutting down)
+
+    def _push(self, part):
+        if len(self._parts) == self._parts.maxlen:
+            self.dropped += 1
+            STREAM_DROPPED.inc()
+        self._parts.append(part)
+        self._ready.set()
+
+    async def get(self):
+        """Return the newest part; older queued parts are dropped."""
+        while not self._parts:
+            self._ready.clear()
+            await self._ready.wait()
+        part = self._parts.pop()
+        if self._parts:
+            self.dropped += len(self._parts)
+            STREAM_DROPPED.inc(len(self._parts))
+        self._parts.clear()
+        return part
+
+
+class MjpegBroadcaster:
+    """Encode-once MJPEG fan-out for one stream profile (width, quality).
+
+    A single encoder thread resizes and encodes each new frame once and
+    hands the same bytes to every subscriber, so CPU cost does not grow
+    with the number of viewers. The thread runs only while someone is
+    subscribed.
+    """
+
+    def __init__(self, device, width, quality):
+        self.device = device
+        self.width = width
+        self.quality = quality
+        self.profile = ENCODE_PROFILES['stream']._replace(quality=quality)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, loop):
+        sub = StreamSubscriber(loop)
+        with self._lock:
+            self._subscribers.add(sub)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def _encode(self, lease):
+        seq, timestamp = lease.seq, lease.timestamp
+        try:
+            frame = lease.image
+            h, w = frame.shape[:2]
+            # Frames from a binned preview preset may already be at (or
+            # below) the target width
+            if w > self.width:
+                # Downsample for streaming speed
+                frame = cv2.resize(frame, (self.width, int(h * self.width / w)),
+                                   interpolation=cv2.INTER_NEAREST)
+            jpeg = jpeg_encoder.encode(frame, self.profile)
+        finally:
+            lease.release()
+        ENCODE_SECONDS.labels('stream').observe(jpeg.encode_time)
+        try:
+            return b''.join((b'--frame\r\n'
+                             b'Content-Type: image/jpeg\r\n'
+                             b'X-Frame-Seq: %d\r\n'
+                             b'X-Frame-Timestamp: %.3f\r\n\r\n' % (seq, timestamp),
+                             jpeg.data, b'\r\n'))
+        finally:
+            jpeg.release()
+
+    def _run(self):
+        seq = 0
+        try:
+            while self.device.streaming:
+                with self._lock:
+                    if not self._subscribers:
+                        return
+                    subscribers = list(self._subscribers)
+                # Sleep until a newer frame is published; the timeout only
+                # bounds how long a departed last subscriber keeps us alive
+                lease = self.device.wait_for_frame(seq, ENCODER_IDLE_TIMEOUT)
+                if lease is None:
+                    continue
+                seq = lease.seq
+                try:
+                    part = self._encode(lease)
+                except Exception as e:
+                    # Skip this frame only; viewers resume on the next one
+                    print(f"[ERROR] Stream encode failed for frame {seq}: {e}")
+                    continue
+                for sub in subscribers:
+                    sub.offer(part)
+        finally:
+            with self._lock:
+                self._thread = None
+
+
+class StreamClient:
+    """One MJPEG viewer's requested ceiling and current adapted profile.
+
+    `record()` is fed the time each part took to write to the socket and
+    the full cycle time since the previous part. The ratio of their
+    moving averages is how busy the connection is. Writes stall in bursts,
+    once the transport buffer fills, so averaging the times rather than
+    per-frame ratios keeps one long stall from being diluted. Near 1
+    the client cannot drain frames as fast as they come and is stepped
+    down; well below it, stepped back up.
+    """
+
+    def __init__(self, width, quality, fps):
+        self.widths = [width] + [w for w in STREAM_WIDTHS if w < width]
+        self.qualities = [quality] + [q for q in STREAM_QUALITIES if q < quality]
+        self.max_fps = fps
+        self.fps = fps
+        self._w = self._q = 0         # Current rung in each ladder
+        self._write_avg = 0.0         # EWMA of socket write time
+        self._cycle_avg = 0.0         # EWMA of time between parts
+        self._hold = STREAM_ADAPT_HOLD
+        self._calm = 0.0
+
+    @property
+    def profile(self):
+        return self.widths[self._w], self.qualities[self._q]
+
+    def record(self, write_time, cycle_time):
+        """Update the load estimate; adapt and return True on a change."""
+        if cycle_time <= 0:
+            return False
+        self._write_avg += 0.2 * (write_time - self._write_avg)
+        self._cycle_avg += 0.2 * (cycle_time - self._cycle_avg)
+        utilization = self._write_avg / self._cycle_avg
+        if self._hold > 0:
+            self._hold -= cycle_time
+            return False
+        if utilization > STREAM_LAG_UTILIZATION:
+            self._calm = 0.0
+            return self._step(-1)
+        if utilization < STREAM_IDLE_UTILIZATION:
+            self._calm += cycle_time
+            if self._calm >= STREAM_UPGRADE_AFTER:
+                self._calm = 0.0
+                return self._step(+1)
+        else:
+            self._calm = 0.0
+        return False
+
+    def _step(self, direction):
+        if direction < 0:
+            if self._w < len(self.widths) - 1:
+                self._w += 1
+            elif self._q < len(self.qualities) - 1:
+                self._q += 1
+            elif self.fps > STREAM_MIN_FPS:
+                self.fps = max(STREAM_MIN_FPS, self.fps // 2)
+            else:
+                return False
+        else:
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps * 2)
+            elif self._q:
+                self._q -= 1
+            elif self._w:
+                self._w -= 1
+            else:
+                return False
+        self._hold = STREAM_ADAPT_HOLD
+        self._write_avg = self._cycle_avg = 0.0
+        width, quality = self.profile
+        print(f"[STREAM] Client {'down' if direction < 0 else 'up'}graded to "
+              f"{width}px q{quality} {self.fps}fps")
+        return True
+
+
+# ============================================================================
+# Tile Channel (WebSocket)
+# ============================================================================
+#
+# /api/ws/tiles sends a keyframe, then only the tiles that changed. The
+# client may send JSON text messages:
+#   {"type": "subscribe", "w": 1364, "q": 70, "fps": 15, "tile": 64,
+#    "threshold": 10, "roi": [x, y, w, h]}   (roi as 0-1 fractions, or null)
+#   {"type": "keyframe"}                      (repaint everything)
+# The server answers each (re)configuration with a JSON text message
+#   {"type": "config", "width", "height", "tile", "roi": [x, y, w, h]}
+# in stream pixels. Frame updates follow as binary messages:
+#   TILE_MESSAGE header (magic, seq, flags, tile count), then per tile a
+#   TILE_RECORD (x, y, w, h, JPEG length) and the JPEG bytes.
+
+TILE_MAGIC = b'MQTL'
+TILE_MESSAGE = struct.Struct('<4sIBxH')
+TILE_RECORD = struct.Struct('<HHHHI')
+TILE_FLAG_KEYFRAME = 1
+TILE_SIZES = (32, 64, 128)
+TILE_SIZE = 64
+TILE_DECIMATION = 4               # Differencing runs on a 1/4-scale area average
+TILE_THRESHOLD = 4.0              # Mean abs difference (grey levels) above the noise floor
+TILE_KEYFRAME_RATIO = 0.5         # Send a keyframe when this share of tiles changed
+TILE_KEYFRAME_INTERVAL = 30.0     # Seconds between unconditional keyframes
+TILE_QUALITY = 70
+TILE_FPS = 15
+TILE_MAX_FPS = 30
+
+
+class TileSession:
+    """Delta state for one /api/ws/tiles client.
+
+    Keeps a decimated copy of what the client has on screen. Each new
+    frame is area-averaged to 1/TILE_DECIMATION scale, which also averages
+    out sensor noise, and scored per tile by mean absolute difference.
+    The noise floor is the lower quartile of those scores: a static scene
+    keeps most tiles at sensor noise, which matters at gain 150 in black
+    mode. Tiles scoring more than `threshold` above that floor are encoded
+    and sent, merged into horizontal runs, and only those tiles of the
+    client's copy are updated. A floor that is itself above the threshold
+    means the whole picture changed (exposure, mode), and a keyframe is
+    sent instead.
+    """
+
+    def __init__(self, default_width=STREAM_FALLBACK_WIDTH):
+        self.default_width = default_width
+        self.width = None                 # Stream width; None = default
+        self.quality = TILE_QUALITY
+        self.fps = TILE_FPS
+        self.tile = TILE_SIZE
+        self.threshold = TILE_THRESHOLD
+        self.roi = None                   # (x, y, w, h) fractions or None
+        self._lock = threading.Lock()
+        self._pending = None              # Settings waiting for the next frame
+        self._reference = None            # Decimated frame as last sent
+        self._next_keyframe = 0.0
+        self._config = None               # Last config sent to the client
+
+    def configure(self, message):
+        """Validate a subscribe message; applied from the next frame on."""
+        settings = {
+            'width': int(message.get('w') or 0) or None,
+            'quality': int(message.get('q', TILE_QUALITY)),
+            'fps': int(message.get('fps', TILE_FPS)),
+            'tile': int(message.get('tile', TILE_SIZE)),
+            'threshold': float(message.get('threshold', TILE_THRESHOLD)),
+            'roi': message.get('roi'),
+        }
+        if settings['width'] is not None and settings['width'] < 64:
+            raise ValueError('w must be >= 64')
+        if not 10 <= settings['quality'] <= 95:
+            raise ValueError('q must be within 10-95')
+        if not 1 <= settings['fps'] <= TILE_MAX_FPS:
+            raise ValueError(f'fps must be within 1-{TILE_MAX_FPS}')
+        if settings['tile'] not in TILE_SIZES:
+            raise ValueError(f'tile must be one of {TILE_SIZES}')
+        roi = settings['roi']
+        if roi is not None:
+            roi = tuple(float(v) for v in roi)
+            if (len(roi) != 4 or min(roi) < 0 or roi[2] <= 0 or roi[3] <= 0
+                    or roi[0] + roi[2] > 1 or roi[1] + roi[3] > 1):
+                raise ValueError('roi must be [x, y, w, h] fractions within 0-1')
+            settings['roi'] = roi
+        with self._lock:
+            self._pending = settings
+
+    def request_keyframe(self):
+        with self._lock:
+            self._reference = None
+
+    def update(self, lease):
+        """Diff and encode one frame (blocking). Releases the lease.
+
+        Returns (config or None, binary message or None).
+        """
+        with self._lock:
+            if self._pending is not None:
+                for name, value in self._pending.items():
+                    setattr(self, name, value)
+                self._pending = None
+                self._reference = None
+            reference = self._reference
+
+        seq = lease.seq
+        try:
+            frame = lease.image
+            h, w = frame.shape[:2]
+            width = min(self.width or self.default_width, w)
+            if w > width:
+                h, w = max(1, round(h * width / w)), width
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            else:
+                frame = frame.copy()      # Detach from the pooled buffer
+        finally:
+            lease.release()
+
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (max(1, w // TILE_DECIMATION), max(1, h // TILE_DECIMATION)),
+                           interpolation=cv2.INTER_AREA)
+
+        tile = self.tile
+        x0, y0, x1, y1 = self._roi_pixels(w, h)
+        config = {'type': 'config', 'width': w, 'height': h, 'tile': tile,
+                  'roi': [x0, y0, x1 - x0, y1 - y0]}
+        if config != self._config:
+            self._config, reference = config, None
+        else:
+            config = None
+
+        now = time.monotonic()
+        keyframe = (reference is None or reference.shape != small.shape
+                    or now >= self._next_keyframe)
+        if not keyframe:
+            runs = self._changed_runs(small, reference, x0, y0, x1, y1)
+            total = -(-(x1 - x0) // tile) * -(-(y1 - y0) // tile)
+            if runs is None or (sum(c1 - c0 for _, c0, c1 in runs)
+                                > TILE_KEYFRAME_RATIO * total):
+                keyframe = True
+
+        profile = ENCODE_PROFILES['stream']._replace(quality=self.quality)
+        if keyframe:
+            rects = [(x0, y0, x1, y1)]
+            self._next_keyframe = now + TILE_KEYFRAME_INTERVAL
+            reference = small.copy()
+        else:
+            rects = [(c0 * tile, r * tile, min(c1 * tile, x1), min((r + 1) * tile, y1))
+                     for r, c0, c1 in runs]
+            for rx0, ry0, rx1, ry1 in rects:
+                d = TILE_DECIMATION
+                reference[ry0 // d:-(-ry1 // d), rx0 // d:-(-rx1 // d)] = \
+                    small[ry0 // d:-(-ry1 // d), rx0 // d:-(-rx1 // d)]
+        with self._lock:
+            if self._pending is None:
+                self._reference = reference
+
+        if not rects:
+            return config, None
+        parts = [TILE_MESSAGE.pack(TILE_MAGIC, seq & 0xFFFFFFFF,
+                                   TILE_FLAG_KEYFRAME if keyframe else 0, len(rects))]
+        encode_time = 0.0
+        for rx0, ry0, rx1, ry1 in rects:
+            jpeg = jpeg_encoder.encode(np.ascontiguousarray(frame[ry0:ry1, rx0:rx1]),
+                                       profile)
+            encode_time += jpeg.encode_time
+            try:
+                parts.append(TILE_RECORD.pack(rx0, ry0, rx1 - rx0, ry1 - ry0,
+                                              len(jpeg.data)))
+                parts.append(bytes(jpeg.data))
+            finally:
+                jpeg.release()
+        ENCODE_SECONDS.labels('tiles').observe(encode_time)
+        return config, b''.join(parts)
+
+    def _roi_pixels(self, w, h):
+        """Tile-aligned ROI (x0, y0, x1, y1) in stream pixels."""
+        if self.roi is None:
+            return 0, 0, w, h
+        tile = self.tile
+        rx, ry, rw, rh = self.roi
+        x0 = int(rx * w) // tile * tile
+        y0 = int(ry * h) // tile * tile
+        x1 = min(w, -(-int(np.ceil((rx + rw) * w)) // tile) * tile)
+        y1 = min(h, -(-int(np.ceil((ry + rh) * h)) // tile) * tile)
+        return x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)
+
+    def _changed_runs(self, small, reference, x0, y0, x1, y1):
+        """Changed tiles in the ROI as (row, first col, end col) runs.
+
+        Returns None when the whole region changed.
+        """
+        d, tile = TILE_DECIMATION, self.tile
+        step = tile // d
+        sy0, sx0 = y0 // d, x0 // d
+        region = np.s_[sy0:-(-y1 // d), sx0:-(-x1 // d)]
+        diff = cv2.absdiff(small[region], reference[region])
+        if diff.size == 0:
+            return []
+        rows = np.arange(0, diff.shape[0], step)
+        cols = np.arange(0, diff.shape[1], step)
+        sums = np.add.reduceat(np.add.reduceat(diff.astype(np.uint32), rows, axis=0),
+                               cols, axis=1)
+        counts = np.outer(np.diff(np.append(rows, diff.shape[0])),
+                          np.diff(np.append(cols, diff.shape[1])))
+        scores = sums / counts
+        floor = np.percentile(scores, 25)
+        if floor > self.threshold:
+            return None
+        runs = []
+        for r, line in enumerate(scores > floor + self.threshold):
+            c = 0
+            while c < len(line):
+                if line[c]:
+                    start = c
+                    while c < len(line) and line[c]:
+                        c += 1
+                    runs.append((y0 // tile + r, x0 // tile + start, x0 // tile + c))
+                else:
+                    c += 1
+        return runs
+
+
+PREVIEW_CACHE_BYTES = 32 * 1024 * 1024   # Memory budget for encoded previews
+PREVIEW_ETAG_PREFIX = f'{int(time.time()):x}'  # Changes every server start
+
+
+class PreviewCache:
+    """Encoded /api/preview JPEGs keyed by (frame seq, width, quality).
+
+    Least recently used entries are evicted once the cached bytes exceed
+    the budget. Stale frames fall out on their own as newer ones are
+    requested. Used from the event loop only.
+    """
+
+    def __init__(self, budget=PREVIEW_CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self.inflight = {}            # key -> Future of an encode in progress
+
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.budget or key in self._entries:
+            return
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.budget:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+def preview_etag(seq, width, quality):
+    return f'"{PREVIEW_ETAG_PREFIX}-{seq}-{width}-{quality}"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+async def generate_mjpeg(device, client=None):
+    """Async generator that yields MJPEG frames for one streaming client.
+
+    Idle viewers cost no thread: the coroutine sleeps until the encoder
+    thread signals a new part. The time between yielding a part and being
+    resumed is the socket write (the server awaits transport drain), which
+    drives the client's adaptive profile and the frame-rate cap.
+    """
+    client = client or StreamClient(device.default_stream_width(), STREAM_QUALITY,
+                                    STREAM_MAX_FPS)
+    loop = asyncio.get_running_loop()
+    broadcaster, sub = device.subscribe_stream(*client.profile, loop)
+    last_sent = None
+    try:
+        while device.streaming:
+            try:
+                part = await asyncio.wait_for(sub.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            started = loop.time()
+            yield part
+            sent = loop.time()
+            if last_sent is not None and client.record(sent - started, sent - last_sent):
+                # Move to the broadcaster for the new (width, quality)
+                device.unsubscribe_stream(broadcaster, sub)
+                broadcaster, sub = device.subscribe_stream(*client.profile, loop)
+            last_sent = sent
+            wait = started + 1.0 / client.fps - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+    finally:
+        device.unsubscribe_stream(broadcaster, sub)
+
+
+async def run_blocking(fn, *args):
+    """Run blocking camera / encode work on the bounded SDK executor."""
+    return await asyncio.get_running_loop().run_in_executor(sdk_executor, fn, *args)
+
+
+async def read_json(request):
+    """Parse a JSON object body, tolerating empty or invalid bodies."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def encode_lease(lease, profile, width=0, quality=None):
+    """Encode a frame with an ENCODE_PROFILES entry and release its lease.
+
+    A non-zero `width` downscales larger frames first; `quality` overrides
+    the profile's. Returns (EncodedJpeg, w, h) with the encoded size; the
+    caller releases the EncodedJpeg.
+    """
+    settings = ENCODE_PROFILES[profile]
+    if quality is not None:
+        settings = settings._replace(quality=quality)
+    encoder = jpeg_encoder
+    if settings.striped and striped_encoder is not None:
+        encoder = striped_encoder
+    try:
+        frame = lease.image
+        h, w = frame.shape[:2]
+        if width and w > width:
+            h, w = max(1, round(h * width / w)), width
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+        jpeg = encoder.encode(frame, settings)
+    finally:
+        lease.release()
+    return jpeg, w, h
+
+
+def encode_preview(lease, width, quality):
+    """Encode a preview into owned bytes for the cache.
+
+    Returns (frame seq, jpeg bytes, EncodedJpeg); the EncodedJpeg is
+    already released and only carries timing/encoder details.
+    """
+    seq = lease.seq or None       # 0: direct grab, never published
+    jpeg, _, _ = encode_lease(lease, 'preview', width, quality)
+    try:
+        data = bytes(jpeg.data)
+    finally:
+        jpeg.release()
+    return seq, data, jpeg
+
+
+# /api/capture-raw container: a fixed little-endian header followed by
+# `height` rows of `stride` bytes. Pixel formats: 0 = MONO8, 1 = BGR8.
+# Exposure is in microseconds, timestamp in 0.1 ms sensor ticks; both are 0
+# (and gain 0.0) when the camera does not report them.
+RAW_MAGIC = b'MQRF'
+RAW_VERSION = 1
+RAW_HEADER = struct.Struct('<4sHHIIIIIfI')
+#   magic, version, header size, width, height, stride, pixel format,
+#   exposure_us, analog gain, timestamp
+RAW_PIXEL_FORMATS = {1: 0, 3: 1}          # channels -> pixel format code
+RAW_CHUNK_SIZE = 1 << 20                  # Bytes per body write
+# Raw downloads that may stream straight from a frame pool slot at once.
+# A slow client holds its slot until the last byte is written, so any
+# further download gets its own copy and the slot goes back at once;
+# FRAME_POOL_SIZE - 1 slots always stay for acquisition and previews.
+RAW_ZERO_COPY_DOWNLOADS = 1
+raw_zero_copy = threading.BoundedSemaphore(RAW_ZERO_COPY_DOWNLOADS)
+
+
+def raw_frame_header(image, head):
+    """Pack the /api/capture-raw header for `image` and its FrameHead."""
+    h, w = image.shape[:2]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    return RAW_HEADER.pack(
+        RAW_MAGIC, RAW_VERSION, RAW_HEADER.size, w, h, image.strides[0],
+        RAW_PIXEL_FORMATS[channels],
+        head.uiExpTime if head is not None else 0,
+        head.fAnalogGain if head is not None else 0.0,
+        head.uiTimeStamp if head is not None else 0,
+    )
+
+
+def detach_for_download(lease):
+    """(record, zero_copy) for a raw response to hold until its body is written.
+
+    Takes one of the RAW_ZERO_COPY_DOWNLOADS slots when one is free and
+    keeps the lease (zero_copy True; stream_raw_frame gives the slot
+    back). Otherwise copies the pixels into a response-owned record and
+    releases the pool slot now.
+    """
+    if not lease.pooled:
+        return lease, False
+    if raw_zero_copy.acquire(blocking=False):
+        return lease, True
+    try:
+        return FrameRecord(lease.image.copy(), head=lease.head,
+                           sensor_time=lease.sensor_time), False
+    finally:
+        lease.release()
+
+
+async def stream_raw_frame(lease, header, pixels, zero_copy=False):
+    """Body of /api/capture-raw: header, then pixels straight from the lease."""
+    try:
+        yield header
+        for offset in range(0, len(pixels), RAW_CHUNK_SIZE):
+            yield pixels[offset:offset + RAW_CHUNK_SIZE]
+    finally:
+        lease.release()
+        if zero_copy:
+            raw_zero_copy.release()
+
+
+def jpeg_response(jpeg, headers=None):
+    """JPEG response sent straight from the encoder's buffer.
+
+    The buffer goes back to the encoder once the body has been written.
+    """
+    headers = dict(headers or {})
+    headers['X-Encode-Ms'] = f'{jpeg.encode_time * 1000:.1f}'
+    headers['X-Jpeg-Encoder'] = jpeg.encoder
+    return Response(jpeg.data, media_type='image/jpeg', headers=headers,
+                    background=BackgroundTask(jpeg.release))
+
+
+def default_device():
+    """The first opened camera, served by the unprefixed /api/... routes."""
+    return next(iter(devices.values()), None)
+
+
+def init_cameras():
+    """Open every available camera (or the backend --camera asks for).
+
+    All enumerated MindVision devices are opened; the webcam is only a
+    fallback when none opens. Cameras get ids '0', '1', ... in
+    enumeration order.
+    """
+    cameras = []
+    if camera_backend == 'synthetic':
+        cameras.append(SyntheticCamera(synthetic_fps, synthetic_jitter))
+    elif MINDVISION_AVAILABLE and camera_backend in ('auto', 'mindvision'):
+        try:
+            cameras = [MindVisionCamera(info) for info in MindVisionCamera.enumerate()]
+        except CameraException as e:
+            print(f"[ERROR] CameraEnumerateDevice failed ({e.error_code}): {e.message}")
+        if not cameras:
+            print("[ERROR] No MindVision camera found")
+
+    opened = [cam for cam in cameras if cam.open()]
+    if not opened and camera_backend in ('auto', 'webcam'):
+        if cameras:
+            print("[WARN] MindVision camera failed, trying webcam fallback...")
+        webcam = WebcamCamera(0)
+        if webcam.open():
+            opened.append(webcam)
+
+    devices.clear()
+    for index, cam in enumerate(opened):
+        device = CameraDevice(str(index), cam)
+        cam.set_mode(device.mode)
+        device.settle_detector.reset()    # Auto-exposure converges from here
+        devices[device.id] = device
+
+    if not devices:
+        print("[ERROR] No camera available!")
+        return False
+    return True
+
+
+# Burst capture: N consecutive frames reduced to one low-noise image
+BURST_FRAMES = 8                  # Default ?n=
+# A mean adds each frame into a uint16 running sum (exact up to 65535 // 255
+# = 257 frames), so its cap only bounds how long the garment must hold
+# still (about 2 s at 15 fps). A median needs every frame at once. Both
+# live in one buffer per camera, allocated on its first burst for
+# BURST_MAX_MEDIAN_FRAMES frames (about 245 MB at 5456x2812) and reused
+# under the capture lock, so bursts never allocate beyond it.
+BURST_MAX_FRAMES = 32
+BURST_MAX_MEDIAN_FRAMES = 16
+BURST_REDUCERS = ('mean', 'median')
+BURST_CHUNK_ROWS = 64             # Rows reduced per step (~3 MB at 8 x 5456 px)
+
+
+def sorting_network(n):
+    """Comparator pairs (i, j) of Batcher's odd-even merge sort for n inputs.
+
+    Built for the next power of two; comparators reaching past n only ever
+    meet the (virtual, +inf) padding, so they are dropped.
+    """
+    size = 1 << max(n - 1, 1).bit_length()
+    pairs = []
+    p = 1
+    while p < size:
+        k = p
+        while k >= 1:
+            for j in range(k % p, size - k, 2 * k):
+                for i in range(min(k, size - j - k)):
+                    if (i + j) // (2 * p) == (i + j + k) // (2 * p) and i + j + k < n:
+                        pairs.append((i + j, i + j + k))
+            k //= 2
+        p *= 2
+    return pairs
+
+
+def mean_of_sum(total, n, out):
+    """Rounded mean of `n` frames from their uint16 running sum, into uint8 `out`.
+
+    Divides `total` in place.
+    """
+    total += n // 2
+    total //= n
+    np.copyto(out, total, casting='unsafe')
+    return out
+
+
+def median_frames(stack, out, chunk_rows=BURST_CHUNK_ROWS):
+    """Per-pixel median of an (n, h, w[, c]) uint8 frame stack, into `out`.
+
+    Of an even count, the rounded average of the two middle values. Works
+    through `chunk_rows` image rows at a time so temporaries stay a few MB
+    whatever the frame size, sorting each chunk in place with a min/max
+    sorting network — whole-plane ufuncs, far faster than partitioning
+    along the short frame axis — so it reorders `stack`.
+    """
+    n, h = stack.shape[:2]
+    acc = np.empty((chunk_rows,) + stack.shape[2:], np.uint16)
+    low = np.empty((chunk_rows,) + stack.shape[2:], np.uint8)
+    network = sorting_network(n)
+    for r0 in range(0, h, chunk_rows):
+        r1 = min(r0 + chunk_rows, h)
+        chunk, a, t = stack[:, r0:r1], acc[:r1 - r0], low[:r1 - r0]
+        for i, j in network:
+            np.minimum(chunk[i], chunk[j], out=t)
+            np.maximum(chunk[i], chunk[j], out=chunk[j])
+            chunk[i] = t
+        if n % 2:
+            out[r0:r1] = chunk[n // 2]
+            continue
+        np.add(chunk[n // 2 - 1], chunk[n // 2], out=a, dtype=np.uint16)
+        a += 1
+        a >>= 1
+        out[r0:r1] = a
+    return out
+
+
+# Best-of-N capture: the sharpest of N consecutive frames
+BEST_OF_MAX_FRAMES = 16
+#   'laplacian' - variance of the Laplacian of a decimated copy (any camera)
+#   'sdk'       - the MindVision SDK's CameraEvaluateImageDefinition
+SHARPNESS_SCORERS = ('laplacian', 'sdk')
+SHARPNESS_DECIMATION = 4          # ~1 ms per 15 MP frame, well within a frame period
+
+
+def laplacian_sharpness(image, decimation=SHARPNESS_DECIMATION):
+    """Variance of the Laplacian of every `decimation`-th pixel; higher is sharper.
+
+    Striding keeps the fine detail that blur removes (a resize would
+    average it away) and cuts the work by decimation squared.
+    """
+    small = np.ascontiguousarray(image[::decimation, ::decimation])
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    _, std = cv2.meanStdDev(cv2.Laplacian(small, cv2.CV_16S))
+    return float(std[0, 0]) ** 2
+
+
+# Settle detection: a mode change has converged once exposure, gain and
+# scene brightness agree over SETTLE_STABLE_FRAMES consecutive frames.
+# MODE_SETTLE_TIME stays the upper bound. Brightness is compared on a
+# strided sample sized to the frame (binned preview or full resolution),
+# and a change counts as noise while it stays within SETTLE_NOISE_SIGMAS
+# standard errors of the frame-to-frame pixel difference, so the test
+# holds at gain 150 as well as at gain 20.
+SETTLE_STABLE_FRAMES = 3
+SETTLE_EXPOSURE_TOLERANCE = 0.02  # Relative uiExpTime change still counted as stable
+SETTLE_GAIN_TOLERANCE = 0.01      # Relative fAnalogGain change
+SETTLE_MEAN_TOLERANCE = 0.005     # Relative mean intensity change always counted as stable
+SETTLE_NOISE_SIGMAS = 4.0         # ...or one within this many standard errors of the noise
+SETTLE_SAMPLES = 1 << 16          # Pixels sampled per frame (~100k on the 1364x703 preview)
+
+
+def settle_sample(image, samples=SETTLE_SAMPLES):
+    """float32 copy of every n-th pixel (each axis), about `samples` of them."""
+    step = max(1, math.isqrt(image.shape[0] * image.shape[1] // samples))
+    return image[::step, ::step].astype(np.float32)
+
+
+class SettleDetector:
+    """Tells when the sensor has converged after a mode change.
+
+    The acquisition thread feeds it every frame. Frames exposed before the
+    last reset() are ignored; after it, the mode is settled once
+    SETTLE_STABLE_FRAMES consecutive frames agree on exposure time, analog
+    gain (from the frame head, where there is one) and mean intensity
+    (see settle_sample). With AE off that takes a couple of frames; with
+    AE on, as long as the auto-exposure loop needs.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.settled = True
+        self.changed_at = 0.0     # time.time() of the last reset
+        self.settle_time = None   # Seconds the last change took to converge
+        self._last = None         # (exposure, gain, sample) of the previous frame
+        self._stable = 0
+
+    def reset(self):
+        with self._cond:
+            self.settled = False
+            self.changed_at = time.time()
+            self._last = None
+            self._stable = 0
+
+    def observe(self, exposed_at, head, image):
+        """Account for a frame whose exposure started at `exposed_at` (time.time())."""
+        if self.settled or exposed_at <= self.changed_at:
+            return                # Cheap when nothing is converging
+        sample = (head.uiExpTime if head is not None else 0,
+                  head.fAnalogGain if head is not None else 0.0,
+                  settle_sample(image))
+        with self._cond:
+            if self.settled or exposed_at <= self.changed_at:
+                return
+            last, self._last = self._last, sample
+            if last is not None and self._converged(last, sample):
+                self._stable += 1
+            else:
+                self._stable = 0
+            if self._stable >= SETTLE_STABLE_FRAMES - 1:
+                self.settled = True
+                self.settle_time = time.time() - self.changed_at
+                self._cond.notify_all()
+
+    @staticmethod
+    def _converged(a, b):
+        (exp_a, gain_a, pix_a), (exp_b, gain_b, pix_b) = a, b
+        if (abs(exp_b - exp_a) > SETTLE_EXPOSURE_TOLERANCE * exp_a
+                or abs(gain_b - gain_a) > SETTLE_GAIN_TOLERANCE * gain_a
+                or pix_a.shape != pix_b.shape):
+            return False
+        diff = pix_b - pix_a
+        change = abs(float(diff.mean()))
+        noise = float(diff.std()) / math.sqrt(diff.size)   # Standard error of `change`
+        return change <= max(SETTLE_MEAN_TOLERANCE * float(pix_a.mean()),
+                             SETTLE_NOISE_SIGMAS * noise)
+
+    def wait(self, deadline):
+        """Block until settled or time.time() reaches `deadline`; True if settled."""
+        with self._cond:
+            while not self.settled:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+class CameraDevice:
+    """One opened camera with its own acquisition, frame store and mode.
+
+    Every device streams from its own thread (or SDK callback) into its
+    own frame store, and only its own captures are serialized, so
+    captures on different cameras run in parallel.
+    """
+
+    def __init__(self, device_id, camera):
+        self.id = device_id
+        self.camera = camera
+        self.mode = 'other'
+        self.mode_changed_at = 0.0            # Timestamp of last mode change
+        self.settle_detector = SettleDetector()
+        self.latest_frame = None              # FrameRecord of the newest streamed frame
+        self.frame_seq = 0                    # Incremented for every published frame
+        self.frame_lock = threading.Lock()
+        self.frame_cond = threading.Condition(self.frame_lock)
+        self.frame_listeners = set()          # Callables run (outside the lock) on every publish
+        self.streaming = False
+        self.stream_thread = None
+        self.access = CameraAccess()          # Stream thread / capture hand-off
+        self.capture_lock = threading.Lock()  # Prevent concurrent captures on this camera
+        self.broadcasters = {}                # (width, quality) -> MjpegBroadcaster with viewers
+        self.broadcasters_lock = threading.Lock()
+        self.preview_cache = PreviewCache()
+        self._burst_buffer = None             # Flat uint8 burst stack / sum (see burst_frames)
+
+    @property
+    def is_open(self):
+        return self.camera.is_open
+
+    @property
+    def serial(self):
+        info = getattr(self.camera, 'DevInfo', None)
+        return info.GetSn() if info is not None else None
+
+    def describe(self):
+        """Identity and state for /api/cameras."""
+        info = getattr(self.camera, 'DevInfo', None)
+        with self.frame_lock:
+            seq = self.frame_seq
+        return {
+            'id': self.id,
+            'camera_type': self.camera.camera_type,
+            'name': info.GetFriendlyName() if info is not None else None,
+            'serial': self.serial,
+            'status': 'ready' if self.is_open else 'no_camera',
+            'mode': self.mode,
+            'learned_exposure_us': dict(getattr(self.camera, 'learned_exposure', {})),
+            'streaming': self.streaming,
+            'frame_seq': seq,
+        }
+
+    # -- Frame store ------------------------------------------------------
+
+    def publish_frame(self, lease):
+        """Make `lease` the latest frame, dropping the store's previous one."""
+        if lease is not None:
+            self.settle_detector.observe(self.frame_time(lease)[0], lease.head, lease.image)
+        with self.frame_lock:
+            previous = self.latest_frame
+            self.latest_frame = lease
+            if lease is not None:
+                self.frame_seq += 1
+                lease.seq = self.frame_seq
+                self.frame_cond.notify_all()
+        if previous is not None:
+            previous.release()
+        if lease is not None:
+            PUBLISHED_FRAMES.inc()
+            for listener in list(self.frame_listeners):
+                listener()
+
+    def get_latest_frame(self):
+        """Return a retained lease on the latest frame (caller releases), or None."""
+        with self.frame_lock:
+            lease = self.latest_frame
+            if lease is not None:
+                lease.retain()
+        return lease
+
+    def wait_for_frame(self, after_seq, timeout):
+        """Block until a frame newer than `after_seq` is published.
+
+        Returns a retained lease (caller releases) or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.frame_cond:
+            while self.frame_seq <= after_seq or self.latest_frame is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.frame_cond.wait(remaining)
+            return self.latest_frame.retain()
+
+    def latest_or_next_frame(self):
+        """Lease on the latest frame, waiting for or grabbing one if needed."""
+        lease = self.get_latest_frame()
+
+        if lease is None and self.is_open:
+            if self.streaming:
+                # Acquisition is running — wait for its next frame rather
+                # than competing with it for the camera
+                with self.frame_lock:
+                    seq = self.frame_seq
+                lease = self.wait_for_frame(seq, CALLBACK_FRAME_TIMEOUT)
+            else:
+                # Try a direct grab
+                lease = self.camera.grab()
+        return lease
+
+    # -- Captures ---------------------------------------------------------
+
+    @property
+    def callback_active(self):
+        return bool(getattr(self.camera, 'callback_active', False))
+
+    def grab_fresh_frame(self, timing=None):
+        """Return a lease on a frame exposed after this call (caller releases).
+
+        Polling: pause the stream thread, flush one stale frame, grab a fresh one.
+        Callback: skip the frame that may already be in flight and take the next
+        one the SDK pushes. With a hardware-decimated preview the capture is a
+        full-resolution snap instead. Phases are added to `timing` (PhaseTimer).
+        """
+        timing = timing or PhaseTimer()
+        camera = self.camera
+        hardware_preview = getattr(camera, 'hardware_preview', False)
+
+        if self.callback_active:
+            if hardware_preview:
+                with timing.phase('snap'):
+                    return camera.snap()
+            with self.frame_lock:
+                seq = self.frame_seq
+            with timing.phase('grab'):
+                return self.wait_for_frame(seq + 1, CALLBACK_FRAME_TIMEOUT)
+
+        # Park the stream thread to get exclusive camera access
+        with self.access.exclusive() as waited:
+            timing.add('pause', waited)
+            if hardware_preview:
+                # Stream runs binned; a snap exposes one fresh full-res frame
+                with timing.phase('snap'):
+                    return camera.snap()
+            # Flush one stale frame then grab fresh
+            with timing.phase('flush'):
+                stale = camera.grab()
+                if stale is not None:
+                    stale.release()
+            with timing.phase('grab'):
+                return camera.grab()
+
+    @property
+    def can_trigger(self):
+        return hasattr(self.camera, 'trigger_mode')
+
+    @contextmanager
+    def armed(self, source='soft', timing=None):
+        """Hold the camera in trigger mode, acquisition parked, for the block.
+
+        Yields `collect(deadline)`, which returns the lease of the next
+        triggered frame, or None once time.monotonic() passes `deadline`.
+        Phases are added to `timing` (PhaseTimer).
+        """
+        timing = timing or PhaseTimer()
+        camera = self.camera
+        if self.callback_active:
+            # The triggered frame arrives through the SDK callback
+            t0 = time.perf_counter()
+            with camera.trigger_mode(source):
+                timing.add('arm', time.perf_counter() - t0)
+                with self.frame_lock:
+                    seq = self.frame_seq
+
+                def collect(deadline):
+                    nonlocal seq
+                    while True:
+                        lease = self.wait_for_frame(seq, deadline - time.monotonic())
+                        if lease is None:
+                            return None
+                        seq = lease.seq
+                        if lease.head is not None and lease.head.bIsTrigger:
+                            return lease
+                        lease.release()
+                yield collect
+            return
+
+        with self.access.exclusive() as waited:
+            timing.add('pause', waited)
+            t0 = time.perf_counter()
+            with camera.trigger_mode(source):
+                timing.add('arm', time.perf_counter() - t0)
+                yield camera.grab_triggered
+
+    def grab_triggered_frame(self, timing=None):
+        """Soft-trigger one full-resolution exposure after this call.
+
+        Returns (lease, trigger_to_frame_seconds); lease is None on failure.
+        Phases are added to `timing` (PhaseTimer).
+        """
+        timing = timing or PhaseTimer()
+        with self.armed('soft', timing) as collect:
+            fired_at = self.camera.soft_trigger()
+            lease = collect(time.monotonic() + TRIGGER_TIMEOUT_MS / 1000.0)
+            latency = time.perf_counter() - fired_at
+            timing.add('trigger', latency)
+        return lease, (latency if lease is not None else None)
+
+    def _switch_mode(self, mode):
+        """Remember the outgoing mode's converged settings, then apply `mode`."""
+        if self.settle_detector.settled and hasattr(self.camera, 'remember_mode'):
+            self.camera.remember_mode(self.mode)
+        self.mode = mode
+        self.camera.set_mode(mode)
+
+    def set_mode(self, mode):
+        """Apply a garment color mode; captures then wait for it to settle."""
+        if self.is_open:
+            self._switch_mode(mode)
+        else:
+            self.mode = mode
+        self.mode_changed_at = time.time()
+        self.settle_detector.reset()
+        # Clear cached frame so streaming picks up fresh frames with new settings
+        self.publish_frame(None)
+
+    def apply_capture_mode(self, req_mode, timing):
+        """Accept the mode a capture asks for — the frontend sends its
+        expected mode so we can verify / re-apply if needed."""
+        if req_mode in CAMERA_MODES and req_mode != self.mode:
+            with timing.phase('mode'):
+                self._switch_mode(req_mode)
+            self.mode_changed_at = time.time()
+            self.settle_detector.reset()
+            print(f"[CAPTURE] Camera {self.id}: mode force-set to '{self.mode}' "
+                  f"via capture param")
+
+    def settle_remaining(self):
+        """Seconds left of MODE_SETTLE_TIME since the last mode change."""
+        elapsed = time.time() - self.mode_changed_at
+        return MODE_SETTLE_TIME - elapsed if 0 < elapsed < MODE_SETTLE_TIME else 0.0
+
+    def wait_settled(self, timing):
+        """Wait for the sensor to converge after a mode change.
+
+        Returns as soon as the settle detector sees stable frames, and at
+        the latest MODE_SETTLE_TIME after the change (per reference code).
+        Without acquisition running nothing feeds the detector, so the
+        full remaining time is slept out.
+        """
+        remaining = self.settle_remaining()
+        if remaining <= 0:
+            return
+        t0 = time.perf_counter()
+        with timing.phase('settle'):
+            if self.streaming:
+                settled = self.settle_detector.wait(time.time() + remaining)
+            else:
+                settled = False
+                time.sleep(remaining)
+        waited = time.perf_counter() - t0
+        MODE_SETTLE_WAIT.observe(waited)
+        if settled:
+            print(f"[CAPTURE] Camera {self.id}: mode settled after "
+                  f"{self.settle_detector.settle_time * 1000:.0f} ms "
+                  f"(waited {waited * 1000:.0f} ms)")
+        else:
+            print(f"[CAPTURE] Camera {self.id}: waited {waited:.2f}s for mode to stabilize")
+
+    @contextmanager
+    def capture_session(self, req_mode, timing):
+        """Hold this camera's capture lock with `req_mode` applied and settled."""
+        t0 = time.perf_counter()
+        with self.capture_lock:
+            waited = time.perf_counter() - t0
+            CAPTURE_LOCK_WAIT.observe(waited)
+            timing.add('lock', waited)
+            self.apply_capture_mode(req_mode, timing)
+            self.wait_settled(timing)
+            yield
+
+    def take_capture(self, req_mode, trigger='continuous', timing=None):
+        """Blocking capture sequence shared by the capture endpoints.
+
+        Applies `req_mode` if it differs from the current one, waits for the
+        sensor to stabilize, then takes a fresh (or soft-triggered) frame.
+        Returns (lease, trigger_to_frame_seconds); lease is None on failure.
+        Each phase is added to `timing` (PhaseTimer).
+        """
+        timing = timing or PhaseTimer()
+        with self.capture_session(req_mode, timing):
+            if trigger == 'soft' and self.can_trigger:
+                # Expose exactly one frame, started after this request arrived
+                return self.grab_triggered_frame(timing)
+            # Flush stale frames and take a fresh one
+            return self.grab_fresh_frame(timing), None
+
+    def consecutive_frames(self, n, timing):
+        """Yield leases on up to `n` consecutive full-resolution frames.
+
+        With a binned preview stream, frames are soft-triggered back to
+        back at full resolution; the next trigger fires before the caller
+        gets the current frame, so its processing overlaps the exposure.
+        Otherwise the stream already delivers full resolution and this
+        takes its next `n` frames, so viewers never stall. Stops early on
+        a timeout. The caller releases every lease and must close the
+        generator (contextlib.closing) to leave trigger mode.
+        """
+        if getattr(self.camera, 'hardware_preview', False) and self.can_trigger:
+            with self.armed('soft', timing) as collect:
+                self.camera.soft_trigger()
+                for i in range(n):
+                    lease = collect(time.monotonic() + TRIGGER_TIMEOUT_MS / 1000.0)
+                    if lease is None:
+                        return
+                    if i + 1 < n:
+                        self.camera.soft_trigger()
+                    yield lease
+            return
+
+        self.start_streaming()
+        with self.frame_lock:
+            seq = self.frame_seq + 1    # Skip a frame already in flight
+        for _ in range(n):
+            lease = self.wait_for_frame(seq, CALLBACK_FRAME_TIMEOUT)
+            if lease is None:
+                return
+            seq = lease.seq
+            yield lease
+
+    def take_burst(self, req_mode, n, method, timing=None):
+        """Capture `n` consecutive full-resolution frames and reduce them to one.
+
+        For a mean each frame is added into a uint16 running sum; for a
+        median it is copied into an (n, h, w) stack that is sorted once
+        acquisition is running again. Both come from this camera's burst
+        buffer (burst_frames). Either way its lease is released at once.
+
+        Returns (FrameRecord holding the reduced image, span_seconds from
+        the first to the last frame) or (None, None) on failure. Phases
+        are added to `timing` (PhaseTimer).
+        """
+        timing = timing or PhaseTimer()
+        with self.capture_session(req_mode, timing):
+            frames_in, head, stamps = None, None, []
+            with timing.phase('grab'), closing(self.consecutive_frames(n, timing)) as frames:
+                for i, lease in enumerate(frames):
+                    try:
+                        image = lease.image
+                        if frames_in is None:
+                            head = lease.head
+                            frames_in = self.burst_frames(image.shape, n, method)
+                        elif image.shape != frames_in.shape[-image.ndim:]:
+                            break                   # Resolution changed mid-burst
+                        if method == 'mean':
+                            frames_in += image
+                        else:
+                            np.copyto(frames_in[i], image)
+                        stamps.append(lease.timestamp)
+                    finally:
+                        lease.release()
+            if len(stamps) < n:
+                return None, None
+
+            with timing.phase('reduce'):
+                out = np.empty(image.shape, np.uint8)
+                if method == 'mean':
+                    mean_of_sum(frames_in, n, out)
+                else:
+                    median_frames(frames_in, out)
+        return FrameRecord(out, head=head), stamps[-1] - stamps[0]
+
+    def burst_frames(self, shape, n, method):
+        """Burst workspace for frames of `shape`, from this camera's buffer.
+
+        A zeroed uint16 sum for 'mean', else an (n,) + shape uint8 stack.
+        The buffer is sized for BURST_MAX_MEDIAN_FRAMES frames on first use
+        (and grows only if the frame size does); it is reused by every
+        later burst, so only call this with the capture lock held.
+        """
+        pixels = math.prod(shape)
+        size = BURST_MAX_MEDIAN_FRAMES * pixels
+        if self._burst_buffer is None or self._burst_buffer.size < size:
+            self._burst_buffer = None     # Drop the old one before allocating
+            self._burst_buffer = np.empty(size, np.uint8)
+        if method == 'mean':
+            total = self._burst_buffer[:2 * pixels].view(np.uint16).reshape(shape)
+            total.fill(0)
+            return total
+        return self._burst_buffer[:n * pixels].reshape((n,) + shape)
 
-    return Response(
-        jpeg.tobytes(),
-        mimetype='image/jpeg',
-        headers={
-            'X-Image-Width': str(w),
-            'X-Image-Height': str(h),
-            'X-Capture-Timestamp': timestamp,
-            'X-Camera-Mode': current_mode,
-            'Cache-Control': 'no-cache',
+    def sharpness(self, lease, scorer='laplacian'):
+        """(focus score, scorer used) of a frame; higher is sharper.
+
+        'sdk' falls back to 'laplacian' when the camera cannot evaluate
+        the frame (see SHARPNESS_SCORERS).
+        """
+        if scorer == 'sdk' and hasattr(self.camera, 'evaluate_sharpness'):
+            score = self.camera.evaluate_sharpness(lease)
+            if score is not None:
+                return score, 'sdk'
+        return laplacian_sharpness(lease.image), 'laplacian'
+
+    def take_sharpest(self, req_mode, n, scorer='laplacian', timing=None):
+        """Capture `n` consecutive full-resolution frames and keep the sharpest.
+
+        Each frame is scored as it arrives and only the best one so far is
+        held. Returns (lease, scores, index of the kept frame, scorer used);
+        lease is None on failure. If the SDK scorer fails partway, the
+        remaining frames and the held one are scored by Laplacian, and
+        frames already dropped get NaN. Phases are added to `timing`
+        (PhaseTimer), with scoring as 'score'.
+        """
+        timing = timing or PhaseTimer()
+        with self.capture_session(req_mode, timing):
+            best, best_index, scores, scored = None, None, [], 0.0
+            t0 = time.perf_counter()
+            try:
+                with closing(self.consecutive_frames(n, timing)) as frames:
+                    for lease in frames:
+                        t1 = time.perf_counter()
+                        score, used = self.sharpness(lease, scorer)
+                        if used != scorer:
+                            scorer = used
+                            scores = [math.nan] * len(scores)
+                            if best is not None:
+                                scores[best_index] = laplacian_sharpness(best.image)
+                        scores.append(score)
+                        scored += time.perf_counter() - t1
+                        if best is None or score > scores[best_index]:
+                            if best is not None:
+                                best.release()
+                            best, best_index = lease, len(scores) - 1
+                        else:
+                            lease.release()
+            except BaseException:
+                if best is not None:
+                    best.release()        # SDK error mid-sequence
+                raise
+            timing.add('grab', time.perf_counter() - t0 - scored)
+            timing.add('score', scored)
+        if len(scores) < n:
+            if best is not None:
+                best.release()
+            return None, scores, None, scorer
+        return best, scores, best_index, scorer
+
+    # -- Acquisition ------------------------------------------------------
+
+    def _stream_worker(self):
+        """Background thread that continuously grabs frames for streaming."""
+        camera = self.camera
+        try:
+            while self.streaming and camera.is_open:
+                self.access.checkpoint()  # Yield to a pending capture
+                lease = camera.grab()
+                if lease is not None:
+                    self.publish_frame(lease)
+                else:
+                    time.sleep(0.005)  # Brief pause only on failed grabs
+        finally:
+            self.access.stream_stopped()
+            self.publish_frame(None)
+
+    def start_streaming(self):
+        """Start the background frame-grabbing thread."""
+        if self.streaming:
+            return
+        self.streaming = True
+        if acquisition_mode == 'callback' and hasattr(self.camera, 'start_callback'):
+            if self.camera.start_callback(self.publish_frame):
+                print(f"[INFO] Camera {self.id}: streaming started (callback acquisition)")
+                return
+            print("[WARN] Callback acquisition unavailable — polling instead")
+        self.access.stream_started()
+        self.stream_thread = threading.Thread(target=self._stream_worker, daemon=True,
+                                              name=f'camera-stream-{self.id}')
+        self.stream_thread.start()
+        print(f"[INFO] Camera {self.id}: streaming started")
+
+    def stop_streaming(self):
+        """Stop the background streaming thread."""
+        self.streaming = False
+        if self.callback_active:
+            self.camera.stop_callback()
+            self.publish_frame(None)
+        self.access.stream_stopped()  # Wake a parked stream thread so it exits
+        if self.stream_thread:
+            self.stream_thread.join(timeout=2)
+        print(f"[INFO] Camera {self.id}: streaming stopped")
+
+    def close(self):
+        self.stop_streaming()
+        self.camera.close()
+        self._burst_buffer = None
+
+    # -- Streaming --------------------------------------------------------
+
+    def default_stream_width(self):
+        """STREAM_SCALE of the full sensor width (1364 px on the MindVision)."""
+        sensor_w = getattr(self.camera, 'sensor_width', None)
+        return int(sensor_w * STREAM_SCALE) if sensor_w else STREAM_FALLBACK_WIDTH
+
+    def subscribe_stream(self, width, quality, loop):
+        """(broadcaster, subscriber) for a stream profile. Viewers of one
+        profile share its broadcaster, which is created on demand."""
+        key = (width or self.default_stream_width(), quality)
+        with self.broadcasters_lock:
+            bc = self.broadcasters.get(key)
+            if bc is None:
+                bc = self.broadcasters[key] = MjpegBroadcaster(self, *key)
+            return bc, bc.subscribe(loop)
+
+    def unsubscribe_stream(self, bc, sub):
+        """Remove a viewer. A broadcaster goes with its last subscriber, so
+        client-chosen ?w= / ?q= profiles do not pile up."""
+        key = (bc.width, bc.quality)
+        with self.broadcasters_lock:
+            bc.unsubscribe(sub)
+            if not bc.subscriber_count and self.broadcasters.get(key) is bc:
+                del self.broadcasters[key]
+
+    def frame_time(self, lease):
+        """(time.time() the frame was exposed, 'sensor'), from the camera's
+        timestamp when it has one, else (host read-out time, 'host')."""
+        host_time = getattr(self.camera, 'host_time', None)
+        exposed = host_time(lease.sensor_time) if host_time else None
+        if exposed is None:
+            return lease.timestamp, 'host'
+        return exposed, 'sensor'
+
+
+def gather_leases(getters):
+    """Call every getter (returns a lease or None) and list the results.
+
+    All getters run even if one raises; the leases the others returned
+    are then released before the first exception is re-raised, so a
+    failed capture set never keeps FramePool slots.
+    """
+    leases, error = [], None
+    for get in getters:
+        try:
+            leases.append(get())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for lease in leases:
+            if lease is not None:
+                lease.release()
+        raise error
+    return leases
+
+
+def take_capture_set(targets, req_mode, trigger='soft', timing=None,
+                     timeout=HARDWARE_TRIGGER_TIMEOUT_MS / 1000.0):
+    """Expose one frame on every camera in `targets` at the same moment.
+
+    Takes every camera's capture lock (in the order given — callers pass
+    cameras sorted by id so concurrent sets cannot deadlock), applies and
+    settles the mode on all of them at once, then arms every camera in
+    trigger mode before any exposure starts: soft triggers go out back to
+    back, or with trigger='hardware' the cameras wait up to `timeout`
+    seconds for the shared external pulse. With trigger='continuous', or
+    a camera without a trigger input, fresh frames are grabbed on all
+    cameras concurrently instead.
+
+    Returns ([(device, lease or None)], soft_trigger_spread_seconds or None).
+    Phases are added to `timing` (PhaseTimer).
+    """
+    timing = timing or PhaseTimer()
+    with ExitStack() as stack:
+        t0 = time.perf_counter()
+        for device in targets:
+            stack.enter_context(device.capture_lock)
+        waited = time.perf_counter() - t0
+        CAPTURE_LOCK_WAIT.observe(waited)
+        timing.add('lock', waited)
+
+        for device in targets:
+            device.apply_capture_mode(req_mode, timing)
+        for device in targets:
+            device.wait_settled(timing)     # Converging together; waits overlap
+
+        if trigger not in TRIGGER_SOURCES or not all(d.can_trigger for d in targets):
+            with timing.phase('grab'), ThreadPoolExecutor(
+                    max_workers=len(targets), thread_name_prefix='capture-set') as pool:
+                futures = [pool.submit(d.grab_fresh_frame) for d in targets]
+            return list(zip(targets, gather_leases(f.result for f in futures))), None
+
+        collectors = [stack.enter_context(d.armed(trigger, timing)) for d in targets]
+        spread = None
+        t0 = time.perf_counter()
+        if trigger == 'soft':
+            fired = [d.camera.soft_trigger() for d in targets]
+            spread = fired[-1] - fired[0]
+            timeout = TRIGGER_TIMEOUT_MS / 1000.0
+        # Frames wait in the SDK's buffers, so collecting them in turn
+        # does not delay any exposure
+        deadline = time.monotonic() + timeout
+        leases = gather_leases(functools.partial(collect, deadline)
+                               for collect in collectors)
+        timing.add('trigger', time.perf_counter() - t0)
+    return list(zip(targets, leases)), spread
+
+
+# ============================================================================
+# Capture Jobs
+# ============================================================================
+#
+# POST /api/capture-jobs queues a capture and answers with a job id at
+# once, so callers with short HTTP timeouts (the Laravel controller, the
+# browser) never hold a connection open through settle, grab and encode.
+# A few worker tasks run jobs in priority order; each job's blocking work
+# still goes through the SDK executor and the camera's capture lock. The
+# encoded result is kept until fetched or expired.
+
+CAPTURE_JOB_KINDS = ('capture-jpeg', 'capture-raw', 'capture-burst')
+CAPTURE_JOB_PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+CAPTURE_JOB_WORKERS = 2           # Jobs running at once (different cameras overlap)
+CAPTURE_JOB_QUEUE_SIZE = 32       # Queued jobs beyond this are refused with 503
+CAPTURE_JOB_TTL = 300.0           # Seconds a finished job's result is kept
+CAPTURE_JOB_CACHE_BYTES = 256 * 1024 * 1024   # Result budget; oldest go first
+CAPTURE_JOB_EVENT_KEEPALIVE = 15.0  # Seconds between SSE comments while waiting
+
+
+class CaptureJob:
+    """One queued capture and, once finished, its encoded result.
+
+    `state` moves queued -> running -> done | failed (or queued ->
+    cancelled). Each change wakes the SSE streams waiting in `changed()`.
+    """
+
+    def __init__(self, kind, device, params, priority):
+        self.id = os.urandom(8).hex()
+        self.kind = kind
+        self.device = device
+        self.params = params
+        self.priority = priority
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.body = None              # Result bytes (JPEG, or RAW_HEADER + pixels)
+        self.media_type = None
+        self.headers = {}
+        self._changed = asyncio.Event()
+
+    @property
+    def terminal(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def set_state(self, state, error=None):
+        self.state = state
+        self.error = error
+        if state == 'running':
+            self.started = time.time()
+        elif self.terminal:
+            self.finished = time.time()
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def changed(self):
+        """Event set on the next state change."""
+        return self._changed
+
+    def describe(self):
+        info = {
+            'id': self.id,
+            'capture': self.kind,
+            'camera_id': self.device.id,
+            'priority': self.priority,
+            'state': self.state,
+            'created': datetime.fromtimestamp(self.created).isoformat(timespec='milliseconds'),
+            'queue_ms': (round(((self.started or self.finished or time.time())
+                                - self.created) * 1000, 1)),
+            'run_ms': (round(((self.finished or time.time()) - self.started) * 1000, 1)
+                       if self.started is not None else None),
+            'error': self.error,
         }
-    )
+        if self.state == 'done':
+            info.update(result_url=f'/api/capture-jobs/{self.id}', bytes=len(self.body),
+                        media_type=self.media_type,
+                        width=int(self.headers['X-Image-Width']),
+                        height=int(self.headers['X-Image-Height']))
+        return info
+
+
+class CaptureJobQueue:
+    """Bounded priority queue of CaptureJobs and a TTL cache of their results.
+
+    Higher priorities run first, FIFO within a priority. Only jobs still
+    queued count towards `size`; a cancelled job leaves the heap at once.
+    Worker tasks start with the first job submitted on each event loop.
+    Finished jobs stay fetchable for CAPTURE_JOB_TTL seconds, or less once
+    their results exceed the byte budget. Used from the event loop only.
+    """
+
+    def __init__(self, workers=CAPTURE_JOB_WORKERS, size=CAPTURE_JOB_QUEUE_SIZE,
+                 ttl=CAPTURE_JOB_TTL, budget=CAPTURE_JOB_CACHE_BYTES):
+        self.workers = workers
+        self.size = size
+        self.ttl = ttl
+        self.budget = budget
+        self.jobs = collections.OrderedDict()   # id -> CaptureJob, oldest first
+        self._heap = []                         # (priority, order, job) per queued job
+        self._order = itertools.count()
+        self._loop = None
+        self._wake = None                       # Set when a job is pushed
+        self._tasks = []
+
+    def _serve(self):
+        """Start the workers on the running loop, once per loop (the module
+        global outlives a loop under TestClient or an in-process restart)."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    def submit(self, job):
+        """Queue `job`; False if the queue is full."""
+        self.expire()
+        if len(self._heap) >= self.size:
+            return False
+        self._serve()
+        heapq.heappush(self._heap, (CAPTURE_JOB_PRIORITIES[job.priority],
+                                    next(self._order), job))
+        self.jobs[job.id] = job
+        CAPTURE_JOBS.labels('queued').inc()
+        self._wake.set()
+        return True
+
+    def get(self, job_id):
+        self.expire()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job):
+        """Cancel a job that has not started; False once it is running or done."""
+        if job.state != 'queued':
+            return False
+        self._heap = [entry for entry in self._heap if entry[2] is not job]
+        heapq.heapify(self._heap)
+        job.set_state('cancelled')
+        CAPTURE_JOBS.labels('cancelled').inc()
+        return True
+
+    def counts(self):
+        """{state: number of jobs} for the jobs currently held."""
+        return collections.Counter(job.state for job in self.jobs.values())
+
+    def expire(self):
+        """Drop finished jobs past their TTL, then the oldest over the budget."""
+        now = time.time()
+        finished = [job for job in self.jobs.values() if job.terminal]
+        size = sum(len(job.body) for job in finished if job.body is not None)
+        for job in finished:
+            if now - job.finished < self.ttl and size <= self.budget:
+                continue
+            if job.body is not None:
+                size -= len(job.body)
+            del self.jobs[job.id]
+
+    async def _work(self):
+        while True:
+            while not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+            _, _, job = heapq.heappop(self._heap)
+            CAPTURE_JOB_QUEUE_WAIT.observe(time.time() - job.created)
+            job.set_state('running')
+            try:
+                error = await run_capture_job(job)
+            except Exception as e:
+                print(f"[ERROR] Capture job {job.id} failed: {e}")
+                error = str(e)
+            job.set_state('failed' if error else 'done', error)
+            CAPTURE_JOBS.labels(job.state).inc()
+            self.expire()
+
+
+async def run_capture_job(job):
+    """Capture and encode one job's result into `job.body`.
+
+    Runs the same sequence, with the same parameters and response
+    headers, as the job's endpoint. Returns an error message, or None.
+    """
+    device, params = job.device, job.params
+    if not device.is_open:
+        return 'Camera not available'
+
+    timing = PhaseTimer()
+    timing.add('queue', job.started - job.created)
+    fmt = 'raw' if job.kind == 'capture-raw' else 'jpeg'
+    headers = {}
+    if job.kind == 'capture-burst':
+        n, method, fmt = burst_params(params)
+        lease, span = await run_blocking(device.take_burst, params.get('mode', device.mode),
+                                         n, method, timing)
+        if lease is not None:
+            headers.update({'X-Burst-Frames': str(n), 'X-Burst-Reduce': method,
+                            'X-Burst-Span-Ms': f'{span * 1000:.1f}'})
+    else:
+        lease, headers, _ = await take_requested_capture(params, device, timing)
+    if lease is None:
+        return 'Failed to capture frame'
+
+    if fmt == 'raw':
+        try:
+            image = lease.image
+            if not image.flags.c_contiguous:
+                image = np.ascontiguousarray(image)
+            h, w = image.shape[:2]
+            job.body = raw_frame_header(image, lease.head) + image.tobytes()
+        finally:
+            lease.release()
+        job.media_type = 'application/octet-stream'
+    else:
+        jpeg, w, h = await run_blocking(encode_lease, lease, 'capture')
+        ENCODE_SECONDS.labels('capture-job').observe(jpeg.encode_time)
+        timing.add('encode', jpeg.encode_time)
+        try:
+            job.body = bytes(jpeg.data)
+        finally:
+            jpeg.release()
+        job.media_type = 'image/jpeg'
+        headers['X-Encode-Ms'] = f'{jpeg.encode_time * 1000:.1f}'
+        headers['X-Jpeg-Encoder'] = jpeg.encoder
+    timing_log.record('capture-job', timing.finish())
+
+    job.headers = {
+        'X-Image-Width': str(w),
+        'X-Image-Height': str(h),
+        'X-Capture-Timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'X-Camera-Mode': device.mode,
+        'X-Camera-Id': device.id,
+        'X-Capture-Job': job.id,
+        'Server-Timing': timing.header(),
+        **headers,
+    }
+    return None
+
+
+capture_jobs = CaptureJobQueue()
+
+
+# ============================================================================
+# API Endpoints
+# ============================================================================
+
+def find_device(camera_id):
+    """CameraDevice by id or serial number, or None."""
+    device = devices.get(camera_id)
+    if device is None:
+        device = next((d for d in devices.values() if d.serial == camera_id), None)
+    return device
+
+
+def request_device(conn):
+    """CameraDevice a request addresses: /api/cameras/{camera_id}/... by id
+    or serial number, otherwise the default camera. None if unknown."""
+    camera_id = conn.path_params.get('camera_id')
+    if camera_id is None:
+        return default_device()
+    return find_device(camera_id)
+
+
+def device_or_error(request):
+    """(device, None), or (None, error response) for unknown or closed cameras."""
+    device = request_device(request)
+    if device is None and 'camera_id' in request.path_params:
+        return None, JSONResponse({'error': f"Unknown camera "
+                                            f"'{request.path_params['camera_id']}'"},
+                                  status_code=404)
+    if device is None or not device.is_open:
+        return None, JSONResponse({'error': 'Camera not available'}, status_code=503)
+    return device, None
+
+
+async def tile_socket(websocket):
+    """Live view as JPEG tiles: a keyframe, then only what changed."""
+    await websocket.accept()
+    device = request_device(websocket)
+    if device is None or not device.is_open:
+        await websocket.close(code=1011, reason='Camera not available')
+        return
+
+    device.start_streaming()
+    loop = asyncio.get_running_loop()
+    session = TileSession(device.default_stream_width())
+    wake = asyncio.Event()
+
+    def on_publish():
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass  # Event loop already closed (server shutting down)
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get('type') if isinstance(message, dict) else None
+            try:
+                if kind == 'subscribe':
+                    session.configure(message)
+                elif kind == 'keyframe':
+                    session.request_keyframe()
+                else:
+                    raise ValueError(f'Unknown message type {kind!r}')
+            except (TypeError, ValueError) as e:
+                await websocket.send_json({'type': 'error', 'error': str(e)})
+
+    device.frame_listeners.add(on_publish)
+    receiver = asyncio.create_task(receive())
+    seq = 0
+    try:
+        while device.streaming and not receiver.done():
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            wake.clear()
+            lease = device.get_latest_frame()
+            if lease is None or lease.seq <= seq:
+                if lease is not None:
+                    lease.release()
+                continue
+            seq = lease.seq
+            started = loop.time()
+            config, message = await loop.run_in_executor(tile_executor,
+                                                         session.update, lease)
+            if config is not None:
+                await websocket.send_json(config)
+            if message is not None:
+                await websocket.send_bytes(message)
+            wait = started + 1.0 / session.fps - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+    except (WebSocketDisconnect, RuntimeError):
+        pass                              # Client went away mid-send
+    finally:
+        device.frame_listeners.discard(on_publish)
+        receiver.cancel()
+
+
+async def status(request):
+    """Return camera status (the default camera's at /api/status)."""
+    device = request_device(request)
+    if device is None and 'camera_id' in request.path_params:
+        return device_or_error(request)[1]
+    seq, frame_time = 0, None
+    if device is not None:
+        with device.frame_lock:
+            seq = device.frame_seq
+            if device.latest_frame is not None:
+                frame_time = device.latest_frame.timestamp
+    return JSONResponse({
+        'status': 'ready' if device and device.is_open else 'no_camera',
+        'camera_id': device.id if device else None,
+        'camera_type': device.camera.camera_type if device else None,
+        'current_mode': device.mode if device else 'other',
+        'streaming': bool(device and device.streaming),
+        'acquisition': 'callback' if device and device.callback_active else 'poll',
+        'settled': device.settle_detector.settled if device else None,
+        'settle_ms': (round(device.settle_detector.settle_time * 1000, 1)
+                      if device and device.settle_detector.settle_time is not None else None),
+        'frame_seq': seq,
+        'frame_age_ms': (round((time.time() - frame_time) * 1000, 1)
+                         if frame_time is not None else None),
+        'cameras': len(devices),
+        'server': 'MagicQC Camera Server v1.0',
+    })
+
+
+async def list_cameras(request):
+    """Every opened camera with its id, serial number and state."""
+    return JSONResponse({'cameras': [d.describe() for d in devices.values()]})
+
+
+async def metrics(request):
+    """Counters and histograms in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+
+    viewers, dropped, tile_viewers, sdk_stats = [], [], [], []
+    for device in list(devices.values()):
+        with device.broadcasters_lock:
+            active = list(device.broadcasters.values())
+        for bc in active:
+            subs = bc.subscribers
+            if not subs:
+                continue
+            profile = {'camera': device.id, 'width': bc.width, 'quality': bc.quality}
+            viewers.append((profile, len(subs)))
+            dropped += [({'subscriber': sub.id, **profile}, sub.dropped) for sub in subs]
+        tile_viewers.append(({'camera': device.id}, len(device.frame_listeners)))
+
+        camera = device.camera
+        if camera.is_open and hasattr(camera, 'frame_statistics'):
+            stats = await run_blocking(camera.frame_statistics)
+            if stats is not None:
+                sdk_stats.append(({'camera': device.id}, stats))
+    lines += render_gauge('camera_stream_subscribers',
+                          'Connected MJPEG viewers per stream profile', viewers)
+    lines += render_gauge('camera_stream_subscriber_dropped_frames',
+                          'MJPEG parts dropped for each connected viewer', dropped)
+    lines += render_gauge('camera_tile_viewers', 'Connected tile-channel viewers',
+                          tile_viewers)
+    job_counts = capture_jobs.counts()
+    lines += render_gauge('camera_capture_jobs', 'Capture jobs waiting for or holding a worker',
+                          [({'state': state}, job_counts[state])
+                           for state in ('queued', 'running')])
+
+    if sdk_stats:
+        for i, (name, doc) in enumerate((
+                ('camera_sdk_frames_total', 'Frames the SDK received, including bad ones'),
+                ('camera_sdk_frames_captured_total', 'Valid frames the SDK captured'),
+                ('camera_sdk_frames_lost_total', 'Frames the SDK lost'))):
+            lines += render_gauge(name, doc, [(labels, stats[i]) for labels, stats in sdk_stats],
+                                  kind='counter')
+    return Response('\n'.join(lines) + '\n', media_type=METRICS_CONTENT_TYPE)
+
+
+async def timings(request):
+    """p50/p95/p99 of recent capture phases (ms), per endpoint.
+
+    Optional `?endpoint=` (capture, capture-jpeg, capture-raw) narrows
+    the summary to one endpoint.
+    """
+    return JSONResponse(timing_log.summary(request.query_params.get('endpoint')))
+
+
+async def ping(request):
+    """Ultra-lightweight health check — no camera interaction."""
+    return Response(b'', status_code=200)
+
+
+async def set_mode(request):
+    """Set garment color mode (black, white, or other).
+
+    /api/mode applies it to every camera — they all shoot the same
+    garment; /api/cameras/<id>/mode to that camera only.
+    """
+    data = await read_json(request)
+    mode = data.get('mode', 'other')
+
+    if mode not in CAMERA_MODES:
+        return JSONResponse({'error': 'Invalid mode. Use "black", "white", or "other".'},
+                            status_code=400)
+
+    if 'camera_id' in request.path_params:
+        device, error = device_or_error(request)
+        if error is not None:
+            return error
+        targets = [device]
+    else:
+        targets = list(devices.values())
+    await asyncio.gather(*(run_blocking(d.set_mode, mode) for d in targets))
+
+    print(f"[INFO] Mode changed to '{mode}' — camera needs ~{MODE_SETTLE_TIME}s to stabilize")
+
+    gain, ae_state = MODE_SETTINGS.get(mode, MODE_SETTINGS['other'])
+
+    return JSONResponse({
+        'success': True,
+        'mode': mode,
+        'cameras': [d.id for d in targets],
+        'settings': {'gain': gain, 'auto_exposure': 'ON' if ae_state else 'OFF'},
+    })
+
+
+async def video_stream(request):
+    """MJPEG live stream endpoint.
+
+    Optional `?w=` (width), `?q=` (quality) and `?fps=` (max frame rate)
+    set this client's ceiling; the server lowers them while it lags.
+    """
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    try:
+        width = int(request.query_params.get('w', 0)) or device.default_stream_width()
+        quality = int(request.query_params.get('q', STREAM_QUALITY))
+        fps = int(request.query_params.get('fps', STREAM_MAX_FPS))
+    except ValueError:
+        return JSONResponse({'error': 'w, q and fps must be integers'}, status_code=400)
+    if width < 16 or not 10 <= quality <= 95 or not 1 <= fps <= STREAM_MAX_FPS:
+        return JSONResponse({'error': f'Use w >= 16, q within 10-95 and fps within '
+                                      f'1-{STREAM_MAX_FPS}'}, status_code=400)
+
+    device.start_streaming()
+    return StreamingResponse(generate_mjpeg(device, StreamClient(width, quality, fps)),
+                             media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+async def capture(request):
+    """Capture a single high-quality frame and return as base64 JPEG.
+    (Legacy endpoint — prefer /api/capture-jpeg for speed.)"""
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    data = await read_json(request)
+    timing = PhaseTimer()
+    # Fresh frame exposed after the request
+    lease, _ = await run_blocking(device.take_capture, data.get('mode', device.mode),
+                                  'continuous', timing)
+
+    if lease is None:
+        return JSONResponse({'error': 'Failed to capture frame'}, status_code=500,
+                            headers={'Server-Timing': timing.header()})
+
+    jpeg, w, h = await run_blocking(encode_lease, lease, 'capture')
+    ENCODE_SECONDS.labels('capture').observe(jpeg.encode_time)
+    timing.add('encode', jpeg.encode_time)
+    timing_log.record('capture', timing.finish())
+    try:
+        b64 = base64.b64encode(jpeg.data).decode('utf-8')
+    finally:
+        jpeg.release()
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    return JSONResponse({
+        'success': True,
+        'image': b64,
+        'width': w,
+        'height': h,
+        'mode': device.mode,
+        'timestamp': timestamp,
+        'camera_id': device.id,
+        'camera_type': device.camera.camera_type,
+        'encode_ms': round(jpeg.encode_time * 1000, 1),
+    }, headers={'Server-Timing': timing.header()})
+
+
+def best_of_params(params):
+    """(n, scorer) from `best` / `score` parameters; None if invalid."""
+    scorer = params.get('score', 'laplacian')
+    try:
+        n = int(params['best'])
+    except (TypeError, ValueError):
+        n = 0
+    if not 2 <= n <= BEST_OF_MAX_FRAMES or scorer not in SHARPNESS_SCORERS:
+        return None
+    return n, scorer
+
+
+BURST_USAGE = (f'Use n=2-{BURST_MAX_FRAMES} (2-{BURST_MAX_MEDIAN_FRAMES} for median), '
+               f'reduce=mean|median and format=jpeg|raw.')
+
+
+def burst_params(params):
+    """(n, reduce method, format) from /api/capture-burst parameters; None if invalid."""
+    method = params.get('reduce', 'mean')
+    fmt = params.get('format', 'jpeg')
+    try:
+        n = int(params.get('n', BURST_FRAMES))
+    except (TypeError, ValueError):
+        n = 0
+    limit = BURST_MAX_MEDIAN_FRAMES if method == 'median' else BURST_MAX_FRAMES
+    if not 2 <= n <= limit or method not in BURST_REDUCERS or fmt not in ('jpeg', 'raw'):
+        return None
+    return n, method, fmt
+
+
+async def take_requested_capture(params, device, timing):
+    """Run the capture a capture-jpeg / capture-raw request asks for.
+
+    `?best=N` (2-BEST_OF_MAX_FRAMES) keeps the sharpest of N consecutive
+    frames — for a garment still settling or a vibrating table — scored
+    with `?score=laplacian|sdk`; the scores go in X-Sharpness-* headers,
+    X-Sharpness-Scorer naming the scorer actually used.
+    Otherwise `?trigger=` takes a fresh or soft-triggered frame.
+    `params` is the query string (or a capture job's parameters).
+
+    Returns (lease or None on failure, extra response headers, None), or
+    (None, None, error response) for invalid parameters.
+    """
+    req_mode = params.get('mode', device.mode)
+    if params.get('best') is None:
+        trigger = params.get('trigger', capture_trigger)
+        if trigger not in CAPTURE_TRIGGERS:
+            return None, None, JSONResponse({'error': f"Invalid trigger. Use one of "
+                                                      f"{', '.join(CAPTURE_TRIGGERS)}."},
+                                            status_code=400)
+        lease, latency = await run_blocking(device.take_capture, req_mode, trigger, timing)
+        headers = {}
+        if latency is not None:
+            headers['X-Trigger-Latency-Ms'] = f'{latency * 1000:.1f}'
+        return lease, headers, None
+
+    best = best_of_params(params)
+    if best is None:
+        return None, None, JSONResponse(
+            {'error': f'Use best=2-{BEST_OF_MAX_FRAMES} and score=laplacian|sdk.'},
+            status_code=400)
+    n, scorer = best
+    lease, scores, index, scorer = await run_blocking(device.take_sharpest, req_mode, n,
+                                                      scorer, timing)
+    headers = {
+        'X-Sharpness-Scorer': scorer,
+        'X-Sharpness-Scores': ','.join(f'{score:.1f}' for score in scores),
+    }
+    if lease is not None:
+        headers['X-Sharpness-Score'] = f'{scores[index]:.1f}'
+        headers['X-Sharpness-Frame'] = str(index)
+    return lease, headers, None
+
+
+async def capture_jpeg(request):
+    """High-quality capture — returns raw JPEG binary with metadata in headers.
+
+    Uses the same pattern as the reference capture code:
+      1. Apply / confirm camera mode settings
+      2. Wait for sensor to stabilize (gain + auto-exposure)
+      3. Flush stale frames from the camera buffer
+      4. Grab a fresh frame
+
+    With `?trigger=soft` (or --capture-trigger soft) steps 3-4 become a
+    single software-triggered exposure; the trigger-to-frame latency is
+    reported in X-Trigger-Latency-Ms. With `?best=N` they grab N frames
+    and keep the sharpest (see take_requested_capture).
+    """
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    timing = PhaseTimer()
+    lease, extra_headers, error = await take_requested_capture(request.query_params,
+                                                               device, timing)
+    if error is not None:
+        return error
+    if lease is None:
+        return JSONResponse({'error': 'Failed to capture frame'}, status_code=500,
+                            headers={'Server-Timing': timing.header()})
+
+    jpeg, w, h = await run_blocking(encode_lease, lease, 'capture')
+    ENCODE_SECONDS.labels('capture-jpeg').observe(jpeg.encode_time)
+    timing.add('encode', jpeg.encode_time)
+    timing_log.record('capture-jpeg', timing.finish())
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    headers = {
+        'X-Image-Width': str(w),
+        'X-Image-Height': str(h),
+        'X-Capture-Timestamp': timestamp,
+        'X-Camera-Mode': device.mode,
+        'X-Camera-Id': device.id,
+        'Cache-Control': 'no-cache',
+        'Server-Timing': timing.header(),
+    }
+    headers.update(extra_headers)
+
+    return jpeg_response(jpeg, headers)
+
+
+async def capture_raw(request):
+    """Zero-encode capture for the measurement pipeline.
+
+    Same capture sequence and parameters as /api/capture-jpeg, but the
+    frame is returned uncompressed as application/octet-stream: a
+    RAW_HEADER record followed by the pixel rows, streamed directly from
+    the frame buffer (or from a copy once RAW_ZERO_COPY_DOWNLOADS are
+    already in flight).
+    """
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    timing = PhaseTimer()
+    lease, extra_headers, error = await take_requested_capture(request.query_params,
+                                                               device, timing)
+    if error is not None:
+        return error
+    if lease is None:
+        return JSONResponse({'error': 'Failed to capture frame'}, status_code=500,
+                            headers={'Server-Timing': timing.header()})
+    lease, zero_copy = await run_blocking(detach_for_download, lease)
+    timing_log.record('capture-raw', timing.finish())
+
+    image = lease.image
+    if not image.flags.c_contiguous:
+        image = np.ascontiguousarray(image)
+    header = raw_frame_header(image, lease.head)
+    pixels = image.reshape(-1).data
+    h, w = image.shape[:2]
+
+    headers = {
+        'Content-Length': str(len(header) + len(pixels)),
+        'X-Image-Width': str(w),
+        'X-Image-Height': str(h),
+        'X-Capture-Timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'X-Camera-Mode': device.mode,
+        'X-Camera-Id': device.id,
+        'Cache-Control': 'no-cache',
+        'Server-Timing': timing.header(),
+    }
+    headers.update(extra_headers)
 
+    return StreamingResponse(stream_raw_frame(lease, header, pixels, zero_copy),
+                             media_type='application/octet-stream',
+                             headers=headers)
 
-@app.route('/api/preview', methods=['GET'])
-def preview():
-    """Return latest frame as a single JPEG image."""
-    with frame_lock:
-        frame = latest_frame
 
-    if frame is None:
-        # Try a direct grab
-        if camera and camera.is_open:
-            frame = camera.grab()
+async def capture_burst(request):
+    """Low-noise capture: `?n=` consecutive frames reduced per pixel.
+
+    `reduce=mean` (default) averages the sensor noise down by about
+    sqrt(n); `reduce=median` also rejects outliers such as a hand passing
+    through one frame. `format=jpeg` (default) or `raw` returns the result
+    like /api/capture-jpeg or /api/capture-raw; `mode` as for those.
+    """
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    burst = burst_params(request.query_params)
+    if burst is None:
+        return JSONResponse({'error': BURST_USAGE}, status_code=400)
+    n, method, fmt = burst
+
+    timing = PhaseTimer()
+    record, span = await run_blocking(device.take_burst,
+                                      request.query_params.get('mode', device.mode),
+                                      n, method, timing)
+    if record is None:
+        return JSONResponse({'error': 'Failed to capture burst'}, status_code=500,
+                            headers={'Server-Timing': timing.header()})
+
+    h, w = record.image.shape[:2]
+    headers = {
+        'X-Image-Width': str(w),
+        'X-Image-Height': str(h),
+        'X-Capture-Timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'X-Camera-Mode': device.mode,
+        'X-Camera-Id': device.id,
+        'X-Burst-Frames': str(n),
+        'X-Burst-Reduce': method,
+        'X-Burst-Span-Ms': f'{span * 1000:.1f}',
+        'Cache-Control': 'no-cache',
+    }
+    if fmt == 'raw':
+        timing_log.record('capture-burst', timing.finish())
+        header = raw_frame_header(record.image, record.head)
+        pixels = record.image.reshape(-1).data
+        headers['Content-Length'] = str(len(header) + len(pixels))
+        headers['Server-Timing'] = timing.header()
+        return StreamingResponse(stream_raw_frame(record, header, pixels),
+                                 media_type='application/octet-stream',
+                                 headers=headers)
+
+    jpeg, _, _ = await run_blocking(encode_lease, record, 'capture')
+    ENCODE_SECONDS.labels('capture-burst').observe(jpeg.encode_time)
+    timing.add('encode', jpeg.encode_time)
+    timing_log.record('capture-burst', timing.finish())
+    headers['Server-Timing'] = timing.header()
+    return jpeg_response(jpeg, headers)
+
+
+async def capture_set(request):
+    """Synchronized capture on several cameras, e.g. both sides of a garment.
+
+    Query: `cameras=0,1` (ids or serial numbers, default all), `mode`,
+    `trigger=soft|hardware|continuous` (default soft) and, for hardware,
+    `timeout_ms` to wait for the external pulse. All cameras expose
+    together (see take_capture_set) and the frames are encoded in
+    parallel. Returns JSON with a base64 JPEG per camera, its sensor
+    timestamp, and the skew between the earliest and latest exposure.
+    """
+    targets = []
+    for camera_id in request.query_params.get('cameras', '').split(','):
+        if not camera_id:
+            continue
+        device = find_device(camera_id)
+        if device is None:
+            return JSONResponse({'error': f"Unknown camera '{camera_id}'"}, status_code=404)
+        if device not in targets:
+            targets.append(device)
+    targets = sorted(targets or devices.values(), key=lambda d: int(d.id))
+    if not targets or not all(d.is_open for d in targets):
+        return JSONResponse({'error': 'Camera not available'}, status_code=503)
+
+    trigger = request.query_params.get('trigger', 'soft')
+    if trigger not in CAPTURE_SET_TRIGGERS:
+        return JSONResponse({'error': f"Invalid trigger. Use one of "
+                                      f"{', '.join(CAPTURE_SET_TRIGGERS)}."},
+                            status_code=400)
+    try:
+        timeout = float(request.query_params.get('timeout_ms',
+                                                 HARDWARE_TRIGGER_TIMEOUT_MS)) / 1000.0
+    except ValueError:
+        return JSONResponse({'error': 'Invalid timeout_ms'}, status_code=400)
+
+    timing = PhaseTimer()
+    shots, spread = await run_blocking(take_capture_set, targets,
+                                       request.query_params.get('mode'), trigger,
+                                       timing, timeout)
+
+    failed = [device.id for device, lease in shots if lease is None]
+    if failed:
+        for _, lease in shots:
+            if lease is not None:
+                lease.release()
+        return JSONResponse({'error': 'Failed to capture frame', 'cameras': failed},
+                            status_code=500, headers={'Server-Timing': timing.header()})
+
+    frames = []
+    for device, lease in shots:
+        exposed, source = device.frame_time(lease)
+        frames.append({
+            'camera_id': device.id,
+            'serial': device.serial,
+            'mode': device.mode,
+            'sensor_timestamp_us': lease.sensor_time,
+            'frame_time': exposed,
+            'clock': source,
+        })
+    times = [f['frame_time'] for f in frames]
+
+    with timing.phase('encode'):
+        encoded = await asyncio.gather(*(run_blocking(encode_lease, lease, 'capture')
+                                         for _, lease in shots))
+    for frame, (jpeg, w, h) in zip(frames, encoded):
+        ENCODE_SECONDS.labels('capture-set').observe(jpeg.encode_time)
+        try:
+            frame['image'] = base64.b64encode(jpeg.data).decode('utf-8')
+        finally:
+            jpeg.release()
+        frame.update(width=w, height=h, encode_ms=round(jpeg.encode_time * 1000, 1))
+    timing_log.record('capture-set', timing.finish())
+
+    return JSONResponse({
+        'success': True,
+        'trigger': trigger,
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'skew_ms': round((max(times) - min(times)) * 1000, 3),
+        # 'sensor' when every skew input is a camera timestamp
+        'skew_clock': ('sensor' if all(f['clock'] == 'sensor' for f in frames)
+                       else 'host'),
+        'trigger_spread_ms': round(spread * 1000, 3) if spread is not None else None,
+        'frames': frames,
+    }, headers={'Server-Timing': timing.header()})
+
+
+async def submit_capture_job(request):
+    """Queue a capture and return its job id at once (202).
+
+    JSON body (or query): `capture` (capture-jpeg, the default,
+    capture-raw or capture-burst) with that endpoint's parameters, and
+    `priority` (high, normal or low). Fetch the result from
+    GET /api/capture-jobs/<id>, or follow .../<id>/events.
+    """
+    device, error = device_or_error(request)
+    if error is not None:
+        return error
+
+    params = {**request.query_params, **await read_json(request)}
+    kind = params.pop('capture', 'capture-jpeg')
+    priority = params.pop('priority', 'normal')
+    if kind not in CAPTURE_JOB_KINDS or priority not in CAPTURE_JOB_PRIORITIES:
+        return JSONResponse({'error': f"Use capture={'|'.join(CAPTURE_JOB_KINDS)} and "
+                                      f"priority={'|'.join(CAPTURE_JOB_PRIORITIES)}."},
+                            status_code=400)
+    if kind == 'capture-burst':
+        if burst_params(params) is None:
+            return JSONResponse({'error': BURST_USAGE}, status_code=400)
+    elif params.get('best') is not None:
+        if best_of_params(params) is None:
+            return JSONResponse({'error': f'Use best=2-{BEST_OF_MAX_FRAMES} and '
+                                          f'score=laplacian|sdk.'}, status_code=400)
+    elif params.get('trigger', capture_trigger) not in CAPTURE_TRIGGERS:
+        return JSONResponse({'error': f"Invalid trigger. Use one of "
+                                      f"{', '.join(CAPTURE_TRIGGERS)}."}, status_code=400)
+
+    job = CaptureJob(kind, device, params, priority)
+    if not capture_jobs.submit(job):
+        return JSONResponse({'error': 'Capture job queue is full'}, status_code=503,
+                            headers={'Retry-After': '1'})
+    return JSONResponse({**job.describe(), 'events_url': f'/api/capture-jobs/{job.id}/events'},
+                        status_code=202, headers={'Location': f'/api/capture-jobs/{job.id}'})
+
+
+async def list_capture_jobs(request):
+    """Every held capture job (queued, running and unexpired finished ones)."""
+    capture_jobs.expire()
+    return JSONResponse({'jobs': [job.describe() for job in capture_jobs.jobs.values()]})
+
+
+def capture_job_or_error(request):
+    """(job, None), or (None, 404 response) for unknown or expired ids."""
+    job = capture_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return None, JSONResponse({'error': 'Unknown or expired capture job'},
+                                  status_code=404)
+    return job, None
 
-    if frame is None:
-        return jsonify({'error': 'No frame available'}), 503
 
-    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
-    return Response(jpeg.tobytes(), mimetype='image/jpeg')
+async def capture_job(request):
+    """A capture job's result once done, otherwise its state.
+
+    Done: the JPEG (or raw frame) with the endpoint's usual headers,
+    fetchable until the job expires. Queued / running: 202 with the job
+    as JSON. Failed: 500, cancelled: 410, both with the job as JSON.
+    """
+    job, error = capture_job_or_error(request)
+    if error is not None:
+        return error
+    if job.state == 'done':
+        return Response(job.body, media_type=job.media_type,
+                        headers={**job.headers, 'Cache-Control': 'no-cache'})
+    status_code = {'failed': 500, 'cancelled': 410}.get(job.state, 202)
+    headers = {'Retry-After': '1'} if status_code == 202 else None
+    return JSONResponse(job.describe(), status_code=status_code, headers=headers)
+
+
+async def cancel_capture_job(request):
+    """Cancel a job that has not started running (409 once it has)."""
+    job, error = capture_job_or_error(request)
+    if error is not None:
+        return error
+    if not capture_jobs.cancel(job):
+        return JSONResponse({'error': f'Capture job is {job.state}', **job.describe()},
+                            status_code=409)
+    return JSONResponse(job.describe())
+
+
+async def stream_capture_job_events(job, with_image):
+    """Server-Sent Events: one event per job state, ending after the last."""
+    changed = job.changed()
+    while True:
+        info = job.describe()
+        if with_image and job.state == 'done' and job.media_type == 'image/jpeg':
+            info['image'] = base64.b64encode(job.body).decode('utf-8')
+        yield f'event: {job.state}\ndata: {json.dumps(info)}\n\n'
+        if job.terminal:
+            return
+        while not changed.is_set():
+            try:
+                await asyncio.wait_for(changed.wait(), CAPTURE_JOB_EVENT_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+        changed = job.changed()
+
+
+async def capture_job_events(request):
+    """Push a capture job's state changes as Server-Sent Events.
+
+    Sends the current state at once, then queued / running / done |
+    failed | cancelled as they happen; the `data` of each is the job as
+    JSON. With `?image=1` the done event of a JPEG job carries the image
+    as base64, so a browser needs no second request.
+    """
+    job, error = capture_job_or_error(request)
+    if error is not None:
+        return error
+    with_image = request.query_params.get('image') == '1'
+    return StreamingResponse(stream_capture_job_events(job, with_image),
+                             media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def preview(request):
+    """Return latest frame as a single JPEG image.
+
+    This is the streamed frame: with a binned MindVision preview
+    (PREVIEW_DECIMATION) it is about a quarter of the sensor width. Use
+    /api/capture-jpeg for a full-resolution frame.
+
+    Optional `?w=` downscales to that width and `?q=` sets the quality
+    (default 90). Encodes are cached per frame and answered with an ETag,
+    so repeat polls of an unchanged frame get a bodyless 304 and
+    concurrent pollers share one encode.
+    """
+    device = request_device(request)
+    if device is None:
+        return device_or_error(request)[1]
+    preview_cache = device.preview_cache
+    try:
+        width = int(request.query_params.get('w', 0))
+        quality = int(request.query_params.get('q', ENCODE_PROFILES['preview'].quality))
+    except ValueError:
+        return JSONResponse({'error': 'w and q must be integers'}, status_code=400)
+    if width < 0 or not 1 <= quality <= 100:
+        return JSONResponse({'error': 'w must be >= 0 and q within 1-100'}, status_code=400)
+
+    with device.frame_lock:
+        seq = device.frame_seq if device.latest_frame is not None else None
+
+    if seq is not None:
+        key = (seq, width, quality)
+        etag = preview_etag(*key)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+        data = preview_cache.get(key)
+        if data is None and key in preview_cache.inflight:
+            # Another poller is encoding this frame — share its result
+            shared = await asyncio.shield(preview_cache.inflight[key])
+            if shared is not None:
+                seq, data = shared
+                headers['ETag'] = preview_etag(seq, width, quality)
+        if data is not None:
+            headers['X-Preview-Cache'] = 'hit'
+            return Response(data, media_type='image/jpeg', headers=headers)
+        pending = preview_cache.inflight[key] = asyncio.get_running_loop().create_future()
+    else:
+        key = pending = None
+
+    result = None
+    try:
+        lease = await run_blocking(device.latest_or_next_frame)
+        if lease is None:
+            return JSONResponse({'error': 'No frame available'}, status_code=503)
+        encoded_seq, data, jpeg = await run_blocking(encode_preview, lease, width, quality)
+        ENCODE_SECONDS.labels('preview').observe(jpeg.encode_time)
+        if encoded_seq is not None:
+            result = (encoded_seq, data)
+    finally:
+        if pending is not None:
+            # Waiters for this key take the result (None: encode themselves)
+            del preview_cache.inflight[key]
+            pending.set_result(result)
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Preview-Cache': 'miss',
+        'X-Encode-Ms': f'{jpeg.encode_time * 1000:.1f}',
+        'X-Jpeg-Encoder': jpeg.encoder,
+    }
+    if encoded_seq is not None:
+        preview_cache.put((encoded_seq, width, quality), data)
+        headers['ETag'] = preview_etag(encoded_seq, width, quality)
+    return Response(data, media_type='image/jpeg', headers=headers)
+
+
+async def camera_busy(request, exc):
+    """503 when the stream thread did not hand over the camera in time."""
+    print(f"[WARN] {request.url.path}: {exc}")
+    return JSONResponse({'error': str(exc)}, status_code=503, headers={'Retry-After': '1'})
+
+
+async def camera_error(request, exc):
+    """500 naming the SDK status of a camera call that failed mid-capture."""
+    print(f"[ERROR] {request.url.path}: SDK call failed ({exc.error_code}): {exc.message}")
+    return JSONResponse({'error': f'Camera error {exc.error_code}: {exc.message}',
+                         'error_code': exc.error_code}, status_code=500)
+
+
+# Per-camera endpoints: /api/<path> serves the default (first) camera,
+# /api/cameras/<id>/<path> any camera by id or serial number.
+CAMERA_ENDPOINTS = (
+    ('/status', status, ['GET']),
+    ('/mode', set_mode, ['POST']),
+    ('/stream', video_stream, ['GET']),
+    ('/capture', capture, ['POST']),
+    ('/capture-jpeg', capture_jpeg, ['GET']),
+    ('/capture-raw', capture_raw, ['GET']),
+    ('/capture-burst', capture_burst, ['GET']),
+    ('/capture-jobs', submit_capture_job, ['POST']),
+    ('/preview', preview, ['GET']),
+)
+
+app = Starlette(
+    routes=[
+        Route('/api/ping', ping, methods=['GET']),
+        Route('/api/metrics', metrics, methods=['GET']),
+        Route('/api/timings', timings, methods=['GET']),
+        Route('/api/cameras', list_cameras, methods=['GET']),
+        Route('/api/capture-set', capture_set, methods=['GET']),
+        Route('/api/capture-jobs', list_capture_jobs, methods=['GET']),
+        Route('/api/capture-jobs/{job_id}', capture_job, methods=['GET']),
+        Route('/api/capture-jobs/{job_id}', cancel_capture_job, methods=['DELETE']),
+        Route('/api/capture-jobs/{job_id}/events', capture_job_events, methods=['GET']),
+        WebSocketRoute('/api/ws/tiles', tile_socket),
+        WebSocketRoute('/api/cameras/{camera_id}/ws/tiles', tile_socket),
+    ] + [
+        Route(prefix + path, endpoint, methods=methods)
+        for prefix in ('/api', '/api/cameras/{camera_id}')
+        for path, endpoint, methods in CAMERA_ENDPOINTS
+    ],
+    middleware=[
+        # Allow all origins; expose custom headers for browser JS
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'],
+                   allow_headers=['*'], expose_headers=[
+                       'X-Image-Width', 'X-Image-Height', 'X-Capture-Timestamp',
+                       'X-Camera-Mode', 'X-Camera-Id', 'X-Trigger-Latency-Ms', 'X-Encode-Ms',
+                       'X-Burst-Frames', 'X-Burst-Reduce', 'X-Burst-Span-Ms',
+                       'X-Sharpness-Score', 'X-Sharpness-Scores', 'X-Sharpness-Frame',
+                       'X-Sharpness-Scorer', 'X-Capture-Job', 'Location',
+                       'X-Jpeg-Encoder', 'ETag', 'X-Preview-Cache', 'Server-Timing',
+                   ]),
+    ],
+    exception_handlers={CameraBusy: camera_busy,
+                        **({CameraException: camera_error} if MINDVISION_AVAILABLE else {})},
+)
 
 
 # ============================================================================
@@ -571,17 +4151,66 @@ def preview():
 
 def cleanup():
     """Clean up camera resources."""
-    stop_streaming()
-    if camera:
-        camera.close()
+    for device in devices.values():
+        device.stop_streaming()
+    sdk_executor.shutdown(wait=False)
+    tile_executor.shutdown(wait=False)
+    for device in devices.values():
+        device.camera.close()
     print("[INFO] Camera closed. Server shutting down.")
 
 
 if __name__ == '__main__':
     import atexit
+    import argparse
 
     PORT = 5555
 
+    parser = argparse.ArgumentParser(description='MagicQC Camera Server')
+    parser.add_argument('--camera', choices=CAMERA_BACKENDS,
+                        default=os.environ.get('CAMERA_BACKEND', 'auto'),
+                        help='Camera backend: MindVision with webcam fallback, '
+                             'one of those only, or generated frames '
+                             '(default: $CAMERA_BACKEND or auto)')
+    parser.add_argument('--synthetic-fps', type=float,
+                        default=float(os.environ.get('CAMERA_SYNTHETIC_FPS', SYNTHETIC_FPS)),
+                        help='Frame rate of the synthetic camera '
+                             f'(default: $CAMERA_SYNTHETIC_FPS or {SYNTHETIC_FPS})')
+    parser.add_argument('--synthetic-jitter-ms', type=float,
+                        default=float(os.environ.get('CAMERA_SYNTHETIC_JITTER_MS', '0')),
+                        help='Standard deviation of the synthetic frame period '
+                             '(default: $CAMERA_SYNTHETIC_JITTER_MS or 0)')
+    parser.add_argument('--acquisition', choices=ACQUISITION_MODES,
+                        default=os.environ.get('CAMERA_ACQUISITION', 'poll'),
+                        help='Frame acquisition: poll the camera from a stream '
+                             'thread, or let the MindVision SDK push frames '
+                             '(default: $CAMERA_ACQUISITION or poll)')
+    parser.add_argument('--capture-trigger', choices=CAPTURE_TRIGGERS,
+                        default=os.environ.get('CAMERA_CAPTURE_TRIGGER', 'continuous'),
+                        help='Default exposure for /api/capture-jpeg: a fresh '
+                             'frame from the free-running sensor, or one '
+                             'software-triggered frame (default: '
+                             '$CAMERA_CAPTURE_TRIGGER or continuous)')
+    parser.add_argument('--jpeg-encoder', choices=JPEG_ENCODERS,
+                        default=os.environ.get('CAMERA_JPEG_ENCODER', 'auto'),
+                        help='JPEG backend: libjpeg-turbo when available, '
+                             'otherwise OpenCV (default: $CAMERA_JPEG_ENCODER '
+                             'or auto)')
+    parser.add_argument('--jpeg-workers', type=int,
+                        default=int(os.environ.get('CAMERA_JPEG_WORKERS', '1')),
+                        help='Encode full-resolution captures/previews as '
+                             'parallel strips on this many cores; 1 disables '
+                             f'(max {JPEG_STRIPE_WORKERS_MAX}, default: '
+                             '$CAMERA_JPEG_WORKERS or 1)')
+    args = parser.parse_args()
+    camera_backend = args.camera
+    synthetic_fps = args.synthetic_fps
+    synthetic_jitter = args.synthetic_jitter_ms / 1000.0
+    acquisition_mode = args.acquisition
+    capture_trigger = args.capture_trigger
+    jpeg_encoder = create_encoder(args.jpeg_encoder)
+    striped_encoder = create_striped_encoder(args.jpeg_workers)
+
     # When auto-started by PHP (no console), stdout/stderr may be invalid
     # handles. Detect this and redirect to a log file to prevent crashes.
     _log_path = os.path.join(_project_root, 'storage', 'logs', 'camera_server.log')
@@ -606,10 +4235,15 @@ if __name__ == '__main__':
     write_pid()
     atexit.register(remove_pid)
 
-    if init_camera():
-        print(f"[OK] Camera ready: {camera.camera_type}")
-        # Auto-start streaming so frames are always warm for instant capture
-        start_streaming()
+    print(f"[INFO] JPEG encoder: {jpeg_encoder.name}"
+          + (f" (striped x{striped_encoder.workers} for captures)"
+             if striped_encoder else ""))
+    if init_cameras():
+        for device in devices.values():
+            serial = f", SN {device.serial}" if device.serial else ""
+            print(f"[OK] Camera {device.id} ready: {device.camera.camera_type}{serial}")
+            # Auto-start streaming so frames are always warm for instant capture
+            device.start_streaming()
     else:
         print("[WARN] No camera found. Server will report 'no_camera'.")
 
@@ -619,4 +4253,6 @@ if __name__ == '__main__':
     print(f"[SERVER] MJPEG stream: http://localhost:{PORT}/api/stream")
     print(f"[SERVER] Press Ctrl+C to stop\n")
 
-    app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
+    # Open MJPEG streams never end on their own; cap how long shutdown
+    # waits for them before cancelling.
+    uvicorn.run(app, host='0.0.0.0', port=PORT, timeout_graceful_shutdown=2)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Run mvsdk on the simulated SDK (mvsdk_sim.py) at a small sensor size;
+# both are read when camera_server first imports mvsdk.
+os.environ.setdefault('MVSDK_SIMULATE', '1')
+os.environ.setdefault('MVSDK_SIM_SIZE', '1024x512')
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
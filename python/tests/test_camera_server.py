@@ -0,0 +1,1114 @@
+"""Tests for camera_server.
+
+Run from the project root:
+    python -m pytest python/tests
+"""
+
+import asyncio
+import functools
+import itertools
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import camera_server as cs
+import garment_scene
+import mvsdk_sim
+
+
+# ----------------------------------------------------------------------------
+# Camera access hand-off
+# ----------------------------------------------------------------------------
+
+def test_camera_access_parks_stream_thread():
+    access = cs.CameraAccess()
+    access.stream_started()
+    grabs, stop = [0], threading.Event()
+
+    def stream():
+        while not stop.is_set():
+            access.checkpoint()
+            grabs[0] += 1
+            time.sleep(0.001)
+        access.stream_stopped()
+
+    thread = threading.Thread(target=stream)
+    thread.start()
+    try:
+        time.sleep(0.02)
+        with access.exclusive(timeout=1.0):
+            parked_at = grabs[0]
+            time.sleep(0.05)
+            assert grabs[0] == parked_at
+        time.sleep(0.05)
+        assert grabs[0] > parked_at
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_camera_access_without_stream_is_immediate():
+    access = cs.CameraAccess()
+    t0 = time.monotonic()
+    with access.exclusive(timeout=1.0):
+        assert time.monotonic() - t0 < 0.1
+
+
+def test_camera_access_times_out_when_stream_never_parks():
+    access = cs.CameraAccess()
+    access.stream_started()                  # Stream thread stuck in a grab
+    with pytest.raises(cs.CameraBusy):
+        with access.exclusive(timeout=0.05):
+            pytest.fail('entered without the stream parking')
+    assert access._requests == 0
+    access.checkpoint()                      # Stream does not park for a gone capture
+
+
+def test_capture_answers_503_when_stream_never_parks(client, monkeypatch):
+    access = cs.devices['0'].access
+    monkeypatch.setattr(access, 'exclusive', functools.partial(access.exclusive, timeout=0.05))
+    access.stream_started()
+    response = client.get('/api/capture-jpeg')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    access.stream_stopped()
+
+
+# ----------------------------------------------------------------------------
+# libjpeg-turbo encoding
+# ----------------------------------------------------------------------------
+
+@pytest.fixture
+def turbo():
+    if not cs.TURBOJPEG_AVAILABLE:
+        pytest.skip('PyTurboJPEG not installed')
+    try:
+        return cs.TurboJpegEncoder()
+    except RuntimeError as e:           # Module present, libturbojpeg missing
+        pytest.skip(str(e))
+
+
+def test_jpeg_buffer_pool_reuses_up_to_its_cap():
+    pool = cs.JpegBufferPool(per_size=1)
+    first, second = pool.acquire(64), pool.acquire(64)
+    assert first is not second and len(first) == 64
+    pool.give_back(first)
+    pool.give_back(second)                         # Over the cap: dropped
+    assert pool.acquire(64) is first
+    assert pool.acquire(64) is not second
+    assert len(pool.acquire(128)) == 128
+
+
+@pytest.mark.parametrize('color', [False, True])
+def test_turbojpeg_encode_decodes_and_returns_buffer(turbo, color):
+    frame = scene_frame(320, 200)
+    profile = cs.ENCODE_PROFILES['capture']
+    if color:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        profile = cs.ENCODE_PROFILES['preview']
+    jpeg = turbo.encode(frame, profile)
+    assert jpeg.encoder == 'turbojpeg'
+    buf = jpeg.data.obj
+    decoded = cv2.imdecode(np.frombuffer(jpeg.data, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert decoded.shape == frame.shape
+    assert np.abs(decoded.astype(int) - frame).mean() < 4
+
+    assert buf not in turbo._buffers._free.get(len(buf), [])
+    jpeg.release()
+    jpeg.release()                                 # Idempotent
+    assert turbo._buffers._free[len(buf)] == [buf]
+    again = turbo.encode(frame, profile)
+    assert again.data.obj is buf                   # Reused, not reallocated
+    again.release()
+
+
+# ----------------------------------------------------------------------------
+# Striped JPEG encoding
+# ----------------------------------------------------------------------------
+
+def scene_frame(width, height, seed=0):
+    """Gradient with edges and noise: compresses like a real frame."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = 96 + 64 * np.sin(x / 37.0) * np.cos(y / 23.0) + 40 * ((x // 64 + y // 64) % 2)
+    return np.clip(frame + rng.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('color', [False, True])
+@pytest.mark.parametrize('workers', [2, 3, 8])
+def test_striped_jpeg_matches_single_pass_encode(color, workers):
+    frame = scene_frame(1000, 601)          # Height not a whole MCU row
+    profile = cs.ENCODE_PROFILES['capture']
+    if color:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        profile = cs.ENCODE_PROFILES['preview']    # 4:2:0, 16x16 MCUs
+    encoder = cs.StripedJpegEncoder(workers)
+    striped = np.frombuffer(encoder.encode(frame, profile).data, np.uint8)
+
+    # One cv2 pass with the same restart interval is what stitching rebuilds
+    mcu_w, _ = encoder.mcu_size(frame, profile)
+    params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality,
+              cv2.IMWRITE_JPEG_RST_INTERVAL, -(-frame.shape[1] // mcu_w)]
+    if color:
+        params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR,
+                   cs.OpenCVEncoder._SAMPLING[profile.subsampling]]
+    ok, single = cv2.imencode('.jpg', frame, params)
+    assert ok
+    assert striped.tobytes() == single.tobytes()
+
+    decoded = cv2.imdecode(striped, cv2.IMREAD_UNCHANGED)
+    assert decoded.shape == frame.shape
+    assert np.array_equal(decoded, cv2.imdecode(single, cv2.IMREAD_UNCHANGED))
+
+
+def test_stitched_restart_markers_cycle():
+    frame = scene_frame(256, 200)
+    jpeg = np.frombuffer(cs.StripedJpegEncoder(4).encode(
+        frame, cs.ENCODE_PROFILES['capture']).data, np.uint8)
+    _, start = cs._jpeg_scan_start(jpeg)
+    data = jpeg[start:-2]
+    marks = np.flatnonzero((data[:-1] == 0xFF) & ((data[1:] & 0xF8) == 0xD0))
+    assert len(marks) == -(-200 // 8) - 1         # One per MCU row junction
+    assert list(data[marks + 1] - 0xD0) == [i % 8 for i in range(len(marks))]
+
+
+# ----------------------------------------------------------------------------
+# Preview ETags
+# ----------------------------------------------------------------------------
+
+def test_etag_matches():
+    etag = cs.preview_etag(7, 640, 80)
+    assert cs.etag_matches(etag, etag)
+    assert cs.etag_matches(f'W/{etag}', etag)
+    assert cs.etag_matches(f'"other", {etag}', etag)
+    assert cs.etag_matches('*', etag)
+    assert not cs.etag_matches(cs.preview_etag(8, 640, 80), etag)
+    assert not cs.etag_matches('', etag)
+    assert not cs.etag_matches(None, etag)
+
+
+def publish_next(device):
+    device.publish_frame(device.camera.grab())
+
+
+def test_preview_revalidates_with_etag(client):
+    device = cs.devices['0']
+    publish_next(device)
+    first = client.get('/api/preview')
+    assert first.status_code == 200 and first.headers['X-Preview-Cache'] == 'miss'
+    etag = first.headers['ETag']
+
+    repeat = client.get('/api/preview', headers={'If-None-Match': etag})
+    assert repeat.status_code == 304 and repeat.content == b''
+    cached = client.get('/api/preview')
+    assert cached.headers['X-Preview-Cache'] == 'hit' and cached.content == first.content
+
+    publish_next(device)
+    fresh = client.get('/api/preview', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
+    assert fresh.headers['X-Preview-Cache'] == 'miss'
+
+
+def test_preview_cache_evicts_least_recently_used(client):
+    device = cs.devices['0']
+    publish_next(device)
+    widths = (64, 96, 128)
+    sizes = {w: len(client.get('/api/preview', params={'w': w}).content) for w in widths}
+
+    cache = device.preview_cache = cs.PreviewCache(budget=sum(sizes.values()) - 1)
+    for w in (64, 96, 64, 128):                        # 64 used again after 96
+        client.get('/api/preview', params={'w': w})
+    quality = cs.ENCODE_PROFILES['preview'].quality
+    assert [key[1:] for key in cache._entries] == [(64, quality), (128, quality)]
+    assert cache.size == sizes[64] + sizes[128] <= cache.budget
+    assert client.get('/api/preview', params={'w': 96}).headers['X-Preview-Cache'] == 'miss'
+
+
+# ----------------------------------------------------------------------------
+# MJPEG streaming
+# ----------------------------------------------------------------------------
+
+def test_stream_broadcaster_goes_with_last_subscriber():
+    device = cs.CameraDevice('0', cs.SyntheticCamera(width=320, height=160))
+    loop = asyncio.new_event_loop()
+    try:
+        first, sub = device.subscribe_stream(300, 55, loop)
+        shared, other = device.subscribe_stream(300, 55, loop)
+        assert shared is first
+        device.unsubscribe_stream(first, sub)
+        assert list(device.broadcasters) == [(300, 55)]
+        device.unsubscribe_stream(first, other)
+        assert device.broadcasters == {}
+    finally:
+        loop.close()
+
+
+def drive(client, write_time, seconds, cycle_time=0.1):
+    """Feed `seconds` worth of parts; returns the profiles adapted to."""
+    changes = []
+    for _ in range(round(seconds / cycle_time)):
+        if client.record(write_time, cycle_time):
+            changes.append(client.profile + (client.fps,))
+    return changes
+
+
+def test_stream_client_steps_down_width_then_quality_then_fps():
+    client = cs.StreamClient(1364, 70, 60)
+    assert drive(client, 0.09, cs.STREAM_ADAPT_HOLD - 0.1) == []     # Held at first
+    assert drive(client, 0.09, 0.3) == [(1024, 70, 60)]
+    changes = drive(client, 0.09, 60.0)
+    assert [c[0] for c in changes[:4]] == [800, 640, 480, 320]
+    assert [c[1] for c in changes[4:8]] == [60, 50, 40, 30]
+    assert [c[2] for c in changes[8:]] == [30, 15, 7, 3, 2]
+    assert client.profile == (320, 30) and client.fps == cs.STREAM_MIN_FPS
+
+
+def test_stream_client_steps_back_up_after_sustained_headroom():
+    client = cs.StreamClient(640, 50, 60)
+    drive(client, 0.09, 60.0)
+    assert client.profile == (320, 30) and client.fps == 2
+
+    # Headroom must last STREAM_UPGRADE_AFTER (plus the hold) per step
+    assert drive(client, 0.001, cs.STREAM_UPGRADE_AFTER) == []
+    changes = drive(client, 0.001, 120.0)
+    assert changes[:5] == [(320, 30, 4), (320, 30, 8), (320, 30, 16),
+                           (320, 30, 32), (320, 30, 60)]
+    assert changes[5:] == [(320, 40, 60), (320, 50, 60), (480, 50, 60), (640, 50, 60)]
+
+
+def test_stream_client_holds_between_thresholds():
+    client = cs.StreamClient(640, 50, 30)
+    assert drive(client, 0.05, 30.0) == []
+    # A busy spell resets the headroom timer
+    drive(client, 0.09, 1.0)
+    assert client.profile == (480, 50)
+    assert drive(client, 0.001, cs.STREAM_ADAPT_HOLD + cs.STREAM_UPGRADE_AFTER - 0.5) == []
+
+
+def test_stream_survives_a_failed_encode(monkeypatch):
+    device = cs.CameraDevice('0', cs.SyntheticCamera(fps=100, width=320, height=160))
+    device.camera.open()
+    encode, calls = cs.jpeg_encoder.encode, itertools.count()
+
+    def flaky_encode(frame, profile):
+        if next(calls) == 0:
+            raise cv2.error('corrupt frame')
+        return encode(frame, profile)
+
+    monkeypatch.setattr(cs.jpeg_encoder, 'encode', flaky_encode)
+    device.start_streaming()
+    loop = asyncio.new_event_loop()
+    try:
+        bc, sub = device.subscribe_stream(300, 55, loop)
+        part = loop.run_until_complete(asyncio.wait_for(sub.get(), 2.0))
+        assert part.startswith(b'--frame') and next(calls) > 1
+        assert bc._thread is not None and bc._thread.is_alive()
+        device.unsubscribe_stream(bc, sub)
+    finally:
+        device.close()
+        loop.close()
+
+
+# ----------------------------------------------------------------------------
+# Tile deltas
+# ----------------------------------------------------------------------------
+
+def tile_planes(seed=0):
+    """(reference, noisy copy) at 1/TILE_DECIMATION of a 1024x512 frame."""
+    rng = np.random.default_rng(seed)
+    d = cs.TILE_DECIMATION
+    reference = rng.integers(100, 110, (512 // d, 1024 // d), dtype=np.uint8)
+    noise = rng.integers(-1, 2, reference.shape)
+    return reference, np.clip(reference + noise, 0, 255).astype(np.uint8)
+
+
+def test_changed_runs_on_known_diff():
+    session = cs.TileSession()
+    reference, small = tile_planes()
+    step = session.tile // cs.TILE_DECIMATION
+    small[1 * step:2 * step, 2 * step:4 * step] += 60    # Tiles (1, 2) and (1, 3)
+    small[5 * step:6 * step, 15 * step:16 * step] += 60  # Tile (5, 15)
+    runs = session._changed_runs(small, reference, 0, 0, 1024, 512)
+    assert runs == [(1, 2, 4), (5, 15, 16)]
+
+
+def test_changed_runs_inside_roi():
+    session = cs.TileSession()
+    reference, small = tile_planes()
+    step = session.tile // cs.TILE_DECIMATION
+    small[2 * step:3 * step, 8 * step:9 * step] += 60    # Tile (2, 8)
+    small[0:step, 0:step] += 60                          # Outside the ROI
+    runs = session._changed_runs(small, reference, 384, 64, 768, 320)
+    assert runs == [(2, 8, 9)]
+
+
+def test_changed_runs_static_and_global_change():
+    session = cs.TileSession()
+    reference, small = tile_planes()
+    assert session._changed_runs(small, reference, 0, 0, 1024, 512) == []
+    brighter = small + np.uint8(40)                      # Exposure jump
+    assert session._changed_runs(brighter, reference, 0, 0, 1024, 512) is None
+
+
+# ----------------------------------------------------------------------------
+# Synthetic camera
+# ----------------------------------------------------------------------------
+
+def test_synthetic_camera_frames_and_gain():
+    camera = cs.SyntheticCamera(fps=100, width=320, height=160)
+    assert camera.open()
+    try:
+        first, second = camera.grab(), camera.grab()
+        assert first.image.shape == (160, 320) and first.image.dtype == np.uint8
+        assert not np.array_equal(first.image, second.image)  # Noise variants cycle
+        base = float(first.image.mean())
+        camera.set_mode('white')
+        assert float(camera.grab().image.mean()) < base
+    finally:
+        camera.close()
+
+
+# ----------------------------------------------------------------------------
+# Burst reduction
+# ----------------------------------------------------------------------------
+
+@pytest.mark.parametrize('n', range(2, 11))
+def test_sorting_network_sorts_every_binary_input(n):
+    # 0-1 principle: a comparator network sorting all 0/1 inputs sorts anything
+    data = np.array(list(itertools.product((0, 1), repeat=n)), np.uint8).T.copy()
+    for i, j in cs.sorting_network(n):
+        low = np.minimum(data[i], data[j])
+        data[j] = np.maximum(data[i], data[j])
+        data[i] = low
+    assert np.array_equal(data, np.sort(data, axis=0))
+
+
+@pytest.mark.parametrize('n', [2, 3, 4, 7, 8, 16, 32])
+@pytest.mark.parametrize('shape', [(37, 53), (20, 30, 3)])
+def test_burst_reductions_match_numpy(n, shape):
+    rng = np.random.default_rng(n)
+    stack = rng.integers(0, 256, (n,) + shape, dtype=np.uint8)
+    chunk_rows = 8                                 # Several chunks, ragged last one
+
+    total = np.zeros(shape, np.uint16)
+    for frame in stack:
+        total += frame
+    mean = cs.mean_of_sum(total, n, np.empty(shape, np.uint8))
+    assert np.array_equal(mean, (stack.sum(axis=0, dtype=np.int64) + n // 2) // n)
+
+    median = cs.median_frames(stack.copy(), np.empty(shape, np.uint8), chunk_rows)
+    ordered = np.sort(stack, axis=0).astype(np.int64)
+    if n % 2:
+        expected = ordered[n // 2]
+    else:
+        expected = (ordered[n // 2 - 1] + ordered[n // 2] + 1) >> 1
+    assert np.array_equal(median, expected)
+
+
+def test_mean_accumulator_exact_at_burst_cap():
+    total = np.full((4, 4), 255 * cs.BURST_MAX_FRAMES, np.uint16)
+    out = cs.mean_of_sum(total, cs.BURST_MAX_FRAMES, np.empty((4, 4), np.uint8))
+    assert (out == 255).all()
+
+
+@pytest.mark.parametrize('method', cs.BURST_REDUCERS)
+def test_burst_on_simulator(device, method):
+    record, span = device.take_burst('other', 4, method)
+    assert record.image.shape == (SIM_HEIGHT, SIM_WIDTH)
+    assert span >= 0
+    assert device._burst_buffer.size == cs.BURST_MAX_MEDIAN_FRAMES * SIM_WIDTH * SIM_HEIGHT
+
+
+def test_bursts_reuse_the_device_buffer(device):
+    device.take_burst('other', 3, 'median')
+    buffer = device._burst_buffer
+    for method, n in (('mean', cs.BURST_MAX_FRAMES), ('median', cs.BURST_MAX_MEDIAN_FRAMES)):
+        frames = device.burst_frames((SIM_HEIGHT, SIM_WIDTH), n, method)
+        assert np.shares_memory(frames, buffer)
+    assert not device.burst_frames((SIM_HEIGHT, SIM_WIDTH), 2, 'mean').any()
+    device.take_burst('other', 4, 'mean')
+    assert device._burst_buffer is buffer
+
+
+def test_median_burst_has_a_lower_cap():
+    assert cs.burst_params({'n': str(cs.BURST_MAX_FRAMES)}) is not None
+    assert cs.burst_params({'n': str(cs.BURST_MAX_MEDIAN_FRAMES), 'reduce': 'median'})
+    assert cs.burst_params({'n': str(cs.BURST_MAX_MEDIAN_FRAMES + 1),
+                            'reduce': 'median'}) is None
+
+
+# ----------------------------------------------------------------------------
+# Capture jobs
+# ----------------------------------------------------------------------------
+
+def finished_job(size, age=0.0):
+    job = cs.CaptureJob('capture-jpeg', None, {}, 'normal')
+    job.body = b'x' * size
+    job.set_state('done')
+    job.finished -= age
+    return job
+
+
+def test_capture_job_expiry_ttl_and_budget():
+    queue = cs.CaptureJobQueue(ttl=10.0, budget=250)
+    stale = finished_job(10, age=20.0)
+    oldest, middle, newest = finished_job(100), finished_job(100), finished_job(100)
+    waiting = cs.CaptureJob('capture-jpeg', None, {}, 'normal')
+    for job in (stale, oldest, middle, newest, waiting):
+        queue.jobs[job.id] = job
+
+    queue.expire()
+    # Past TTL goes; then the oldest until the results fit the budget
+    assert list(queue.jobs) == [middle.id, newest.id, waiting.id]
+    assert queue.counts() == {'done': 2, 'queued': 1}
+
+
+def test_cancelled_job_frees_queue_capacity():
+    async def run():
+        queue = cs.CaptureJobQueue(workers=0, size=2)   # Nothing drains the heap
+        first, second, third = (cs.CaptureJob('capture-jpeg', None, {}, 'normal')
+                                for _ in range(3))
+        assert queue.submit(first) and queue.submit(second)
+        assert not queue.submit(third)
+        assert queue.cancel(first)
+        assert queue.submit(third)
+        assert [entry[2] for entry in sorted(queue._heap)] == [second, third]
+    asyncio.run(run())
+
+
+def test_capture_jobs_run_on_each_event_loop(monkeypatch):
+    async def fake_capture(job):
+        job.body = b'jpeg'
+
+    monkeypatch.setattr(cs, 'run_capture_job', fake_capture)
+    queue = cs.CaptureJobQueue(workers=1)
+
+    async def run():
+        job = cs.CaptureJob('capture-jpeg', None, {}, 'normal')
+        assert queue.submit(job)
+        while not job.terminal:
+            await asyncio.wait_for(job.changed().wait(), 1.0)
+        return job.state
+
+    assert asyncio.run(run()) == 'done'
+    assert asyncio.run(run()) == 'done'                # A fresh loop gets its own workers
+
+
+# ----------------------------------------------------------------------------
+# MindVision camera on the simulated SDK
+# ----------------------------------------------------------------------------
+
+SIM_WIDTH, SIM_HEIGHT = 1024, 512
+
+
+@pytest.fixture
+def sim():
+    if not cs.MINDVISION_AVAILABLE:
+        pytest.skip('mvsdk did not load')
+    return mvsdk_sim.install(devices=1, width=SIM_WIDTH, height=SIM_HEIGHT,
+                             fps=60, jitter=0.0)
+
+
+@pytest.fixture
+def device(sim):
+    camera = cs.MindVisionCamera(cs.MindVisionCamera.enumerate()[0])
+    assert camera.open()
+    device = cs.CameraDevice('0', camera)
+    camera.set_mode(device.mode)
+    yield device
+    device.close()
+
+
+@pytest.fixture
+def sim_pair():
+    """Two CameraDevices on a two-camera simulated SDK."""
+    if not cs.MINDVISION_AVAILABLE:
+        pytest.skip('mvsdk did not load')
+    sim = mvsdk_sim.install(devices=2, width=SIM_WIDTH, height=SIM_HEIGHT,
+                            fps=60, jitter=0.0)
+    pair = []
+    for index, info in enumerate(cs.MindVisionCamera.enumerate()):
+        camera = cs.MindVisionCamera(info)
+        assert camera.open()
+        device = cs.CameraDevice(str(index), camera)
+        camera.set_mode(device.mode)
+        pair.append(device)
+    yield sim, pair
+    for device in pair:
+        device.close()
+
+
+@pytest.fixture
+def sim_client(sim_pair, monkeypatch):
+    pytest.importorskip('httpx')
+    from starlette.testclient import TestClient
+    _, pair = sim_pair
+    monkeypatch.setattr(cs, 'devices', {d.id: d for d in pair})
+    with TestClient(cs.app) as client:
+        yield client
+
+
+def leased_slots(device):
+    """FramePool references still held on a device's camera."""
+    return sum(slot.refs for slot in device.camera.pool._slots)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    pytest.importorskip('httpx')
+    from starlette.testclient import TestClient
+    camera = cs.SyntheticCamera(fps=100, width=320, height=160)
+    camera.open()
+    device = cs.CameraDevice('0', camera)
+    monkeypatch.setattr(cs, 'devices', {'0': device})
+    with TestClient(cs.app) as client:
+        yield client
+    device.close()
+
+
+def test_mindvision_streams_binned_and_snaps_full(device):
+    camera = device.camera
+    assert camera.hardware_preview
+    lease = camera.grab()
+    try:
+        assert lease.image.shape == (SIM_HEIGHT // 4, SIM_WIDTH // 4)
+    finally:
+        lease.release()
+    lease, latency = device.take_capture('other', 'soft')
+    try:
+        assert lease.image.shape == (SIM_HEIGHT, SIM_WIDTH)
+        assert lease.head.bIsTrigger and latency is not None
+    finally:
+        lease.release()
+
+
+def test_preview_never_picks_a_crop_preset():
+    if not cs.MINDVISION_AVAILABLE:
+        pytest.skip('mvsdk did not load')
+    mvsdk_sim.install(devices=1, width=SIM_WIDTH, height=SIM_HEIGHT,
+                      fps=60, jitter=0.0, crop_presets=True)
+    camera = cs.MindVisionCamera(cs.MindVisionCamera.enumerate()[0])
+    assert camera.open()
+    try:
+        offered = [camera.cap.pImageSizeDesc[i].GetDescription()
+                   for i in range(camera.cap.iImageSizeDesc)]
+        assert 'ROI 1/4 CENTER' in offered
+        preview = camera.preview_res
+        assert preview.GetDescription() == 'BIN 4X4'
+        assert (preview.iWidthFOV, preview.iHeightFOV) == (SIM_WIDTH, SIM_HEIGHT)
+    finally:
+        camera.close()
+
+
+def test_snap_with_frame_callback_registered(device):
+    camera = device.camera
+    assert camera.start_callback(device.publish_frame)
+    try:
+        lease = device.grab_fresh_frame()
+        assert lease.image.shape == (SIM_HEIGHT, SIM_WIDTH)
+        lease.release()
+        with device.frame_lock:
+            seq = device.frame_seq
+        streamed = device.wait_for_frame(seq + 1, 1.0)    # Callback is back
+        assert streamed.image.shape == (SIM_HEIGHT // 4, SIM_WIDTH // 4)
+        streamed.release()
+    finally:
+        camera.stop_callback()
+
+
+def test_rejected_callback_falls_back_to_polling(sim, device, monkeypatch):
+    monkeypatch.setattr(cs, 'acquisition_mode', 'callback')
+    sim.fail_next('CameraSetCallbackFunction', mvsdk_sim.CAMERA_STATUS_NOT_SUPPORTED)
+    assert not device.camera.start_callback(device.publish_frame)
+    assert not device.callback_active
+
+    sim.fail_next('CameraSetCallbackFunction', mvsdk_sim.CAMERA_STATUS_NOT_SUPPORTED)
+    device.start_streaming()
+    try:
+        assert device.stream_thread is not None and device.stream_thread.is_alive()
+        streamed = device.wait_for_frame(0, 1.0)
+        assert streamed is not None
+        streamed.release()
+    finally:
+        device.stop_streaming()
+
+
+def test_failed_image_process_is_not_a_frame(sim, device):
+    camera = device.camera
+    errors = cs.GRAB_ERRORS.labels('sdk')
+    before = errors.totals()[0]
+    sim.fail_next('CameraImageProcess', mvsdk_sim.CAMERA_STATUS_FAILED)
+    assert camera.grab() is None
+    assert errors.totals()[0] == before + 1
+    assert sum(slot.refs for slot in camera.pool._slots) == 0
+
+    frames = []
+    assert camera.start_callback(frames.append)
+    try:
+        sim.fail_next('CameraImageProcess', mvsdk_sim.CAMERA_STATUS_FAILED)
+        deadline = time.monotonic() + 1.0
+        while errors.totals()[0] < before + 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        camera.stop_callback()
+    assert errors.totals()[0] == before + 2
+    for lease in frames:
+        lease.release()
+    assert sum(slot.refs for slot in camera.pool._slots) == 0
+
+
+@pytest.mark.parametrize('function', ['CameraSetResolutionForSnap',
+                                      'CameraSetImageResolution'])
+def test_failed_resolution_setup_fails_open(sim, function):
+    camera = cs.MindVisionCamera(cs.MindVisionCamera.enumerate()[0])
+    sim.fail_next(function, mvsdk_sim.CAMERA_STATUS_NOT_SUPPORTED)
+    assert not camera.open()
+    assert camera.hCamera == 0 and not camera.hardware_preview
+    assert camera.open()                      # The handle was released
+    camera.close()
+
+
+def test_failed_soft_trigger_raises_and_leaves_trigger_mode(sim, device):
+    sim.fail_next('CameraSoftTrigger', mvsdk_sim.CAMERA_STATUS_FAILED)
+    with pytest.raises(cs.CameraException) as raised:
+        device.take_capture('other', 'soft')
+    assert raised.value.error_code == mvsdk_sim.CAMERA_STATUS_FAILED
+    assert sim.device(device.camera.hCamera).trigger_mode == 0
+
+    sim.fail_next('CameraSetTriggerMode', mvsdk_sim.CAMERA_STATUS_NOT_SUPPORTED)
+    with pytest.raises(cs.CameraException):
+        device.take_capture('other', 'soft')
+
+    lease, _ = device.take_capture('other', 'soft')   # Recovered
+    assert lease is not None
+    lease.release()
+
+
+def test_failed_buffer_clear_aborts_triggered_capture(sim, device):
+    sim.fail_next('CameraClearBuffer', mvsdk_sim.CAMERA_STATUS_FAILED)
+    with pytest.raises(cs.CameraException) as raised:
+        device.take_capture('other', 'soft')
+    assert raised.value.error_code == mvsdk_sim.CAMERA_STATUS_FAILED
+    assert sim.device(device.camera.hCamera).trigger_mode == 0
+    assert sum(slot.refs for slot in device.camera.pool._slots) == 0
+
+
+def test_capture_rejects_unknown_trigger(client):
+    response = client.get('/api/capture-jpeg', params={'trigger': 'bogus'})
+    assert response.status_code == 400
+    response = client.get('/api/capture-raw', params={'trigger': 'bogus'})
+    assert response.status_code == 400
+    response = client.post('/api/capture-jobs', json={'trigger': 'bogus'})
+    assert response.status_code == 400
+
+
+# ----------------------------------------------------------------------------
+# Raw captures
+# ----------------------------------------------------------------------------
+
+def drain(body):
+    """Consume an async response body; returns the bytes it yielded."""
+    async def read():
+        return b''.join([bytes(part) async for part in body])
+    return asyncio.run(read())
+
+
+def test_raw_downloads_do_not_pin_pool_slots(device):
+    camera = device.camera
+    first, zero_copy = cs.detach_for_download(camera.grab())
+    assert zero_copy and first.pooled
+    second, zero_copy = cs.detach_for_download(camera.grab())
+    assert not zero_copy and not second.pooled
+    # One slot held by the first download; the rest are free for acquisition
+    assert sum(slot.refs for slot in camera.pool._slots) == 1
+
+    header = cs.raw_frame_header(first.image, first.head)
+    pixels = first.image.reshape(-1).data
+    assert len(drain(cs.stream_raw_frame(first, header, pixels, True))) == \
+        len(header) + len(pixels)
+    assert sum(slot.refs for slot in camera.pool._slots) == 0
+    third, zero_copy = cs.detach_for_download(camera.grab())
+    assert zero_copy
+    drain(cs.stream_raw_frame(third, b'', b'', zero_copy))
+    second.release()
+
+
+def test_capture_raw_returns_header_and_pixels(client):
+    response = client.get('/api/capture-raw')
+    assert response.status_code == 200
+    fields = cs.RAW_HEADER.unpack_from(response.content)
+    magic, _, header_size, width, height, stride = fields[:6]
+    assert (magic, width, height) == (cs.RAW_MAGIC, 320, 160)
+    assert len(response.content) == header_size + stride * height
+
+
+# ----------------------------------------------------------------------------
+# Frame statistics
+# ----------------------------------------------------------------------------
+
+def test_failed_frame_statistics_are_unavailable(sim, device):
+    assert device.camera.frame_statistics() is not None
+    sim.fail_next('CameraGetFrameStatistic', mvsdk_sim.CAMERA_STATUS_FAILED)
+    assert device.camera.frame_statistics() is None
+
+
+# ----------------------------------------------------------------------------
+# Simulated SDK frames
+# ----------------------------------------------------------------------------
+
+def test_simulator_renders_synthetic_scene():
+    sim = mvsdk_sim.SimulatedSDK(width=320, height=160)
+    frame = sim._devices[0]._variants(320, 160)[0]
+    expected = garment_scene.synthetic_frame(320, 160, 0,
+                                             garment_scene.synthetic_scene(320, 160))
+    assert np.array_equal(frame, expected)
+    assert cs.synthetic_frame is garment_scene.synthetic_frame
+
+
+# ----------------------------------------------------------------------------
+# Sensor timestamps
+# ----------------------------------------------------------------------------
+
+def test_failed_timestamp_falls_back_to_host_time(sim, device):
+    camera = device.camera
+    lease = camera.grab()
+    assert lease.sensor_time is not None
+    assert device.frame_time(lease)[1] == 'sensor'
+    lease.release()
+
+    offsets = len(camera._clock_offsets)
+    sim.fail_next('CameraGetFrameTimeStamp', mvsdk_sim.CAMERA_STATUS_FAILED)
+    lease = camera.grab()
+    try:
+        assert lease.sensor_time is None
+        assert device.frame_time(lease)[1] == 'host'
+        assert len(camera._clock_offsets) == offsets
+    finally:
+        lease.release()
+
+
+# ----------------------------------------------------------------------------
+# Best-of-N sharpness
+# ----------------------------------------------------------------------------
+
+def test_sdk_sharpness_falls_back_to_laplacian(sim, device):
+    lease, scores, index, scorer = device.take_sharpest('other', 3, 'sdk')
+    lease.release()
+    assert scorer == 'sdk' and len(scores) == 3 and scores[index] == max(scores)
+
+    sim.fail_next('CameraEvaluateImageDefinition',
+                  mvsdk_sim.CAMERA_STATUS_NOT_SUPPORTED, count=10)
+    lease, scores, index, scorer = device.take_sharpest('other', 3, 'sdk')
+    try:
+        assert scorer == 'laplacian'
+        assert scores[index] == pytest.approx(cs.laplacian_sharpness(lease.image))
+        assert not any(math.isnan(score) for score in scores)
+    finally:
+        lease.release()
+
+
+# ----------------------------------------------------------------------------
+# Settle detection
+# ----------------------------------------------------------------------------
+
+PREVIEW_SHAPE = (703, 1364)                 # 4x binned MindVision preview
+
+
+def noisy_frames(count, sigma, scale=1.0, growth=1.0, seed=0):
+    """Preview-sized scene frames with `sigma` grey levels of sensor noise,
+    brightness multiplied by `growth` each frame."""
+    rng = np.random.default_rng(seed)
+    scene = cs.synthetic_scene(PREVIEW_SHAPE[1], PREVIEW_SHAPE[0]) * 0.5
+    for i in range(count):
+        frame = scene * scale * growth ** i + rng.normal(0, sigma, scene.shape)
+        yield np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def feed(detector, frames, head):
+    exposed_at = detector.changed_at + 0.001
+    for frame in frames:
+        detector.observe(exposed_at, head, frame)
+        if detector.settled:
+            return True
+    return False
+
+
+def test_settle_converges_through_gain_150_noise():
+    detector = cs.SettleDetector()
+    detector.reset()
+    head = SimpleNamespace(uiExpTime=10000, fAnalogGain=150 / 16)
+    assert feed(detector, noisy_frames(cs.SETTLE_STABLE_FRAMES, sigma=25), head)
+    assert detector.wait(time.time())
+
+
+def test_settle_waits_for_auto_exposure_ramp():
+    detector = cs.SettleDetector()
+    detector.reset()
+    head = SimpleNamespace(uiExpTime=10000, fAnalogGain=4.0)
+    # Brightness still rising 3% per frame: well above the noise
+    assert not feed(detector, noisy_frames(10, sigma=3, growth=1.03), head)
+
+
+def test_settle_ignores_frames_exposed_before_reset():
+    detector = cs.SettleDetector()
+    detector.reset()
+    head = SimpleNamespace(uiExpTime=10000, fAnalogGain=4.0)
+    for frame in noisy_frames(5, sigma=3):
+        detector.observe(detector.changed_at - 0.01, head, frame)
+    assert not detector.settled
+
+
+def test_settle_rejects_exposure_change():
+    detector = cs.SettleDetector()
+    detector.reset()
+    exposed_at = detector.changed_at + 0.001
+    for i, frame in enumerate(noisy_frames(6, sigma=3)):
+        head = SimpleNamespace(uiExpTime=10000 * 1.1 ** i, fAnalogGain=4.0)
+        detector.observe(exposed_at, head, frame)
+    assert not detector.settled
+
+
+def test_settle_wait_times_out_and_wakes():
+    detector = cs.SettleDetector()
+    detector.reset()
+    t0 = time.time()
+    assert not detector.wait(t0 + 0.05)
+    assert time.time() - t0 >= 0.05
+
+    head = SimpleNamespace(uiExpTime=10000, fAnalogGain=4.0)
+    frames = list(noisy_frames(cs.SETTLE_STABLE_FRAMES, sigma=3))
+    feeder = threading.Timer(0.05, feed, (detector, frames, head))
+    feeder.start()
+    assert detector.wait(time.time() + 2.0)
+    assert detector.settle_time is not None
+    feeder.join()
+
+
+def test_settle_sample_size_follows_frame():
+    for shape in (PREVIEW_SHAPE, (2812, 5456), (120, 160)):
+        sample = cs.settle_sample(np.zeros(shape, np.uint8))
+        assert min(cs.SETTLE_SAMPLES, shape[0] * shape[1]) <= sample.size \
+            <= 4 * cs.SETTLE_SAMPLES
+
+
+# ----------------------------------------------------------------------------
+# Parameter teams
+# ----------------------------------------------------------------------------
+
+def test_failed_parameter_save_keeps_per_setting_path(sim, device):
+    camera, state = device.camera, sim.device(device.camera.hCamera)
+    sim.fail_next('CameraSaveParameter', mvsdk_sim.CAMERA_STATUS_FAILED, count=10)
+    for mode in ('other', 'black'):
+        camera.set_mode(mode)
+        camera.remember_mode(mode)
+    assert camera._saved_teams == set()
+    camera.set_mode('other')
+    assert (state.analog_gain, state.ae_state) == (64, 1)
+
+
+def test_failed_parameter_load_falls_back(sim, device):
+    camera, state = device.camera, sim.device(device.camera.hCamera)
+    camera.set_mode('other')
+    camera.remember_mode('other')
+    assert camera._saved_teams == {'other'}
+    camera.set_mode('black')
+    assert (state.analog_gain, state.ae_state) == (150, 0)
+
+    sim.fail_next('CameraLoadParameter', mvsdk_sim.CAMERA_STATUS_FAILED)
+    camera.set_mode('other')
+    assert (state.analog_gain, state.ae_state) == (64, 1)
+    assert 'other' not in camera._saved_teams
+
+
+# ----------------------------------------------------------------------------
+# Capture sets
+# ----------------------------------------------------------------------------
+
+@pytest.mark.parametrize('trigger', ['soft', 'continuous'])
+def test_capture_set_on_simulator(sim_client, sim_pair, trigger):
+    response = sim_client.get('/api/capture-set', params={'trigger': trigger})
+    assert response.status_code == 200
+    body = response.json()
+    assert [f['camera_id'] for f in body['frames']] == ['0', '1']
+    for frame in body['frames']:
+        assert (frame['width'], frame['height']) == (SIM_WIDTH, SIM_HEIGHT)
+        assert frame['clock'] == 'sensor'
+        assert isinstance(frame['sensor_timestamp_us'], int)
+    assert body['skew_ms'] >= 0 and body['skew_clock'] == 'sensor'
+    if trigger == 'soft':
+        assert body['trigger_spread_ms'] >= 0
+    else:
+        assert body['trigger_spread_ms'] is None
+    assert all(leased_slots(device) == 0 for device in sim_pair[1])
+
+
+@pytest.mark.parametrize('trigger', ['soft', 'continuous'])
+def test_failed_capture_set_releases_every_lease(sim_pair, monkeypatch, trigger):
+    _, (first, second) = sim_pair
+
+    def fail(*args, **kwargs):
+        raise cs.CameraException(mvsdk_sim.CAMERA_STATUS_FAILED)
+
+    # The first camera's frame is leased before the second one fails
+    monkeypatch.setattr(second, 'grab_fresh_frame', fail)
+    monkeypatch.setattr(second.camera, 'grab_triggered', fail)
+    with pytest.raises(cs.CameraException):
+        cs.take_capture_set([first, second], 'other', trigger)
+    assert leased_slots(first) == 0 and leased_slots(second) == 0
+
+
+# ----------------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------------
+
+def scrape(client):
+    """/api/metrics as {series: value}, comments dropped."""
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith('#'):
+            series, value = line.rsplit(' ', 1)
+            samples[series] = float(value)
+    return samples
+
+
+def test_histogram_exposition_counts_bound_values_in_their_bucket():
+    histogram = cs.Histogram('test_seconds', 'Test histogram', ('call',),
+                             buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.labels('grab').observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{call="grab",le="0.1"} 2',
+        'test_seconds_bucket{call="grab",le="1.0"} 4',
+        'test_seconds_bucket{call="grab",le="+Inf"} 5',
+        'test_seconds_sum{call="grab"} 4.650000',
+        'test_seconds_count{call="grab"} 5',
+    ]
+
+
+def test_metrics_after_capture_on_simulator(sim_client):
+    grabbed = 'camera_frames_grabbed_total{source="sdk"}'
+    before = scrape(sim_client).get(grabbed, 0)
+    assert sim_client.get('/api/capture-jpeg').status_code == 200
+    samples = scrape(sim_client)
+    assert samples[grabbed] > before
+
+    buckets = [value for series, value in samples.items()
+               if series.startswith('camera_jpeg_encode_seconds_bucket{endpoint="capture-jpeg"')]
+    assert buckets == sorted(buckets) and buckets[-1] >= 1
+    count = samples['camera_jpeg_encode_seconds_count{endpoint="capture-jpeg"}']
+    assert count == samples['camera_jpeg_encode_seconds_bucket'
+                            '{endpoint="capture-jpeg",le="+Inf"}']
+    assert samples['camera_jpeg_encode_seconds_sum{endpoint="capture-jpeg"}'] > 0
+    assert samples['camera_sdk_frames_total{camera="0"}'] > 0
+
+
+def test_metrics_drop_subscriber_series_on_disconnect(sim_client, sim_pair):
+    device = sim_pair[1][0]
+    loop = asyncio.new_event_loop()
+    try:
+        bc, sub = device.subscribe_stream(300, 55, loop)
+        series = (f'camera_stream_subscriber_dropped_frames{{subscriber="{sub.id}",'
+                  f'camera="0",width="300",quality="55"}}')
+        samples = scrape(sim_client)
+        assert samples[series] == 0
+        assert samples['camera_stream_subscribers{camera="0",width="300",quality="55"}'] == 1
+        device.unsubscribe_stream(bc, sub)
+        samples = scrape(sim_client)
+        assert series not in samples
+        assert not any(s.startswith('camera_stream_subscribers{') for s in samples)
+    finally:
+        loop.close()
+
+
+# ----------------------------------------------------------------------------
+# Capture timings
+# ----------------------------------------------------------------------------
+
+def server_timing(response):
+    """Server-Timing header as {phase: milliseconds}."""
+    phases = {}
+    for entry in response.headers['Server-Timing'].split(', '):
+        name, dur = entry.split(';')
+        assert dur.startswith('dur=')
+        phases[name] = float(dur[len('dur='):])
+    return phases
+
+
+@pytest.mark.parametrize('trigger, exposure', [('continuous', 'snap'),
+                                               ('soft', 'trigger')])
+def test_capture_jpeg_reports_server_timing(sim_client, trigger, exposure):
+    response = sim_client.get('/api/capture-jpeg', params={'trigger': trigger},
+                              headers={'Origin': 'http://localhost'})
+    assert response.status_code == 200
+    phases = server_timing(response)
+    assert {'lock', exposure, 'encode', 'total'} <= set(phases)
+    assert list(phases)[-1] == 'total'
+    assert all(ms >= 0 for ms in phases.values())
+    assert phases['total'] >= phases[exposure] + phases['encode'] - 0.2   # Rounding
+    exposed = response.headers['access-control-expose-headers'].split(', ')
+    assert 'Server-Timing' in exposed
+
+
+def test_timings_report_percentiles(sim_client, monkeypatch):
+    monkeypatch.setattr(cs, 'timing_log', cs.TimingLog())
+    for _ in range(3):
+        assert sim_client.get('/api/capture-jpeg').status_code == 200
+    summary = sim_client.get('/api/timings').json()
+    assert list(summary) == ['capture-jpeg']
+    total = summary['capture-jpeg']['total']
+    assert total['count'] == 3
+    assert 0 <= total['p50'] <= total['p95'] <= total['p99']
+    assert sim_client.get('/api/timings', params={'endpoint': 'capture-raw'}).json() == {}
+
+
+# ----------------------------------------------------------------------------
+# Per-camera routes
+# ----------------------------------------------------------------------------
+
+def test_capture_on_each_camera(sim_client):
+    cameras = sim_client.get('/api/cameras').json()
+    assert [c['id'] for c in cameras['cameras']] == ['0', '1']
+    for camera_id in ('0', '1', 'SIM00001'):
+        response = sim_client.get(f'/api/cameras/{camera_id}/capture-jpeg')
+        assert response.status_code == 200
+        expected = '1' if camera_id == 'SIM00001' else camera_id
+        assert response.headers['X-Camera-Id'] == expected
+        assert cv2.imdecode(np.frombuffer(response.content, np.uint8),
+                            cv2.IMREAD_UNCHANGED).shape == (SIM_HEIGHT, SIM_WIDTH)
+
+
+def test_unknown_camera_is_404(sim_client):
+    for path in ('capture-jpeg', 'status', 'preview'):
+        response = sim_client.get(f'/api/cameras/9/{path}')
+        assert response.status_code == 404
+        assert 'Unknown camera' in response.json()['error']
+    assert sim_client.get('/api/capture-set', params={'cameras': '0,9'}).status_code == 404
+
+
+def test_cameras_capture_concurrently(sim_client, sim_pair):
+    _, (first, second) = sim_pair
+    assert first.capture_lock is not second.capture_lock
+    results = {}
+
+    def capture(camera_id):
+        results[camera_id] = sim_client.get(f'/api/cameras/{camera_id}/capture-jpeg')
+
+    # Camera 0 busy with a capture of its own: camera 1 must not wait on it
+    with first.capture_lock:
+        other = threading.Thread(target=capture, args=('1',))
+        other.start()
+        other.join(timeout=5.0)
+        assert not other.is_alive()
+        blocked = threading.Thread(target=capture, args=('0',))
+        blocked.start()
+        time.sleep(0.1)
+        assert blocked.is_alive() and '0' not in results
+    blocked.join(timeout=5.0)
+    assert results['1'].status_code == 200 and results['0'].status_code == 200
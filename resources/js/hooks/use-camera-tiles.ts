@@ -0,0 +1,148 @@
+import { type RefObject, useEffect, useRef, useState } from 'react';
+
+// Binary layout sent by the camera server's /api/ws/tiles channel
+// (TILE_MESSAGE / TILE_RECORD in python/camera_server.py, little-endian):
+//   header: magic 'MQTL' (4) | seq u32 | flags u8 | pad u8 | count u16
+//   tile:   x u16 | y u16 | w u16 | h u16 | length u32 | JPEG bytes
+const TILE_MAGIC = 0x4c54514d; // 'MQTL' read as little-endian u32
+const HEADER_SIZE = 12;
+const RECORD_SIZE = 12;
+const RECONNECT_DELAY = 2000;
+
+export type TileStreamStatus = 'connecting' | 'live' | 'reconnecting' | 'unavailable';
+
+export interface TileStreamOptions {
+    enabled?: boolean;
+    width?: number;
+    quality?: number;
+    fps?: number;
+    /** Region of interest as [x, y, w, h] fractions of the frame (0-1). */
+    roi?: [number, number, number, number] | null;
+}
+
+interface TileConfig {
+    type: 'config';
+    width: number;
+    height: number;
+}
+
+async function paintTiles(canvas: HTMLCanvasElement, buffer: ArrayBuffer): Promise<void> {
+    const view = new DataView(buffer);
+    if (buffer.byteLength < HEADER_SIZE || view.getUint32(0, true) !== TILE_MAGIC) {
+        return;
+    }
+    const count = view.getUint16(10, true);
+
+    // Decode every tile first, then draw them together so a frame never
+    // appears half-updated.
+    const tiles: Promise<{ x: number; y: number; bitmap: ImageBitmap }>[] = [];
+    let offset = HEADER_SIZE;
+    for (let i = 0; i < count; i++) {
+        const x = view.getUint16(offset, true);
+        const y = view.getUint16(offset + 2, true);
+        const length = view.getUint32(offset + 8, true);
+        offset += RECORD_SIZE;
+        const jpeg = new Blob([new Uint8Array(buffer, offset, length)], { type: 'image/jpeg' });
+        offset += length;
+        tiles.push(createImageBitmap(jpeg).then((bitmap) => ({ x, y, bitmap })));
+    }
+
+    const decoded = await Promise.all(tiles);
+    const ctx = canvas.getContext('2d');
+    for (const { x, y, bitmap } of decoded) {
+        ctx?.drawImage(bitmap, x, y);
+        bitmap.close();
+    }
+}
+
+/**
+ * Paint the camera's live view onto a canvas from the WebSocket tile
+ * channel: one keyframe, then only the tiles that changed. Reports
+ * 'unavailable' if the server never accepted the channel, so callers can
+ * fall back to the MJPEG stream.
+ */
+export function useCameraTiles(
+    cameraUrl: string,
+    canvasRef: RefObject<HTMLCanvasElement | null>,
+    { enabled = true, width, quality, fps, roi = null }: TileStreamOptions = {},
+): TileStreamStatus {
+    const [status, setStatus] = useState<TileStreamStatus>('connecting');
+    const socketRef = useRef<WebSocket | null>(null);
+    const subscriptionRef = useRef({ width, quality, fps, roi });
+    subscriptionRef.current = { width, quality, fps, roi };
+
+    useEffect(() => {
+        if (!enabled) return;
+
+        let active = true;
+        let everLive = false;
+        let timer: ReturnType<typeof setTimeout> | null = null;
+        let socket: WebSocket | null = null;
+
+        const connect = () => {
+            setStatus(everLive ? 'reconnecting' : 'connecting');
+            socket = new WebSocket(`${cameraUrl.replace(/^http/, 'ws')}/api/ws/tiles`);
+            socket.binaryType = 'arraybuffer';
+            socketRef.current = socket;
+            // Tiles must be painted in arrival order; chain the async decodes
+            let painting = Promise.resolve();
+
+            socket.onopen = () => {
+                const { width: w, quality: q, fps: f, roi: r } = subscriptionRef.current;
+                socket?.send(JSON.stringify({ type: 'subscribe', w, q, fps: f, roi: r }));
+            };
+
+            socket.onmessage = (event) => {
+                const canvas = canvasRef.current;
+                if (!canvas) return;
+                if (typeof event.data === 'string') {
+                    const message = JSON.parse(event.data) as TileConfig | { type: string };
+                    if (message.type === 'config') {
+                        const config = message as TileConfig;
+                        painting = painting.then(() => {
+                            canvas.width = config.width;
+                            canvas.height = config.height;
+                        });
+                        everLive = true;
+                        setStatus('live');
+                    }
+                    return;
+                }
+                const buffer = event.data as ArrayBuffer;
+                painting = painting.then(() => paintTiles(canvas, buffer)).catch(() => {});
+            };
+
+            socket.onclose = () => {
+                socketRef.current = null;
+                if (!active) return;
+                if (!everLive) {
+                    // Server without the tile channel — let the caller fall back
+                    setStatus('unavailable');
+                    return;
+                }
+                setStatus('reconnecting');
+                timer = setTimeout(connect, RECONNECT_DELAY);
+            };
+        };
+
+        connect();
+        return () => {
+            active = false;
+            if (timer) clearTimeout(timer);
+            socket?.close();
+            socketRef.current = null;
+        };
+    }, [cameraUrl, canvasRef, enabled]);
+
+    // Re-subscribe in place when the requested profile or ROI changes
+    const roiKey = roi ? roi.join(',') : '';
+    useEffect(() => {
+        const socket = socketRef.current;
+        if (socket?.readyState === WebSocket.OPEN) {
+            const { width: w, quality: q, fps: f, roi: r } = subscriptionRef.current;
+            socket.send(JSON.stringify({ type: 'subscribe', w, q, fps: f, roi: r }));
+        }
+    }, [width, quality, fps, roiKey]);
+
+    return status;
+}
@@ -1,5 +1,6 @@
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
+import { useCameraTiles } from '@/hooks/use-camera-tiles';
 import AppLayout from '@/layouts/app-layout';
 import brandRoutes from '@/routes/brands';
 import { type BreadcrumbItem } from '@/types';
@@ -99,6 +100,8 @@ export default function CameraCapture({ brand, article, selectedSize, measuremen
     // Stream reconnection tracking
     const [streamKey, setStreamKey] = useState(0);
     const [streamError, setStreamError] = useState(false);
+    // Live view canvas fed by the WebSocket tile channel (MJPEG fallback)
+    const tileCanvasRef = useRef<HTMLCanvasElement>(null);
     const imageModeRef = useRef<'black' | 'white' | 'other' | null>(null);
     const prevOnlineRef = useRef(false);
 
@@ -440,6 +443,13 @@ export default function CameraCapture({ brand, article, selectedSize, measuremen
 
     const isServerOnline = cameraStatus?.status === 'ready';
 
+    // Delta tile channel: sends only changed regions of the frame. Falls back
+    // to the MJPEG <img> if the camera server does not offer it.
+    const tileStatus = useCameraTiles(cameraUrl, tileCanvasRef, {
+        enabled: step === 'live_preview' && isServerOnline,
+    });
+    const useTileStream = tileStatus !== 'unavailable';
+
     // -------------------------------------------------------------------
     // Render
     // -------------------------------------------------------------------
@@ -700,28 +710,37 @@ export default function CameraCapture({ brand, article, selectedSize, measuremen
                             </div>
                         </div>
 
-                        {/* MJPEG Stream — auto-reconnects via streamKey */}
+                        {/* Live view — tile channel canvas, or MJPEG stream that
+                            auto-reconnects via streamKey */}
                         <div className="relative flex flex-1 items-center justify-center overflow-hidden rounded-xl border-2 border-neutral-200 bg-black dark:border-neutral-700">
-                            {/* MJPEG img — always visible. MJPEG streams never fire onLoad
-                                so we cannot gate visibility on it. The browser renders
-                                frames as they arrive; while connecting it shows nothing
-                                (bg-black is fine). */}
-                            <img
-                                key={streamKey}
-                                src={`${cameraUrl}/api/stream?t=${streamKey}`}
-                                alt="Live Camera Feed"
-                                className="h-full max-h-[calc(100vh-320px)] w-auto object-contain"
-                                onError={() => {
-                                    setStreamError(true);
-                                    // Auto-retry stream after 2s
-                                    setTimeout(() => {
-                                        setStreamError(false);
-                                        setStreamKey((k) => k + 1);
-                                    }, 2000);
-                                }}
-                            />
+                            {useTileStream ? (
+                                <canvas
+                                    ref={tileCanvasRef}
+                                    aria-label="Live Camera Feed"
+                                    className="h-full max-h-[calc(100vh-320px)] w-auto object-contain"
+                                />
+                            ) : (
+                                /* MJPEG img — always visible. MJPEG streams never fire onLoad
+                                   so we cannot gate visibility on it. The browser renders
+                                   frames as they arrive; while connecting it shows nothing
+                                   (bg-black is fine). */
+                                <img
+                                    key={streamKey}
+                                    src={`${cameraUrl}/api/stream?t=${streamKey}`}
+                                    alt="Live Camera Feed"
+                                    className="h-full max-h-[calc(100vh-320px)] w-auto object-contain"
+                                    onError={() => {
+                                        setStreamError(true);
+                                        // Auto-retry stream after 2s
+                                        setTimeout(() => {
+                                            setStreamError(false);
+                                            setStreamKey((k) => k + 1);
+                                        }, 2000);
+                                    }}
+                                />
+                            )}
                             {/* Error overlay */}
-                            {streamError && (
+                            {(useTileStream ? tileStatus === 'reconnecting' : streamError) && (
                                 <div className="absolute inset-0 flex flex-col items-center justify-center gap-3 text-white">
                                     <Loader2 className="h-8 w-8 animate-spin text-neutral-400" />
                                     <p className="text-sm text-neutral-400">